@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import platform
 from pathlib import Path
 
 PROJECT_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +35,7 @@ LOCAL_APPS = [
     'products',
     'stock',
     'sales',
+    'search',
 ]
 
 THIRD_PARTY_APPS = [
@@ -81,6 +83,14 @@ DATABASES = {
     }
 }
 
+# Version stamps for in-process caches (core.cache) live here. Fine for a single dev process,
+# production.py switches to a cache shared by every worker so invalidations reach them all.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -121,4 +131,36 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
-PRINTER_NAME = "POS-80C"
\ No newline at end of file
+PRINTER_NAME = "POS-80C"
+
+# Receipt print spooler (manage.py run_print_spooler)
+if platform.system() == "Windows":
+    RECEIPT_PRINTER_BACKEND = 'sales.printing.Win32PrinterBackend'
+    RECEIPT_PRINTER_OPTIONS = {'printer_name': PRINTER_NAME}
+else:
+    RECEIPT_PRINTER_BACKEND = 'sales.printing.FilePrinterBackend'
+    RECEIPT_PRINTER_OPTIONS = {'directory': BASE_DIR / 'receipts'}
+# e.g. a network printer or a socket stand-in on Linux:
+# RECEIPT_PRINTER_BACKEND = 'sales.printing.SocketPrinterBackend'
+# RECEIPT_PRINTER_OPTIONS = {'host': '192.168.0.50', 'port': 9100}
+RECEIPT_PRINT_MAX_ATTEMPTS = 5
+RECEIPT_PRINT_STALE_AFTER = 300  # seconds a job may stay in "printing" before it is re-queued
+
+# POS cart storage: 'sales.cart.DatabaseCartStore' or 'sales.cart.CacheCartStore' (needs a shared cache)
+POS_CART_STORE = 'sales.cart.DatabaseCartStore'
+
+# Dashboard metrics (dashboard.metrics), cached per widget group and invalidated by stock and sale writes
+DASHBOARD_METRICS_TTL = 60  # seconds
+DASHBOARD_WIDGET_MAX_AGE = 15  # seconds the browser may reuse a widget fragment
+LOW_STOCK_THRESHOLD = 10
+SUPPLIER_PRODUCTS_TTL = 600  # seconds, entries are also dropped by the supplier version stamp
+SALES_ANALYTICS_TTL = 300  # seconds, entries are also dropped by the sales version stamp
+
+# Full-text search (search app): FTS5 on SQLite, tsvector + GIN on PostgreSQL
+SEARCH_MAX_RESULTS = 500  # best ranked matches a search returns
+PRODUCT_AUTOCOMPLETE_SALES_DAYS = 30  # sales volume window used to rank typeahead matches
+PRODUCT_AUTOCOMPLETE_SALES_REFRESH = 600  # seconds between reloads of the sales volumes
+
+# List pagination (core.pagination.CachedCountPaginator)
+PAGINATOR_COUNT_TTL = 300  # seconds, entries are also dropped by the model's count version stamp
+PAGINATOR_ESTIMATE_THRESHOLD = 10000  # PostgreSQL only, larger results show the planner estimate
@@ -4,3 +4,14 @@ DEBUG = False
 SECRET_KEY = 'your-prod-secret-key'
 ALLOWED_HOSTS = ['yourdomain.com']
 CSRF_TRUSTED_ORIGINS = ['https://yourdomain.com']
+
+# Every gunicorn worker and management command (print spooler, rebuilds) must see the same
+# core.cache version stamps, the per-process LocMemCache of base.py would let them drift apart.
+# The table is created by `manage.py createcachetable` in scripts/entrypoint.sh.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
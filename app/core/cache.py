@@ -0,0 +1,88 @@
+"""
+Version stamps for process-level caches.
+
+A version is a number stored in the (shared) Django cache. Writers bump it after
+their transaction commits, readers compare it with the version their cached copy
+was built from and reload when it differs. A missing key (eviction, cold cache)
+is re-created with a fresh timestamp so it never matches an older stamp.
+"""
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+
+VERSION_KEY_PREFIX = 'version:'
+
+
+def get_versions(namespaces):
+    """
+    Return {namespace: version} for every namespace with a single cache round trip,
+    plus one set_many when some stamps are missing.
+    """
+    keys = {f"{VERSION_KEY_PREFIX}{namespace}": namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    # A concurrent bump may be overwritten, harmless: the caller reads its data after this
+    # stamp is stored, and copies cached under the overwritten stamp no longer match
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {namespace: found[key] for key, namespace in keys.items()}
+
+
+def get_version(namespace):
+    return get_versions([namespace])[namespace]
+
+
+def bump_version(namespace):
+    key = f"{VERSION_KEY_PREFIX}{namespace}"
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def bump_version_on_commit(*namespaces):
+    """Bump the namespaces once the current transaction commits (immediately outside a transaction)."""
+    def bump():
+        for namespace in namespaces:
+            bump_version(namespace)
+    transaction.on_commit(bump)
+
+
+CHANGES_KEY_PREFIX = 'changes:'
+CHANGE_LOG_SIZE = 500  # versions a reader may lag behind and still catch up incrementally
+CHANGE_LOG_TTL = 3600
+
+
+def record_changes_on_commit(namespace, *keys):
+    """
+    Bump the namespace once the current transaction commits and log the keys that changed
+    under the new version, so readers a few versions behind reload only those (see get_changes).
+    """
+    keys = sorted({key for key in keys if key is not None})
+    if not keys:
+        return
+
+    def bump():
+        version = bump_version(namespace)
+        cache.set(f"{CHANGES_KEY_PREFIX}{namespace}:{version}", keys, CHANGE_LOG_TTL)
+    transaction.on_commit(bump)
+
+
+def get_changes(namespace, since, version):
+    """
+    Return the set of keys logged between the `since` and `version` stamps of the namespace.
+
+    Returns None when the log cannot tell: no previous version, too many versions behind,
+    an evicted log entry or a re-created stamp. The reader must then reload everything.
+    """
+    if since is None or not 0 <= version - since <= CHANGE_LOG_SIZE:
+        return None
+    log_keys = [f"{CHANGES_KEY_PREFIX}{namespace}:{number}" for number in range(since + 1, version + 1)]
+    logged = cache.get_many(log_keys)
+    if len(logged) != len(log_keys):
+        return None
+    return set().union(*logged.values())
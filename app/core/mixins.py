@@ -1,5 +1,6 @@
 from django.http import HttpResponseForbidden
 from django.core.exceptions import PermissionDenied
+from core.pagination import KeysetPaginator
 
 class RoleRequiredMixin:
     """
@@ -18,3 +19,24 @@ class RoleRequiredMixin:
             raise PermissionDenied("You do not have permission to access this view.")
 
         return super().dispatch(request, *args, **kwargs)
+
+
+class KeysetPaginationMixin:
+    """
+    Paginate a ListView with core.pagination.KeysetPaginator, newest first.
+
+    Pages are selected with ?after=<cursor> (older rows) and ?before=<cursor> (newer rows).
+    HTMX requests for an ?after page render only rows_template_name, which the
+    infinite scroll sentinel at the end of the previous rows swaps itself for.
+    """
+    rows_template_name = None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.get_page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_template_names(self):
+        if self.rows_template_name and self.request.headers.get('HX-Request') and self.request.GET.get('after'):
+            return [self.rows_template_name]
+        return super().get_template_names()
@@ -0,0 +1,193 @@
+"""
+Pagination without full counts on every request.
+
+KeysetPaginator: cursor pagination, newest first.
+
+Pages are read by position instead of by number: the next page is the rows older
+than the last row shown, WHERE (created_at, id) < (last.created_at, last.id).
+With an index on (created_at, id) page N costs the same as page 1, and no
+COUNT(*) runs, so there are no page numbers or totals either. Rows added while
+a user pages never shift or repeat the rows they see.
+
+CachedCountPaginator: page-number pagination whose COUNT(*) is cached per query
+and dropped when the model is written (invalidate_counts, called from the model
+signals). On PostgreSQL, querysets the planner expects to hold more than
+PAGINATOR_ESTIMATE_THRESHOLD rows use the planner estimate instead of a count.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from core.cache import bump_version_on_commit, get_version
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator, used like django.core.paginator.Page in templates."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset newest first on (field, id), `field` being a datetime.
+
+    Cursors are opaque url-safe tokens of a row's (field, id). get_page(after=token)
+    returns the rows older than that row, get_page(before=token) the rows newer.
+    """
+
+    def __init__(self, queryset, per_page, field='created_at'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.field = field
+
+    def encode(self, obj):
+        value = f"{getattr(obj, self.field).isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode(self, cursor):
+        """Return the (datetime, id) of a cursor, raise ValueError if it is malformed."""
+        # Decoding, unpacking and parsing errors are all ValueErrors
+        value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(value), int(pk)
+
+    def get_page(self, after=None, before=None):
+        """Return a KeysetPage. A missing or malformed cursor gives the first (newest) page."""
+        try:
+            cursor = self.decode(after or before) if after or before else None
+        except ValueError:
+            cursor = None
+        field, size = self.field, self.per_page
+
+        if cursor is None:
+            rows = list(self.queryset.order_by(f'-{field}', '-pk')[:size + 1])
+            return KeysetPage(rows[:size], self.encode(rows[size - 1]) if len(rows) > size else None)
+
+        value, pk = cursor
+        if after:
+            # The plain bound on `field` keeps the OR an index range scan
+            older = Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            rows = list(self.queryset.filter(older, **{f'{field}__lte': value}).order_by(f'-{field}', '-pk')[:size + 1])
+            page = rows[:size]
+            return KeysetPage(
+                page,
+                next_cursor=self.encode(page[-1]) if len(rows) > size else None,
+                previous_cursor=self.encode(page[0]) if page else None,
+            )
+
+        newer = Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+        rows = list(self.queryset.filter(newer, **{f'{field}__gte': value}).order_by(field, 'pk')[:size + 1])
+        page = rows[:size][::-1]
+        return KeysetPage(
+            page,
+            next_cursor=self.encode(page[-1]) if page else None,
+            previous_cursor=self.encode(page[0]) if len(rows) > size else None,
+        )
+
+
+def count_namespace(model):
+    return f"counts:{model._meta.label_lower}"
+
+
+def invalidate_counts(*models):
+    """Drop the cached paginator counts of the models once the transaction commits."""
+    bump_version_on_commit(*[count_namespace(model) for model in models])
+
+
+def estimate_count(queryset):
+    """Return the PostgreSQL planner's row estimate for the queryset (EXPLAIN, no rows are read)."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    """Page of an estimated count, whether a next page exists comes from the rows read."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator serving count from the cache, keyed by the count query and the model's
+    count version. `estimated` is True when count is a planner estimate, templates
+    then show "about N results" and pages past the estimate are empty rather than 404.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        namespace = count_namespace(queryset.model)
+        digest = hashlib.md5(repr((sql, params)).encode()).hexdigest()
+        key = f"{namespace}:{get_version(namespace)}:{digest}"
+        cached = cache.get(key)
+        if cached is None:
+            estimate = estimate_count(queryset) if connections[queryset.db].vendor == 'postgresql' else None
+            if estimate is not None and estimate > settings.PAGINATOR_ESTIMATE_THRESHOLD:
+                cached = (estimate, True)
+            else:
+                cached = (queryset.count(), False)
+            cache.set(key, cached, settings.PAGINATOR_COUNT_TTL)
+        count, self.estimated = cached
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # super() has read count, so `estimated` is set
+            if not self.estimated or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+        # Read one row more than a page to tell whether there is a next one
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        return EstimatedPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
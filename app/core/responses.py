@@ -0,0 +1,51 @@
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def stdlib_dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def orjson_dumps(data):
+    # Types orjson does not know natively (Decimal, lazy strings, ...) go through Django's encoder,
+    # and so do datetimes, so they keep JsonResponse's millisecond precision and "Z" suffix
+    return orjson.dumps(
+        data,
+        default=_django_encoder.default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    )
+
+
+def fast_dumps(data):
+    """Serialise with orjson when it is installed, the stdlib json module otherwise."""
+    if orjson is not None:
+        return orjson_dumps(data)
+    return stdlib_dumps(data)
+
+
+# The serialiser used by FastJsonResponse, settings.JSON_RESPONSE_DUMPS is a dotted path
+json_dumps = import_string(getattr(settings, 'JSON_RESPONSE_DUMPS', 'core.responses.fast_dumps'))
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Drop-in replacement for JsonResponse that serialises with the pluggable fast encoder.
+    Used for the hot POS and search endpoints.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=json_dumps(data), **kwargs)
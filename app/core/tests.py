@@ -1,3 +1,126 @@
-from django.test import TestCase
+import datetime
+import json
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.core.paginator import EmptyPage
+from django.http import JsonResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 
-# Create your tests here.
+from core.pagination import CachedCountPaginator, KeysetPaginator
+from core.responses import FastJsonResponse, orjson, orjson_dumps, stdlib_dumps
+from products.models import Product
+
+
+# The manifest only exists after collectstatic
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ViewTestCase(TestCase):
+    """TestCase for views, renders templates with plain static files storage."""
+
+
+class KeysetPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Pairs of products share a created_at, the id breaks the tie
+        now = timezone.now()
+        for index in range(10):
+            product = Product.objects.create(name=f'Product {index}')
+            Product.objects.filter(pk=product.pk).update(created_at=now + timedelta(seconds=index // 2))
+        cls.newest_first = list(Product.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def ids(self, page):
+        return [product.pk for product in page]
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(Product.objects.all(), 3)
+        page, seen = paginator.get_page(), []
+        self.assertFalse(page.has_previous())
+        while True:
+            seen += self.ids(page)
+            if not page.has_next():
+                break
+            page = paginator.get_page(after=page.next_cursor)
+        self.assertEqual(seen, self.newest_first)
+        self.assertEqual(len(page), 1)
+
+        page = paginator.get_page(before=page.previous_cursor)
+        self.assertEqual(self.ids(page), self.newest_first[6:9])
+        page = paginator.get_page(before=page.previous_cursor)
+        self.assertEqual(self.ids(page), self.newest_first[3:6])
+        page = paginator.get_page(before=page.previous_cursor)
+        self.assertEqual((self.ids(page), page.has_previous()), (self.newest_first[:3], False))
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        paginator = KeysetPaginator(Product.objects.all(), 2)
+        cursor = paginator.encode(Product.objects.get(pk=self.newest_first[-3]))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ids(paginator.get_page(after=cursor)), self.newest_first[-2:])
+
+    def test_invalid_cursor_gives_the_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), 4)
+        for cursor in ('garbage', 'bm90fGE=', '!!'):
+            self.assertEqual(self.ids(paginator.get_page(after=cursor)), self.newest_first[:4])
+
+
+class CachedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(5):
+                Product.objects.create(name=f'Product {index}')
+
+    def test_count_is_cached_until_a_write(self):
+        queryset = Product.objects.filter(name__startswith='Product')
+        self.assertEqual(CachedCountPaginator(queryset, 2).count, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(queryset, 2).count, 5)
+        # Other filters are counted separately
+        self.assertEqual(CachedCountPaginator(queryset.filter(name='Product 1'), 2).count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Product 5')
+        self.assertEqual(CachedCountPaginator(queryset, 2).count, 6)
+        self.assertEqual(CachedCountPaginator(Product.objects.none(), 2).count, 0)
+
+    def test_estimated_pages(self):
+        queryset = Product.objects.filter(name__startswith='Product 2')
+        paginator = CachedCountPaginator(queryset, 2)
+        # As if the PostgreSQL planner had estimated 4 rows
+        paginator.__dict__['count'], paginator.estimated = 4, True
+
+        page = paginator.page(1)
+        self.assertEqual((len(page), page.has_next()), (1, False))
+        # Past the estimate is an empty page, not an error
+        self.assertEqual(len(paginator.page(3)), 0)
+        with self.assertRaises(EmptyPage):
+            paginator.page(0)
+
+
+class FastJsonResponseTests(SimpleTestCase):
+    data = {
+        'price': Decimal('12.50'),
+        'sold_at': datetime.datetime(2026, 3, 1, 9, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'local': datetime.datetime(2026, 3, 1, 15, 30, 15, 123456, tzinfo=datetime.timezone(timedelta(hours=6))),
+        'day': datetime.date(2026, 3, 1),
+        'time': datetime.time(9, 30, 15, 123456),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'counts': {1: 2},
+        'lines': [{'name': 'Kibble', 'quantity': 2, 'ratio': 0.5, 'note': None}],
+    }
+
+    def test_output_matches_json_response(self):
+        expected = JsonResponse(self.data)
+        response = FastJsonResponse(self.data)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        self.assertEqual(json.loads(response.content)['sold_at'], '2026-03-01T09:30:15.123Z')
+
+    def test_encoders_agree(self):
+        if orjson is None:
+            self.skipTest("orjson is not installed")
+        self.assertEqual(orjson_dumps(self.data), stdlib_dumps(self.data))
@@ -0,0 +1,200 @@
+"""
+Sales time series.
+
+Rows are read as numeric NumPy columns (epoch seconds, amounts, quantities, ids),
+never as model instances. Buckets are local-time edges converted to timestamps,
+so rows are assigned with one searchsorted() call and summed with bincount(),
+which also keeps DST and month lengths right. Results are cached per range under
+the sales metrics version stamp, so a new sale invalidates them.
+"""
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from core.cache import get_version
+from dashboard.metrics import metrics_namespace
+from sales.models import Sale, SaleItem
+
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+MAX_BUCKETS = 10000  # a leap year of hours fits
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def bucket_edges(start, end, bucket):
+    """
+    Return the aware local datetimes starting every bucket that overlaps the dates
+    start..end (inclusive), plus the end of the last bucket.
+    """
+    tz = timezone.get_current_timezone()
+    until = local_midnight(end + timedelta(days=1))
+    if bucket == 'week':
+        start = start - timedelta(days=start.weekday())
+    elif bucket == 'month':
+        start = start.replace(day=1)
+    edge = local_midnight(start)
+
+    edges = [edge]
+    while edge < until:
+        if bucket == 'hour':
+            # Step in UTC so DST changes give 23/25 hour days instead of repeated hours,
+            # aware datetime arithmetic is wall clock arithmetic in the edge's own zone
+            edge = timezone.localtime(edge.astimezone(dt_timezone.utc) + timedelta(hours=1), tz)
+        elif bucket == 'day':
+            edge = local_midnight(edge.date() + timedelta(days=1))
+        elif bucket == 'week':
+            edge = local_midnight(edge.date() + timedelta(days=7))
+        else:
+            edge = local_midnight((edge.date().replace(day=28) + timedelta(days=4)).replace(day=1))
+        edges.append(edge)
+        if len(edges) > MAX_BUCKETS + 1:
+            raise ValueError(f"More than {MAX_BUCKETS} {bucket} buckets, choose a wider bucket or a shorter range.")
+    return edges
+
+
+def load_columns(since, until, product_id=None):
+    """
+    Read the sales and sale lines created in [since, until) as NumPy columns.
+
+    Returns:
+        (sales, lines) structured arrays, sales with (ts, sale_id, amount) and lines
+        with (ts, sale_id, product_id, quantity, amount).
+    """
+    sales = Sale.objects.filter(created_at__gte=since, created_at__lt=until).values_list('created_at', 'id', 'total_amount')
+    lines = SaleItem.objects.filter(sale__created_at__gte=since, sale__created_at__lt=until)
+    if product_id is not None:
+        lines = lines.filter(product_id=product_id)
+    lines = lines.values_list('sale__created_at', 'sale_id', 'product_id', 'quantity', 'sale_price')
+
+    sale_columns = np.fromiter(
+        ((created_at.timestamp(), pk, amount) for created_at, pk, amount in sales.iterator(chunk_size=5000)),
+        dtype=[('ts', 'f8'), ('sale_id', 'i8'), ('amount', 'f8')]
+    )
+    line_columns = np.fromiter(
+        (
+            (created_at.timestamp(), sale_id, product, quantity, quantity * price)
+            for created_at, sale_id, product, quantity, price in lines.iterator(chunk_size=5000)
+        ),
+        dtype=[('ts', 'f8'), ('sale_id', 'i8'), ('product_id', 'i8'), ('quantity', 'i8'), ('amount', 'f8')]
+    )
+    return sale_columns, line_columns
+
+
+def bucketize(edges, sales, lines, product_id=None):
+    """Sum the columns (all rows within the edges) into the buckets delimited by the edge timestamps."""
+    edges = np.asarray(edges, dtype='f8')
+    size = len(edges) - 1
+    line_index = np.searchsorted(edges, lines['ts'], side='right') - 1
+    quantity = np.bincount(line_index, weights=lines['quantity'], minlength=size)[:size]
+
+    if product_id is None:
+        sale_index = np.searchsorted(edges, sales['ts'], side='right') - 1
+        count = np.bincount(sale_index, minlength=size)[:size]
+        revenue = np.bincount(sale_index, weights=sales['amount'], minlength=size)[:size]
+    else:
+        # Sales containing the product: distinct (bucket, sale) pairs, revenue from its lines (before discounts)
+        pairs = np.unique(np.stack([line_index, lines['sale_id']]), axis=1) if len(lines) else np.empty((2, 0), dtype='i8')
+        count = np.bincount(pairs[0], minlength=size)[:size]
+        revenue = np.bincount(line_index, weights=lines['amount'], minlength=size)[:size]
+    return count.astype('i8'), revenue, quantity.astype('i8')
+
+
+def moving_average(values, window):
+    """Trailing mean over `window` buckets, shorter at the start of the series."""
+    cumulative = np.cumsum(np.insert(values, 0, 0.0))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+
+def percent_change(current, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(previous != 0, (current - previous) / previous * 100, np.nan)
+    return change
+
+
+def _round(values, digits=2):
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+def sales_series(start, end, bucket='day', window=7, product_id=None):
+    """
+    Return the bucketed sales series of the dates start..end (inclusive).
+
+    Each bucket has the sale count, revenue, quantity sold, a trailing moving
+    average of revenue and the change against the previous bucket. The totals
+    are compared with the preceding range of the same length.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r}, use one of {', '.join(BUCKETS)}.")
+    if start > end:
+        raise ValueError("The start date must not be after the end date.")
+
+    key = ':'.join(str(part) for part in (
+        'sales_analytics', start, end, bucket, window, product_id, get_version(metrics_namespace('sales'))
+    ))
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    started = time.perf_counter()
+    edges = bucket_edges(start, end, bucket)
+    timestamps = [edge.timestamp() for edge in edges]
+    range_start = local_midnight(start).timestamp()
+    previous_start = local_midnight(start - (end - start) - timedelta(days=1)).timestamp()
+
+    # One read covering the buckets and the previous range of the same length
+    sales, lines = load_columns(
+        datetime.fromtimestamp(min(previous_start, timestamps[0]), tz=timezone.get_current_timezone()), edges[-1], product_id
+    )
+    count, revenue, quantity = bucketize(
+        timestamps, sales[sales['ts'] >= timestamps[0]], lines[lines['ts'] >= timestamps[0]], product_id
+    )
+
+    def totals(low, high):
+        sale_columns = sales[(sales['ts'] >= low) & (sales['ts'] < high)]
+        line_columns = lines[(lines['ts'] >= low) & (lines['ts'] < high)]
+        if product_id is None:
+            sale_count, amount = len(sale_columns), float(sale_columns['amount'].sum())
+        else:
+            sale_count, amount = len(np.unique(line_columns['sale_id'])), float(line_columns['amount'].sum())
+        return {'sales': sale_count, 'revenue': round(amount, 2), 'quantity': int(line_columns['quantity'].sum())}
+
+    current, previous = totals(range_start, timestamps[-1]), totals(previous_start, range_start)
+    previous_bucket = np.concatenate([[np.nan], revenue[:-1]])
+
+    result = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'window': window,
+        'product_id': product_id,
+        'buckets': [edge.isoformat() for edge in edges[:-1]],
+        'sales': count.tolist(),
+        'revenue': _round(revenue),
+        'quantity': quantity.tolist(),
+        'moving_average': _round(moving_average(revenue, window)),
+        'change': _round(revenue - previous_bucket),
+        'change_percent': _round(percent_change(revenue, previous_bucket), 1),
+        'totals': current,
+        'previous_totals': previous,
+        'totals_change_percent': {
+            name: round((current[name] - previous[name]) / previous[name] * 100, 1) if previous[name] else None
+            for name in current
+        },
+        'ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    cache.set(key, result, settings.SALES_ANALYTICS_TTL)
+    return result
+
+
+def parse_range(params, default_days=30):
+    """Read start/end (YYYY-MM-DD) from query parameters, the last `default_days` days by default."""
+    end = date.fromisoformat(params['end']) if params.get('end') else timezone.localdate()
+    start = date.fromisoformat(params['start']) if params.get('start') else end - timedelta(days=default_days - 1)
+    return start, end
@@ -0,0 +1,113 @@
+"""
+Dashboard metrics, one widget group per function and one query per group.
+
+Results are cached under the group's version stamp (core.cache) with a short TTL:
+stock, sale and catalog writes call invalidate_metrics() (directly or through
+dashboard.signals) so a widget is fresh after a write, the TTL bounds anything
+the invalidation misses (e.g. a date rolling over).
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from core.cache import bump_version_on_commit, get_versions
+from products.models import Product, Supplier
+from stock.models import StockItemTracking
+from sales.models import DailySalesSummary
+
+
+GROUPS = ('inventory', 'sales', 'suppliers', 'movements')
+
+
+def metrics_namespace(group):
+    return f"dashboard_metrics:{group}"
+
+
+def invalidate_metrics(*groups):
+    """Invalidate the given widget groups (all if none given) once the transaction commits."""
+    bump_version_on_commit(*[metrics_namespace(group) for group in groups or GROUPS])
+
+
+def inventory_metrics():
+    threshold = settings.LOW_STOCK_THRESHOLD
+    # Every batch belongs to a product, so one LEFT JOIN from Product covers both tables
+    result = Product.objects.aggregate(
+        total_products=Count('id', distinct=True),
+        low_stock_items=Count('stock_items', filter=Q(stock_items__quantity__lte=threshold)),
+        out_of_stock_items=Count('stock_items', filter=Q(stock_items__quantity=0)),
+        total_stock_quantity=Sum('stock_items__quantity'),
+    )
+    result['total_stock_quantity'] = result['total_stock_quantity'] or 0
+    return result
+
+
+def sales_metrics():
+    today = timezone.localdate()
+    result = DailySalesSummary.objects.filter(date__gte=today - timedelta(days=7)).aggregate(
+        sales_today_count=Sum('sale_count', filter=Q(date=today)),
+        sales_today_revenue=Sum('net_amount', filter=Q(date=today)),
+        sales_last_week_count=Sum('sale_count'),
+        sales_last_week_revenue=Sum('net_amount'),
+    )
+    result = {key: value or 0 for key, value in result.items()}
+    result['sales_last_week_average'] = (
+        result['sales_last_week_revenue'] / result['sales_last_week_count'] if result['sales_last_week_count'] else 0
+    )
+    return result
+
+
+def supplier_metrics():
+    result = Supplier.objects.aggregate(
+        total_suppliers=Count('id', distinct=True),
+        supplier_stock_items=Count('supplied_items'),
+        supplier_quantity=Sum('supplied_items__quantity'),
+    )
+    result['supplier_quantity'] = result['supplier_quantity'] or 0
+    return result
+
+
+def movement_metrics(limit=5):
+    movements = StockItemTracking.objects.select_related('stock_item__product').order_by('-created_at')[:limit]
+    return {'recent_movements': list(movements)}
+
+
+COMPUTE = {
+    'inventory': inventory_metrics,
+    'sales': sales_metrics,
+    'suppliers': supplier_metrics,
+    'movements': movement_metrics,
+}
+
+
+def get_metrics(groups=GROUPS):
+    """
+    Return (metrics, timings) for the given widget groups.
+
+    metrics is a flat dict of every group's values, timings maps each group to
+    {'ms': float, 'cached': bool} so the cost of a widget can be inspected
+    (DashboardView sends it as a Server-Timing header).
+    """
+    versions = get_versions([metrics_namespace(group) for group in groups])
+    keys = {group: f"{metrics_namespace(group)}:{versions[metrics_namespace(group)]}" for group in groups}
+    cached = cache.get_many(keys.values())
+
+    metrics, timings = {}, {}
+    for group in groups:
+        started = time.perf_counter()
+        values = cached.get(keys[group])
+        if values is None:
+            values = COMPUTE[group]()
+            cache.set(keys[group], values, settings.DASHBOARD_METRICS_TTL)
+        timings[group] = {'ms': (time.perf_counter() - started) * 1000, 'cached': keys[group] in cached}
+        metrics.update(values)
+    return metrics, timings
+
+
+def server_timing(timings):
+    """Format timings as a Server-Timing header value."""
+    return ", ".join(
+        f'{group};dur={timing["ms"]:.1f};desc="{"cached" if timing["cached"] else "computed"}"'
+        for group, timing in timings.items()
+    )
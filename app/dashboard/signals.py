@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from dashboard.metrics import invalidate_metrics
+from products.models import Product, Supplier
+from stock.models import StockItem, StockItemTracking
+
+
+# Bulk writes (quantity UPDATEs, bulk_create) skip these, StockItemManager and
+# SaleManager call invalidate_metrics() themselves.
+
+@receiver([post_save, post_delete], sender=StockItem)
+def invalidate_stock_metrics(sender, **kwargs):
+    invalidate_metrics('inventory', 'suppliers')
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_metrics(sender, **kwargs):
+    invalidate_metrics('inventory', 'movements')
+
+
+@receiver([post_save, post_delete], sender=Supplier)
+def invalidate_supplier_metrics(sender, **kwargs):
+    invalidate_metrics('suppliers')
+
+
+@receiver([post_save, post_delete], sender=StockItemTracking)
+def invalidate_movement_metrics(sender, **kwargs):
+    invalidate_metrics('movements')
@@ -1,3 +1,158 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from core.tests import ViewTestCase
+from dashboard.analytics import bucket_edges, sales_series
+from dashboard.metrics import get_metrics
+from products.models import Product, Supplier
+from sales.models import Sale
+from stock.models import StockItem
+
+
+class DashboardMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='cashier', password='password', role='cashier')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 10)
+
+    def cached_groups(self):
+        return {group for group, timing in get_metrics()[1].items() if timing['cached']}
+
+    def sell(self, quantity):
+        items = [{'stock_item': self.kibble, 'product': self.kibble.product, 'quantity': quantity, 'sale_price': Decimal('4.00')}]
+        return Sale.objects.create_sale(self.user, items)
+
+    def test_groups_are_cached_until_a_write_commits(self):
+        metrics = get_metrics()[0]
+        self.assertEqual((metrics['sales_today_count'], metrics['total_stock_quantity']), (0, 10))
+        self.assertEqual(self.cached_groups(), {'inventory', 'sales', 'suppliers', 'movements'})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.sell(3)
+        # Nothing is dropped before the transaction commits
+        self.assertEqual(self.cached_groups(), {'inventory', 'sales', 'suppliers', 'movements'})
+        for callback in callbacks:
+            callback()
+
+        # Stock quantities feed the inventory and supplier widgets
+        self.assertEqual(self.cached_groups(), set())
+        metrics = get_metrics()[0]
+        self.assertEqual(metrics['sales_today_count'], 1)
+        self.assertEqual(metrics['sales_today_revenue'], Decimal('12.00'))
+        self.assertEqual(metrics['total_stock_quantity'], 7)
+        self.assertEqual(metrics['recent_movements'][0].movement_type, 'sale')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.create(name='Acme')
+        self.assertEqual(self.cached_groups(), {'inventory', 'sales', 'movements'})
+        self.assertEqual(get_metrics()[0]['total_suppliers'], 1)
+
+
+class DashboardWidgetTests(ViewTestCase):
+    # 10:00 on 2 March in Asia/Dhaka (UTC+6)
+    now = timezone.make_aware(datetime(2026, 3, 2, 10, 0))
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+        self.client.force_login(self.user)
+        self.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 100)
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sell_at(self, *local_time):
+        items = [{'stock_item': self.kibble, 'product': self.kibble.product, 'quantity': 1, 'sale_price': Decimal('10.00')}]
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create_sale(self.user, items, sold_at=timezone.make_aware(datetime(*local_time)))
+
+    def widget(self, name):
+        return self.client.get(reverse('dashboard:widget', args=[name]))
+
+    def test_days_follow_local_midnight(self):
+        # 00:05 local is 18:05 UTC the day before, 23:55 local is 17:55 UTC the same day
+        self.sell_at(2026, 3, 2, 0, 5)
+        self.sell_at(2026, 3, 1, 23, 55)
+        self.sell_at(2026, 2, 23, 0, 5)
+        self.sell_at(2026, 2, 22, 23, 55)
+
+        response = self.widget('sales_today')
+        self.assertContains(response, 'salesToday: 1')
+        self.assertContains(response, '৳ 10.00')
+        # The week is today and the seven days before it
+        response = self.widget('weekly_sales')
+        self.assertContains(response, '<span class="font-bold text-lg">3</span>', html=True)
+        self.assertContains(response, '৳ 30.00')
+
+    def test_cashiers_do_not_see_store_widgets(self):
+        self.client.force_login(get_user_model().objects.create_user(username='cashier', password='password', role='cashier'))
+        for widget in ('sales_today', 'weekly_sales', 'inventory'):
+            self.assertEqual(self.widget(widget).status_code, 403)
+
+
+class SalesAnalyticsTests(ViewTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+        self.client.force_login(self.user)
+        self.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 100)
+
+    def sell_at(self, *local_time, quantity=1):
+        items = [{'stock_item': self.kibble, 'product': self.kibble.product, 'quantity': quantity, 'sale_price': Decimal('10.00')}]
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create_sale(self.user, items, sold_at=timezone.make_aware(datetime(*local_time)))
+
+    def test_buckets_start_at_local_midnight(self):
+        self.sell_at(2026, 3, 1, 23, 55)
+        self.sell_at(2026, 3, 2, 0, 5, quantity=2)
+        self.sell_at(2026, 2, 28, 12, 0)
+
+        result = sales_series(date(2026, 3, 1), date(2026, 3, 2))
+        self.assertEqual(result['buckets'], ['2026-03-01T00:00:00+06:00', '2026-03-02T00:00:00+06:00'])
+        self.assertEqual((result['sales'], result['revenue'], result['quantity']), ([1, 1], [10.0, 20.0], [1, 2]))
+        self.assertEqual(result['previous_totals'], {'sales': 1, 'revenue': 10.0, 'quantity': 1})
+
+        result = sales_series(date(2026, 3, 1), date(2026, 3, 2), bucket='hour')
+        self.assertEqual(len(result['buckets']), 48)
+        self.assertEqual((result['buckets'][23], result['sales'][23], result['sales'][24]), ('2026-03-01T23:00:00+06:00', 1, 1))
+
+        result = sales_series(date(2026, 2, 28), date(2026, 3, 2), bucket='month')
+        self.assertEqual(result['buckets'], ['2026-02-01T00:00:00+06:00', '2026-03-01T00:00:00+06:00'])
+        self.assertEqual(result['sales'], [1, 2])
+
+    def test_weeks_start_on_monday(self):
+        edges = bucket_edges(date(2026, 3, 4), date(2026, 3, 10), 'week')
+        self.assertEqual([edge.isoformat() for edge in edges], [
+            '2026-03-02T00:00:00+06:00', '2026-03-09T00:00:00+06:00', '2026-03-16T00:00:00+06:00',
+        ])
+
+    def test_hours_follow_daylight_saving_changes(self):
+        with timezone.override('Europe/London'):
+            edges = bucket_edges(date(2026, 3, 29), date(2026, 3, 29), 'hour')
+        self.assertEqual(len(edges) - 1, 23)
+        with timezone.override('Europe/London'):
+            edges = bucket_edges(date(2026, 10, 25), date(2026, 10, 25), 'hour')
+        self.assertEqual([edge.isoformat() for edge in edges[1:3]], ['2026-10-25T01:00:00+01:00', '2026-10-25T01:00:00+00:00'])
+        self.assertEqual(len(edges) - 1, 25)
+
+    def test_view_rejects_bad_parameters(self):
+        url = reverse('dashboard:sales_analytics')
+        self.assertEqual(self.client.get(url, {'bucket': 'day'}).status_code, 200)
+        for params in ({'bucket': 'minute'}, {'start': '2026-03-02', 'end': '2026-03-01'}, {'window': '0'}, {'end': 'soon'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_view_rejects_ranges_past_the_calendar(self):
+        url = reverse('dashboard:sales_analytics')
+        for params in ({'end': '0001-01-01'}, {'start': '0001-01-01', 'end': '0001-01-02'}, {'start': '2020-01-01', 'end': '9999-12-31'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 'error')
@@ -6,6 +6,8 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='dashboard'),
+    path('widgets/<slug:widget>/', views.DashboardWidgetView.as_view(), name='widget'),
+    path('analytics/sales/', views.SalesAnalyticsView.as_view(), name='sales_analytics'),
     path('cashier/', views.cashier_dashboard, name='cashier'),
     path('manager/', views.inventory_manager_dashboard, name='inventory_manager'),
     path('veterinarian/', views.veterinarian_dashboard, name='veterinarian'),
@@ -1,15 +1,20 @@
+import time
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Sum
-from django.utils import timezone
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
 from django.shortcuts import render
 from django.contrib.auth.decorators import user_passes_test
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
-from datetime import timedelta
 from core.mixins import RoleRequiredMixin
-from stock.models import StockItem, StockItemTracking
-from products.models import Product, Supplier
-from sales.models import Sale
+from core.cache import get_version
+from core.responses import FastJsonResponse
+from dashboard.analytics import parse_range, sales_series
+from dashboard.metrics import get_metrics, metrics_namespace, server_timing
 
 def role_required(role):
   def decorator(view_func):
@@ -43,50 +48,8 @@ class DashboardView(LoginRequiredMixin, RoleRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Inventory Metrics
-        total_products = Product.objects.count()
-        low_stock_threshold = 10  # Configurable threshold
-        low_stock_items = StockItem.objects.filter(quantity__lte=low_stock_threshold).count()
-        out_of_stock_items = StockItem.objects.filter(quantity=0).count()
-        total_stock_quantity = StockItem.objects.aggregate(total=Sum('quantity'))['total'] or 0
-        
-        # Sales Metrics (today and last 7 days)
-        today = timezone.now().date()
-        last_week = today - timedelta(days=7)
-        sales_today = Sale.objects.filter(created_at__date=today).aggregate(
-            count=Count('id'),
-            total_revenue=Sum('total_amount')
-        )
-        sales_last_week = Sale.objects.filter(created_at__date__gte=last_week).aggregate(
-            count=Count('id'),
-            total_revenue=Sum('total_amount')
-        )
-        
-        # Supplier Metrics
-        total_suppliers = Supplier.objects.count()
-        supplier_stock_items = Supplier.objects.aggregate(total_items=Count('supplied_items'))['total_items']
-        supplier_quantity = Supplier.objects.aggregate(total_quantity=Sum('supplied_items__quantity'))['total_quantity'] or 0
-        
-        # Recent Stock Movements (last 5)
-        recent_movements = StockItemTracking.objects.select_related('stock_item__product').order_by('-created_at')[:5]
-        
+        # Only the shell, every widget is loaded by its own request (DashboardWidgetView)
         context.update({
-            # Inventory
-            'total_products': total_products,
-            'low_stock_items': low_stock_items,
-            'out_of_stock_items': out_of_stock_items,
-            'total_stock_quantity': total_stock_quantity,
-            # Sales
-            'sales_today_count': sales_today['count'],
-            'sales_today_revenue': sales_today['total_revenue'] or 0,
-            'sales_last_week_count': sales_last_week['count'],
-            'sales_last_week_revenue': sales_last_week['total_revenue'] or 0,
-            # Suppliers
-            'total_suppliers': total_suppliers,
-            'supplier_stock_items': supplier_stock_items,
-            'supplier_quantity': supplier_quantity,
-            # Stock Movements
-            'recent_movements': recent_movements,
             # Action URLs (adjust to your URL names)
             'create_sale_url': 'sales:sale_create',
             'pos_url': 'sales:sale_pos_create',
@@ -103,6 +66,71 @@ class DashboardView(LoginRequiredMixin, RoleRequiredMixin, TemplateView):
         return context
 
 
+# Widget name -> metrics group it renders, template and the roles that may see it
+DASHBOARD_WIDGETS = {
+    'sales_today': {'group': 'sales', 'template': 'dashboard/widgets/sales_today.html', 'roles': ['inventory_manager', 'admin']},
+    'weekly_sales': {'group': 'sales', 'template': 'dashboard/widgets/weekly_sales.html', 'roles': ['inventory_manager', 'admin']},
+    'inventory': {'group': 'inventory', 'template': 'dashboard/widgets/inventory.html', 'roles': ['inventory_manager', 'admin']},
+    'inventory_alerts': {'group': 'inventory', 'template': 'dashboard/widgets/inventory_alerts.html', 'roles': ['inventory_manager', 'admin']},
+    'suppliers': {'group': 'suppliers', 'template': 'dashboard/widgets/suppliers.html', 'roles': ['inventory_manager', 'admin']},
+    'movements': {'group': 'movements', 'template': 'dashboard/widgets/movements.html', 'roles': ['inventory_manager', 'admin']},
+}
+
+
+class DashboardWidgetView(LoginRequiredMixin, View):
+    """
+    One dashboard widget as an HTML fragment, loaded by dashboard/widgets/lazy.html.
+    The fragment is cached per widget under its metrics group version, so it is rebuilt
+    after a relevant write, and the browser may reuse it for DASHBOARD_WIDGET_MAX_AGE.
+    """
+
+    def get(self, request, widget, *args, **kwargs):
+        spec = DASHBOARD_WIDGETS.get(widget)
+        if spec is None:
+            raise Http404("Unknown dashboard widget.")
+        if request.user.role not in spec['roles']:
+            raise PermissionDenied("You do not have permission to access this widget.")
+
+        started = time.perf_counter()
+        key = f"dashboard_widget:{widget}:{get_version(metrics_namespace(spec['group']))}"
+        html = cache.get(key)
+        cached = html is not None
+        if not cached:
+            metrics, _ = get_metrics([spec['group']])
+            html = render_to_string(spec['template'], metrics)
+            cache.set(key, html, settings.DASHBOARD_METRICS_TTL)
+
+        response = HttpResponse(html)
+        patch_cache_control(response, private=True, max_age=settings.DASHBOARD_WIDGET_MAX_AGE)
+        response['Server-Timing'] = server_timing({widget: {'ms': (time.perf_counter() - started) * 1000, 'cached': cached}})
+        return response
+
+
+class SalesAnalyticsView(LoginRequiredMixin, RoleRequiredMixin, View):
+    """
+    Bucketed sales series as JSON (dashboard.analytics.sales_series).
+
+    Query parameters: start and end (YYYY-MM-DD, the last 30 days by default),
+    bucket (hour, day, week or month), window (moving average buckets) and product.
+    """
+    allowed_roles = ['inventory_manager', 'admin']
+
+    def get(self, request, *args, **kwargs):
+        try:
+            start, end = parse_range(request.GET)
+            window = int(request.GET.get('window', 7))
+            product_id = int(request.GET['product']) if request.GET.get('product') else None
+            if window < 1:
+                raise ValueError("The window must be at least 1.")
+            result = sales_series(start, end, request.GET.get('bucket', 'day'), window, product_id)
+        # OverflowError: the range or the one before it reaches past date.min or date.max
+        except (ValueError, OverflowError) as e:
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+        response = FastJsonResponse(result)
+        patch_cache_control(response, private=True, max_age=settings.DASHBOARD_WIDGET_MAX_AGE)
+        return response
+
 
 @role_required('cashier')
 def cashier_dashboard(request):
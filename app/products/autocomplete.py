@@ -0,0 +1,151 @@
+"""
+In-process product typeahead.
+
+Every word of a product's name plus its SKU and barcode are kept as (token, product_id)
+pairs in one sorted list, so each query word is a bisect to the first token it prefixes.
+Product writes (saves, deletes and stock counter changes) log their ids under the
+product_autocomplete version stamp, readers reload only the logged products and
+rebuild everything when the log cannot tell what changed.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from core.cache import get_changes, get_version, record_changes_on_commit
+from products.models import Product
+from sales.models import SaleItem
+
+
+AUTOCOMPLETE_NAMESPACE = 'product_autocomplete'
+TERM_RE = re.compile(r'\w+')
+
+# Ranking tiers, lower first
+EXACT_CODE, NAME_PREFIX, WORD_PREFIX = 0, 1, 2
+
+
+def record_product_changes(*product_ids):
+    """Reload these products in every worker's autocomplete once the transaction commits."""
+    record_changes_on_commit(AUTOCOMPLETE_NAMESPACE, *product_ids)
+
+
+def normalize(text):
+    return ' '.join(TERM_RE.findall((text or '').lower()))
+
+
+class ProductAutocomplete:
+    """
+    Ranked prefix search over product names, SKUs and barcodes.
+
+    Matches rank an exact SKU or barcode first, then names starting with the query,
+    then names with words starting with each query word. Ties go to the products
+    sold most over the last PRODUCT_AUTOCOMPLETE_SALES_DAYS, then to the name.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._tokens = []
+        self._sales = {}
+        self._sales_loaded_at = None
+        self._version = None
+        self._lock = threading.RLock()
+
+    def _load(self, pks=None):
+        products = Product.objects.order_by()
+        if pks is not None:
+            products = products.filter(pk__in=pks)
+        rows = products.values('id', 'name', 'sku', 'barcode', 'sale_price', 'stock_on_hand', 'created_at')
+        entries = {}
+        for row in rows.iterator(chunk_size=5000):
+            codes = {code.lower() for code in (row['sku'], row['barcode']) if code}
+            row['name_key'] = normalize(row['name'])
+            row['codes'] = codes
+            row['tokens'] = set(row['name_key'].split()) | set(TERM_RE.findall(' '.join(codes))) | codes
+            entries[row['id']] = row
+        return entries
+
+    def _load_sales(self):
+        since = timezone.now() - timedelta(days=settings.PRODUCT_AUTOCOMPLETE_SALES_DAYS)
+        sold = SaleItem.objects.filter(sale__created_at__gte=since).order_by().values('product').annotate(sold=Sum('quantity'))
+        self._sales = {row['product']: row['sold'] for row in sold}
+        self._sales_loaded_at = time.monotonic()
+
+    def _add(self, entry):
+        self._entries[entry['id']] = entry
+        for token in entry['tokens']:
+            bisect.insort(self._tokens, (token, entry['id']))
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        for token in entry['tokens'] if entry else ():
+            index = bisect.bisect_left(self._tokens, (token, pk))
+            if index < len(self._tokens) and self._tokens[index] == (token, pk):
+                del self._tokens[index]
+
+    def refresh(self):
+        # Version read before the data, a concurrent change can only make entries look stale
+        version = get_version(AUTOCOMPLETE_NAMESPACE)
+        with self._lock:
+            if version != self._version:
+                changed = get_changes(AUTOCOMPLETE_NAMESPACE, self._version, version)
+                if changed is None:
+                    self._entries = self._load()
+                    self._tokens = sorted((token, pk) for pk, entry in self._entries.items() for token in entry['tokens'])
+                else:
+                    loaded = self._load(changed)
+                    for pk in changed:
+                        self._remove(pk)
+                        if pk in loaded:
+                            self._add(loaded[pk])
+                self._version = version
+            if self._sales_loaded_at is None or time.monotonic() - self._sales_loaded_at > settings.PRODUCT_AUTOCOMPLETE_SALES_REFRESH:
+                self._load_sales()
+
+    def _match(self, terms):
+        """Ids of the products having a token starting with each term."""
+        matched = None
+        # Longest terms first, they narrow the candidates fastest
+        for term in sorted(set(terms), key=len, reverse=True):
+            ids = set()
+            index = bisect.bisect_left(self._tokens, (term,))
+            while index < len(self._tokens) and self._tokens[index][0].startswith(term):
+                ids.add(self._tokens[index][1])
+                index += 1
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return set()
+        return matched
+
+    def search(self, query, limit=25, in_stock=False):
+        """
+        Return up to `limit` product entries (dicts of id, name, sku, barcode, sale_price,
+        stock_on_hand and created_at) best first. An empty query returns the newest products.
+        """
+        self.refresh()
+        terms = TERM_RE.findall((query or '').lower())
+        with self._lock:
+            candidates = [self._entries[pk] for pk in self._match(terms)] if terms else list(self._entries.values())
+            sales = self._sales
+        if in_stock:
+            candidates = [entry for entry in candidates if entry['stock_on_hand'] > 0]
+        if not terms:
+            return heapq.nlargest(limit, candidates, key=lambda entry: (entry['created_at'], entry['id']))
+
+        code, name_key = (query or '').strip().lower(), ' '.join(terms)
+
+        def rank(entry):
+            if code in entry['codes']:
+                tier = EXACT_CODE
+            elif entry['name_key'].startswith(name_key):
+                tier = NAME_PREFIX
+            else:
+                tier = WORD_PREFIX
+            return tier, -sales.get(entry['id'], 0), entry['name_key'], entry['id']
+        return heapq.nsmallest(limit, candidates, key=rank)
+
+
+product_autocomplete = ProductAutocomplete()
@@ -0,0 +1,95 @@
+import threading
+from django.db.models import F
+from core.cache import bump_version_on_commit, get_version
+from products.models import Category
+
+
+CATEGORY_TREE_NAMESPACE = 'category_tree'
+
+
+def invalidate_category_tree():
+    """Rebuild the category tree in every worker once the transaction commits."""
+    bump_version_on_commit(CATEGORY_TREE_NAMESPACE)
+
+
+class CategoryTree:
+    """
+    Immutable snapshot of every category.
+
+    Nodes are dicts with id, name, slug, parent_id, path and depth, so templates
+    use them like Category instances ({{ category.id }}, {{ category.name }}).
+    Children are sorted by name.
+    """
+
+    def __init__(self, rows):
+        self.nodes = {row['id']: row for row in rows}
+        self.children = {pk: [] for pk in self.nodes}
+        self.roots = []
+        for node in sorted(self.nodes.values(), key=lambda node: node['name'].lower()):
+            self.children.get(node['parent_id'], self.roots).append(node['id'])
+
+    def get(self, pk):
+        return self.nodes.get(pk)
+
+    def parent(self, pk):
+        node = self.nodes.get(pk)
+        return self.nodes.get(node['parent_id']) if node and node['parent_id'] else None
+
+    def children_of(self, pk):
+        return [self.nodes[child] for child in self.children.get(pk, [])]
+
+    def ancestors(self, pk):
+        """Nodes from the root down to the parent."""
+        node = self.nodes.get(pk)
+        if node is None:
+            return []
+        return [self.nodes[int(ancestor)] for ancestor in node['path'].split('/')[:-2] if int(ancestor) in self.nodes]
+
+    def descendant_ids(self, pk):
+        ids, stack = [], list(self.children.get(pk, []))
+        while stack:
+            child = stack.pop()
+            ids.append(child)
+            stack.extend(self.children[child])
+        return ids
+
+    def options(self, exclude_subtree_of=None):
+        """
+        Every node depth-first with siblings by name, for <select> options. Each node has a
+        `label` indented by depth. exclude_subtree_of leaves out a category and its descendants.
+        """
+        options, stack = [], list(reversed(self.roots))
+        while stack:
+            pk = stack.pop()
+            if pk == exclude_subtree_of:
+                continue
+            node = self.nodes[pk]
+            options.append({**node, 'label': f"{'— ' * node['depth']}{node['name']}"})
+            stack.extend(reversed(self.children[pk]))
+        return options
+
+
+class CategoryTreeCache:
+    """
+    Process-level CategoryTree, loaded with one query and rebuilt when the
+    category_tree version stamp changes (products.signals bumps it on every
+    category write). Steady-state pages only pay the version check.
+    """
+
+    def __init__(self):
+        self._tree = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = get_version(CATEGORY_TREE_NAMESPACE)
+        if self._version != version:
+            # Version read before the data, a concurrent bump can only make the tree look stale
+            rows = Category.objects.order_by().values('id', 'name', 'slug', 'path', 'depth', parent_id=F('parent_category_id'))
+            tree = CategoryTree(list(rows))
+            with self._lock:
+                self._tree, self._version = tree, version
+        return self._tree
+
+
+category_tree = CategoryTreeCache()
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Product.stock_on_hand / stock_batch_count with the StockItem rows and repair any drift. "
+        "Drift means StockItem rows were written without their signals (queryset update(), raw SQL, fixtures)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only report drift, exit with an error if any is found')
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            drifted = list(
+                Product.objects.with_counted_stock()
+                .filter(~Q(stock_on_hand=F('counted_on_hand')) | ~Q(stock_batch_count=F('counted_batches')))
+                .order_by('pk')
+                .values_list('pk', 'name', 'stock_on_hand', 'counted_on_hand', 'stock_batch_count', 'counted_batches')
+            )
+            for pk, name, on_hand, counted_on_hand, batches, counted_batches in drifted:
+                self.stdout.write(
+                    f"#{pk} {name}: on hand {on_hand} (counted {counted_on_hand}), "
+                    f"batches {batches} (counted {counted_batches})"
+                )
+
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS("Every product's stock counters match its stock items."))
+                return
+            if kwargs['verify']:
+                raise CommandError(f"{len(drifted)} products have drifted stock counters, run without --verify to repair them.")
+
+            # Lock the products before recounting, a concurrent stock write then adds its delta
+            # on top of the repaired value instead of being counted twice
+            pks = [row[0] for row in drifted]
+            list(Product.objects.select_for_update().filter(pk__in=pks).values_list('pk', flat=True))
+            counted = Product.objects.filter(pk__in=pks).with_counted_stock()
+            for pk, on_hand, batches in counted.values_list('pk', 'counted_on_hand', 'counted_batches'):
+                Product.objects.filter(pk=pk).update(stock_on_hand=on_hand, stock_batch_count=batches)
+
+        self.stdout.write(self.style.SUCCESS(f"Repaired the stock counters of {len(drifted)} products."))
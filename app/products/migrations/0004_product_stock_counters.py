@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:45
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_stock_counters(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    StockItem = apps.get_model('stock', 'StockItem')
+    totals = StockItem.objects.order_by().values('product').annotate(on_hand=Sum('quantity'), batches=Count('pk'))
+    for row in totals.iterator():
+        Product.objects.filter(pk=row['product']).update(stock_on_hand=row['on_hand'] or 0, stock_batch_count=row['batches'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_alter_product_sale_price'),
+        ('stock', '0003_alter_stockitem_sale_price_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_batch_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Stock Batches'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_on_hand',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Stock On Hand'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock_on_hand'], name='products_pr_stock_o_2a7e80_idx'),
+        ),
+        migrations.RunPython(populate_stock_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:48
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_category_id'))
+    paths = {}
+
+    def path_of(pk, seen=()):
+        if pk not in paths:
+            parent = parents[pk]
+            # A cycle (possible before moves were validated) is cut where it closes
+            if parent is None or parent == pk or parent in seen:
+                paths[pk] = f"{pk}/"
+            else:
+                paths[pk] = f"{path_of(parent, seen + (pk,))}{pk}/"
+        return paths[pk]
+
+    for pk in parents:
+        path = path_of(pk)
+        Category.objects.filter(pk=pk).update(path=path, depth=path.count('/') - 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_stock_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Depth'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='Path'),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
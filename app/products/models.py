@@ -1,5 +1,7 @@
-from django.db import models
-from django.db.models import Sum
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.utils.translation import gettext as _
 from django_extensions.db.fields import AutoSlugField
 from django.core.exceptions import ValidationError
@@ -17,6 +19,16 @@ from core.models import AbstractBaseModel, AbstractNameDescriptionModel, Abstrac
 User = get_user_model()
 
 
+class SupplierQuerySet(models.QuerySet):
+    def with_stock_totals(self):
+        """Annotate stock_item_count and stock_quantity over the supplied StockItems with one grouped join."""
+        # Meta.ordering is not applied to GROUP BY queries, keep it explicitly
+        return self.annotate(
+            stock_item_count=Count('supplied_items'),
+            stock_quantity=Coalesce(Sum('supplied_items__quantity'), Value(0)),
+        ).order_by(*(self.query.order_by or self.model._meta.ordering))
+
+
 class Supplier(AbstractNameDescriptionModel):
     """
     Model to represent suppliers of products.
@@ -25,17 +37,25 @@ class Supplier(AbstractNameDescriptionModel):
     email = models.EmailField(_("Contact Email"), blank=True, null=True) 
     phone = models.CharField(_("Contact Phone"), max_length=20, blank=True, null=True)
 
+    objects = SupplierQuerySet.as_manager()
+
     @property
     def total_product_items(self):
         """
         Get the total number of products supplied by this supplier.
+        Uses the Supplier.objects.with_stock_totals() annotation when present.
         """
+        if hasattr(self, 'stock_item_count'):
+            return self.stock_item_count
         return self.supplied_items.count()
     
     def get_product_quantities(self):
         """
         Get the total quantity of products supplied by this supplier.
+        Uses the Supplier.objects.with_stock_totals() annotation when present.
         """
+        if hasattr(self, 'stock_quantity'):
+            return self.stock_quantity
         result = self.supplied_items.aggregate(total_quantity=Sum('quantity'))
         return result['total_quantity'] or 0
     
@@ -61,10 +81,33 @@ class Supplier(AbstractNameDescriptionModel):
         return self.name
 
 
+class CategoryManager(models.Manager):
+    """
+    Keeps the materialised path of the category tree.
+
+    Every category stores `path`, the primary keys from its root down to itself
+    (e.g. "1/5/12/"), and its `depth` (0 for root categories). A subtree is then a
+    single `path LIKE '1/5/%'` query and ancestors are read from the path itself.
+    """
+
+    def subtree(self, category):
+        """The category and all of its descendants."""
+        return self.filter(path__startswith=category.path)
+
+    def move_subtree(self, old_path, new_path):
+        """Rewrite the path and depth of every category under old_path (itself included) to start with new_path."""
+        depth_change = new_path.count('/') - old_path.count('/')
+        return self.filter(path__startswith=old_path).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1), output_field=models.CharField()),
+            depth=F('depth') + depth_change,
+        )
+
+
 class Category(AbstractNameDescriptionModel):
     """
     Model to represent product categories.
-    Note: use MPTTModel if we consider deep category hierarchies
+    The tree is stored as a materialised path (see CategoryManager), kept in sync on
+    save (create and move) and by the post_delete signal in products.signals.
     """
     slug = AutoSlugField(_("Slug"), populate_from='name', unique=True, max_length=255)
     parent_category = models.ForeignKey(
@@ -75,6 +118,10 @@ class Category(AbstractNameDescriptionModel):
         null=True, 
         verbose_name=_("Parent Category")
     )
+    path = models.CharField(_("Path"), max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(_("Depth"), default=0, editable=False)
+
+    objects = CategoryManager()
 
     class Meta:
         verbose_name = _("Category")
@@ -88,37 +135,132 @@ class Category(AbstractNameDescriptionModel):
         return self.subcategories.exists()
 
     def get_all_descendants(self):
-        """Get all descendant categories recursively."""
-        descendants = []
-        for child in self.subcategories.all():
-            descendants.append(child)
-            descendants.extend(child.get_all_descendants())
-        return descendants
+        """Get all descendant categories, parents before their children."""
+        return list(Category.objects.subtree(self).exclude(pk=self.pk).order_by('depth', 'name'))
 
     def get_all_descendants_ids(self):
-        """Get all descendant category IDs efficiently."""
-        descendant_ids = []
-        for child in self.subcategories.only('pk'):
-            descendant_ids.append(child.pk)
-            descendant_ids.extend(child.get_all_descendants_ids())
-        return descendant_ids
+        """Get all descendant category IDs with one query."""
+        return list(Category.objects.subtree(self).exclude(pk=self.pk).values_list('pk', flat=True))
+
+    def get_ancestor_ids(self):
+        """IDs from the root down to the parent, read from the path (no query)."""
+        return [int(pk) for pk in self.path.split('/')[:-2]]
+
+    def get_ancestors(self):
+        """Get the ancestor categories from the root down to the parent."""
+        return list(Category.objects.filter(pk__in=self.get_ancestor_ids()).order_by('depth'))
 
     def get_root_category(self):
         """Get the root (top-level) category for this category."""
-        if self.parent_category is None:
+        if self.parent_category_id is None:
             return self
-        return self.parent_category.get_root_category()
+        return Category.objects.get(pk=self.get_ancestor_ids()[0])
 
     def get_level(self):
         """Get the depth level of this category (0 for root categories)."""
-        if self.parent_category is None:
-            return 0
-        return self.parent_category.get_level() + 1
+        return self.depth
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_category_id and (
+            self.parent_category_id == self.pk
+            or Category.objects.subtree(self).filter(pk=self.parent_category_id).exists()
+        ):
+            raise ValidationError({'parent_category': _("A category cannot be moved under itself or one of its subcategories.")})
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        """Save and keep the materialised path of the category and its subtree in sync."""
+        parent_path = ''
+        if self.parent_category_id:
+            parent_path = Category.objects.values_list('path', flat=True).get(pk=self.parent_category_id)
+            if self.pk and f"/{self.pk}/" in f"/{parent_path}":
+                raise ValidationError(_("A category cannot be moved under itself or one of its subcategories."))
+
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            self.path = f"{parent_path}{self.pk}/"
+            self.depth = self.path.count('/') - 1
+            Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            return
+
+        old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+        new_path = f"{parent_path}{self.pk}/"
+        # The tree columns are only written through the UPDATEs below
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('path', 'depth')
+                and field.attname not in self.get_deferred_fields()
+            ]
+        super().save(*args, **kwargs)
+        if old_path != new_path:
+            if old_path:
+                Category.objects.move_subtree(old_path, new_path)
+            else:
+                Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_path.count('/') - 1)
+        self.path, self.depth = new_path, new_path.count('/') - 1
 
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_total_stock(self):
+        """
+        Annotate total_stock (sum of quantity over every StockItem, 0 when none) as a
+        correlated subquery, so listings don't run one aggregate per product.
+        """
+        StockItem = apps.get_model('stock', 'StockItem')
+        total = StockItem.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+            total=Sum('quantity')
+        ).values('total')
+        return self.annotate(total_stock=Coalesce(Subquery(total, output_field=IntegerField()), Value(0)))
+
+    def in_category(self, category):
+        """Products of the category (a Category or a category_tree node) and all of its subcategories."""
+        path = category['path'] if isinstance(category, dict) else category.path
+        return self.filter(category__path__startswith=path)
+
+    def with_counted_stock(self):
+        """Annotate counted_on_hand and counted_batches recomputed from StockItem, to check the stored counters."""
+        StockItem = apps.get_model('stock', 'StockItem')
+        batches = StockItem.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+            count=Count('pk')
+        ).values('count')
+        return self.with_total_stock().annotate(
+            counted_on_hand=F('total_stock'),
+            counted_batches=Coalesce(Subquery(batches, output_field=IntegerField()), Value(0)),
+        )
+
+    def apply_stock_changes(self, quantities=None, batches=None):
+        """
+        Add signed deltas to the stored stock_on_hand / stock_batch_count counters with one
+        F-expression UPDATE, in the same transaction as the StockItem write.
+
+        Args:
+            quantities: Dict of {product_id: on-hand quantity delta}.
+            batches: Dict of {product_id: batch count delta}.
+        """
+        quantities = {pk: delta for pk, delta in (quantities or {}).items() if delta}
+        batches = {pk: delta for pk, delta in (batches or {}).items() if delta}
+        updates = {}
+        if quantities:
+            updates['stock_on_hand'] = Case(
+                *[When(pk=pk, then=F('stock_on_hand') + delta) for pk, delta in quantities.items()],
+                default=F('stock_on_hand'), output_field=models.PositiveIntegerField()
+            )
+        if batches:
+            updates['stock_batch_count'] = Case(
+                *[When(pk=pk, then=F('stock_batch_count') + delta) for pk, delta in batches.items()],
+                default=F('stock_batch_count'), output_field=models.PositiveIntegerField()
+            )
+        if updates:
+            from products.autocomplete import record_product_changes
+            self.filter(pk__in=quantities.keys() | batches.keys()).update(**updates)
+            record_product_changes(*quantities.keys() | batches.keys())
+
+
 class Product(AbstractNameDescriptionModel):
     """
     Model to represent products in the system.
@@ -145,11 +287,23 @@ class Product(AbstractNameDescriptionModel):
     )
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, blank=True, null=True, related_name='products')
     image = models.ImageField(_("Image"), upload_to='products/', blank=True, null=True)
+    # Denormalised from StockItem, only ever written through ProductQuerySet.apply_stock_changes(), by
+    # StockItemManager's bulk updates and the stock.signals StockItem save/delete receivers
+    # (see manage.py rebuild_product_stock to check or repair them)
+    stock_on_hand = models.PositiveIntegerField(_("Stock On Hand"), default=0, editable=False)
+    stock_batch_count = models.PositiveIntegerField(_("Stock Batches"), default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    STOCK_COUNTER_FIELDS = ('stock_on_hand', 'stock_batch_count')
 
     class Meta:
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['stock_on_hand']),
+        ]
 
     def __str__(self):
         return self.name
@@ -165,9 +319,12 @@ class Product(AbstractNameDescriptionModel):
     def get_total_stock(self):
         """
         Return the total quantity of this product across all StockItem instances.
+        Uses the total_stock annotation (Product.objects.with_total_stock()) when present,
+        the stored stock_on_hand counter otherwise.
         """
-        result = self.stock_items.aggregate(total=Sum('quantity'))
-        return result['total'] or 0
+        if hasattr(self, 'total_stock'):
+            return self.total_stock
+        return self.stock_on_hand
 
 
     def generate_sku(self):
@@ -263,6 +420,13 @@ class Product(AbstractNameDescriptionModel):
         if is_new:
             self.generate_sku()
             self.generate_barcode()
+        elif kwargs.get('update_fields') is None:
+            # Never write the stock counters from a possibly stale instance
+            skipped = set(self.STOCK_COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped and field.name not in skipped
+            ]
         
         super().save(*args, **kwargs)
 
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from core.pagination import invalidate_counts
+from products.autocomplete import record_product_changes
+from products.category_tree import invalidate_category_tree
+from products.models import Category, Product, Supplier
+
+
+@receiver(post_delete, sender=Category)
+def reroot_subcategories(sender, instance, **kwargs):
+    """The children were set to top-level categories (SET_NULL), move their subtrees to the root."""
+    children = Category.objects.filter(path__startswith=instance.path, depth=instance.depth + 1)
+    for pk, path in children.values_list('pk', 'path'):
+        Category.objects.move_subtree(path, f"{pk}/")
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def refresh_autocomplete(sender, instance, **kwargs):
+    record_product_changes(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Supplier)
+def invalidate_list_counts(sender, **kwargs):
+    """Edits matter too, they can move rows in or out of a filtered list."""
+    invalidate_counts(sender)
@@ -0,0 +1,64 @@
+"""
+Cached supplied-products breakdown of a supplier.
+
+Pages are cached under the supplier's version stamp, which stock writes bump for
+the suppliers of the batches they touch (StockItemManager and the stock signals)
+and product edits for the suppliers of the product's batches.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from core.cache import bump_version_on_commit, get_version
+
+
+def supplier_products_namespace(supplier_id):
+    return f"supplier_products:{supplier_id}"
+
+
+def invalidate_supplier_products(*supplier_ids):
+    """Invalidate the cached breakdown of the given suppliers once the transaction commits."""
+    supplier_ids = {supplier_id for supplier_id in supplier_ids if supplier_id}
+    if supplier_ids:
+        bump_version_on_commit(*[supplier_products_namespace(supplier_id) for supplier_id in supplier_ids])
+
+
+def get_supplied_products_page(supplier, page_number=1, per_page=10):
+    """
+    Return one page of the supplier's products with their supplied quantities.
+
+    Returns:
+        Dict with 'products' (dicts of name, barcode, image_url, sale_price, cost_price
+        and total_quantity), 'number', 'num_pages' and 'count'.
+    """
+    try:
+        number = max(int(page_number), 1)
+    except (TypeError, ValueError):
+        number = 1
+    namespace = supplier_products_namespace(supplier.pk)
+    key = f"{namespace}:{get_version(namespace)}:{per_page}:{number}"
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    # Out of range pages show the last page
+    paginator = Paginator(supplier.get_supplied_products(), per_page)
+    page = paginator.get_page(number)
+    result = {
+        'products': [
+            {
+                'name': row['product__name'],
+                'barcode': row['product__barcode'],
+                'image_url': default_storage.url(row['product__image']) if row['product__image'] else None,
+                'sale_price': row['product__sale_price'],
+                'cost_price': row['product__cost_price'],
+                'total_quantity': row['total_quantity'],
+            }
+            for row in page
+        ],
+        'number': page.number,
+        'num_pages': paginator.num_pages,
+        'count': paginator.count,
+    }
+    cache.set(key, result, settings.SUPPLIER_PRODUCTS_TTL)
+    return result
@@ -1,3 +1,347 @@
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from core.tests import ViewTestCase
+from products.autocomplete import ProductAutocomplete
+from products.category_tree import category_tree
+from products.models import Category, Product, Supplier
+from sales.models import Sale
+from stock.models import StockItem, StockLocation
+
+
+class ProductListQueryCountTests(ViewTestCase):
+    """The product listings run a constant number of queries, however many rows a page has."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+        cls.category = Category.objects.create(name='Food')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_products(self, count, quantity=3):
+        # Commit callbacks drop the cached page counts
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                product = Product.objects.create(name=f'Product {Product.objects.count()}', category=self.category)
+                StockItem.objects.create(product=product, quantity=quantity)
+                StockItem.objects.create(product=product, quantity=quantity)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response
+
+    def assert_constant_queries(self, url):
+        self.create_products(2)
+        few, _ = self.count_queries(url)
+        self.create_products(18)
+        many, response = self.count_queries(url)
+        self.assertEqual(few, many)
+        return response
+
+    def test_product_list(self):
+        response = self.assert_constant_queries(reverse('products:product_list'))
+        self.assertEqual(response.context['products'][0].total_stock, 6)
+
+    def test_product_list_partial(self):
+        response = self.assert_constant_queries(reverse('products:product_list_partial') + '?search=Product')
+        self.assertContains(response, 'In Stock', count=20)
+
+    def test_out_of_stock_product(self):
+        Product.objects.create(name='Empty', category=self.category)
+        response = self.client.get(reverse('products:product_list_partial') + '?search=Empty')
+        self.assertContains(response, 'Out of Stock')
+        self.assertEqual(response.context['products'][0].total_stock, 0)
+
+    def test_get_total_stock_without_annotation(self):
+        self.create_products(1, quantity=4)
+        self.assertEqual(Product.objects.get().get_total_stock(), 8)
+        self.assertEqual(Product.objects.with_total_stock().get().get_total_stock(), 8)
+
+
+class SupplierViewTests(ViewTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_supplier(self, products=2, quantity=4):
+        supplier = Supplier.objects.create(name=f'Supplier {Supplier.objects.count()}')
+        for index in range(products):
+            product = Product.objects.create(name=f'{supplier.name} product {index}')
+            StockItem.objects.create_stock(product, quantity, supplier=supplier)
+        return supplier
+
+    def test_supplier_list_queries_are_constant(self):
+        self.create_supplier()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('products:supplier_list_partial'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(10):
+                self.create_supplier()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('products:supplier_list_partial'))
+        self.assertEqual(len(few), len(many))
+        supplier = response.context['suppliers'][0]
+        self.assertEqual((supplier.total_product_items, supplier.get_product_quantities()), (2, 8))
+
+    def test_supplied_products_are_paginated_and_invalidated(self):
+        supplier = self.create_supplier(products=12)
+        response = self.client.get(reverse('products:supplier_detail', args=[supplier.pk]))
+        self.assertEqual(len(response.context['supplied']['products']), 10)
+        self.assertEqual(response.context['supplied']['num_pages'], 2)
+
+        response = self.client.get(reverse('products:supplier_products', args=[supplier.pk]) + '?page=2')
+        self.assertEqual(len(response.context['supplied']['products']), 2)
+
+        # Cached until stock from this supplier changes
+        with self.captureOnCommitCallbacks(execute=True):
+            StockItem.objects.create_stock(Product.objects.create(name='New'), 1, supplier=supplier)
+        response = self.client.get(reverse('products:supplier_products', args=[supplier.pk]) + '?page=2')
+        self.assertEqual(len(response.context['supplied']['products']), 3)
+
+        stock_item = StockItem.objects.filter(supplier=supplier, product__name='New').get()
+        with self.captureOnCommitCallbacks(execute=True):
+            StockItem.objects.adjust_stock(stock_item, 9)
+        response = self.client.get(reverse('products:supplier_products', args=[supplier.pk]))
+        self.assertIn(9, [row['total_quantity'] for row in response.context['supplied']['products']])
+
+        # and until one of its products is edited
+        with self.captureOnCommitCallbacks(execute=True):
+            stock_item.product.name = 'Renamed'
+            stock_item.product.save()
+        response = self.client.get(reverse('products:supplier_products', args=[supplier.pk]))
+        self.assertIn('Renamed', [row['name'] for row in response.context['supplied']['products']])
+
+
+class CategoryTreeTests(TestCase):
+
+    def setUp(self):
+        self.food = Category.objects.create(name='Food')
+        self.dog = Category.objects.create(name='Dog food', parent_category=self.food)
+        self.puppy = Category.objects.create(name='Puppy food', parent_category=self.dog)
+        self.toys = Category.objects.create(name='Toys')
+
+    def refresh(self, *categories):
+        for category in categories:
+            category.refresh_from_db()
+
+    def test_paths_and_depth(self):
+        self.assertEqual(self.puppy.path, f'{self.food.pk}/{self.dog.pk}/{self.puppy.pk}/')
+        self.assertEqual(self.puppy.get_level(), 2)
+        with self.assertNumQueries(1):
+            self.assertCountEqual(self.food.get_all_descendants_ids(), [self.dog.pk, self.puppy.pk])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.puppy.get_ancestors(), [self.food, self.dog])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.puppy.get_root_category(), self.food)
+
+    def test_move_rewrites_subtree(self):
+        self.dog.parent_category = self.toys
+        self.dog.save()
+        self.refresh(self.puppy)
+        self.assertEqual(self.puppy.path, f'{self.toys.pk}/{self.dog.pk}/{self.puppy.pk}/')
+        self.assertEqual(self.food.get_all_descendants_ids(), [])
+
+        self.dog.parent_category = None
+        self.dog.save()
+        self.refresh(self.puppy)
+        self.assertEqual((self.puppy.path, self.puppy.depth), (f'{self.dog.pk}/{self.puppy.pk}/', 1))
+
+    def test_move_under_own_subtree_is_rejected(self):
+        self.food.parent_category = self.puppy
+        with self.assertRaises(ValidationError):
+            self.food.full_clean()
+        with self.assertRaises(ValidationError):
+            self.food.save()
+
+    def test_delete_moves_children_to_the_root(self):
+        self.dog.delete()
+        self.refresh(self.puppy)
+        self.assertEqual((self.puppy.path, self.puppy.depth), (f'{self.puppy.pk}/', 0))
+
+    def test_products_in_subtree(self):
+        kibble = Product.objects.create(name='Kibble', category=self.puppy)
+        Product.objects.create(name='Ball', category=self.toys)
+        self.assertEqual(list(Product.objects.in_category(self.food)), [kibble])
+
+
+class CategoryTreeCacheTests(TestCase):
+
+    def setUp(self):
+        # Version stamps are bumped on commit, run the callbacks so the snapshot sees these rows
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Food')
+            self.dog = Category.objects.create(name='Dog food', parent_category=self.food)
+            self.cat = Category.objects.create(name='Cat food', parent_category=self.food)
+            self.toys = Category.objects.create(name='Toys')
+
+    def test_snapshot(self):
+        tree = category_tree.get()
+        self.assertEqual(
+            [option['label'] for option in tree.options()],
+            ['Food', '— Cat food', '— Dog food', 'Toys']
+        )
+        self.assertEqual([option['name'] for option in tree.options(exclude_subtree_of=self.food.pk)], ['Toys'])
+        self.assertEqual(tree.parent(self.dog.pk)['name'], 'Food')
+        self.assertCountEqual(tree.descendant_ids(self.food.pk), [self.dog.pk, self.cat.pk])
+        self.assertEqual([node['name'] for node in tree.ancestors(self.dog.pk)], ['Food'])
+        with self.assertNumQueries(0):
+            category_tree.get()
+
+    def test_rebuilt_after_category_write(self):
+        category_tree.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dog.parent_category = self.toys
+            self.dog.save()
+        self.assertEqual(category_tree.get().parent(self.dog.pk)['name'], 'Toys')
+
+
+class ProductAutocompleteTests(ViewTestCase):
+
+    def setUp(self):
+        # Product changes are logged on commit, run the callbacks so the index sees them
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kibble = Product.objects.create(name='Dog Food Kibble')
+            self.treats = Product.objects.create(name='Dog Treats')
+            self.hotdog = Product.objects.create(name='Hot Dog Toy')
+        self.autocomplete = ProductAutocomplete()
+
+    def names(self, query, **kwargs):
+        return [entry['name'] for entry in self.autocomplete.search(query, **kwargs)]
+
+    def test_ranking(self):
+        self.assertEqual(self.names('dog'), ['Dog Food Kibble', 'Dog Treats', 'Hot Dog Toy'])
+        self.assertEqual(self.names('do t'), ['Dog Treats', 'Hot Dog Toy'])
+        self.assertEqual(self.names(self.hotdog.sku), ['Hot Dog Toy'])
+        self.assertEqual(self.names(self.treats.barcode[:7]), ['Dog Treats'])
+        self.assertEqual(self.names(''), ['Hot Dog Toy', 'Dog Treats', 'Dog Food Kibble'])
+        self.assertEqual(self.names('cat'), [])
+
+        # Best sellers first within a tier
+        self.autocomplete.refresh()
+        self.autocomplete._sales = {self.treats.pk: 3}
+        self.assertEqual(self.names('dog')[:2], ['Dog Treats', 'Dog Food Kibble'])
+
+    def test_incremental_refresh(self):
+        self.autocomplete.search('dog')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kibble.name = 'Cat Kibble'
+            self.kibble.save()
+            StockItem.objects.create_stock(self.treats, 4)
+            self.hotdog.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names('dog', in_stock=True), ['Dog Treats'])
+        self.assertEqual(self.names('cat'), ['Cat Kibble'])
+        self.assertEqual(self.autocomplete.search('treats')[0]['stock_on_hand'], 4)
+        with self.assertNumQueries(0):
+            self.autocomplete.search('dog')
+
+    def test_api_requires_login(self):
+        url = reverse('products:search_products')
+        self.assertEqual(self.client.get(url, {'q': 'dog'}).status_code, 302)
+        self.client.force_login(get_user_model().objects.create_user(username='cashier', password='password'))
+        response = self.client.get(url, {'q': 'dog tr'})
+        self.assertEqual([row['value'] for row in response.json()], [self.treats.pk])
+
+
+class ProductStockCounterTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+        self.kibble = Product.objects.create(name='Kibble')
+        self.treats = Product.objects.create(name='Treats')
+
+    def assertCounters(self, product, on_hand, batches):
+        stored = Product.objects.values_list('stock_on_hand', 'stock_batch_count').get(pk=product.pk)
+        counted = Product.objects.with_counted_stock().values_list('counted_on_hand', 'counted_batches').get(pk=product.pk)
+        self.assertEqual((stored, counted), ((on_hand, batches), (on_hand, batches)))
+
+    def test_counters_follow_every_stock_write(self):
+        first = StockItem.objects.create_stock(self.kibble, 5)
+        second = StockItem.objects.create_stock(self.kibble, 3)
+        self.assertCounters(self.kibble, 8, 2)
+
+        StockItem.objects.adjust_stock(first, 7)
+        self.assertCounters(self.kibble, 10, 2)
+
+        # The first transfer to the shelf adds a batch there, the next one tops it up
+        shelf = StockLocation.objects.create(name='Shelf')
+        StockItem.objects.transfer_stock(first, 2, shelf)
+        self.assertCounters(self.kibble, 10, 3)
+        StockItem.objects.transfer_stock(second, 3, shelf)
+        self.assertCounters(self.kibble, 10, 3)
+
+        Sale.objects.create_sale(self.user, [
+            {'stock_item': first, 'product': self.kibble, 'quantity': 4, 'sale_price': Decimal('5.00')},
+        ])
+        self.assertCounters(self.kibble, 6, 3)
+
+        StockItem.objects.delete_stock(first)
+        self.assertCounters(self.kibble, 5, 2)
+        self.assertCounters(self.treats, 0, 0)
+
+    def test_empty_batches_still_count(self):
+        batch = StockItem.objects.create_stock(self.kibble, 2)
+        Sale.objects.create_sale(self.user, [
+            {'stock_item': batch, 'product': self.kibble, 'quantity': 2, 'sale_price': Decimal('5.00')},
+        ])
+        self.assertCounters(self.kibble, 0, 1)
+        StockItem.objects.adjust_stock(StockItem.objects.get(pk=batch.pk), 4)
+        self.assertCounters(self.kibble, 4, 1)
+
+    def test_plain_saves_and_deletes_do_not_drift(self):
+        # Admin forms and scripts write StockItem rows directly
+        batch = StockItem.objects.create(product=self.kibble, quantity=5)
+        StockItem.objects.create(product=self.kibble, quantity=1)
+        self.assertCounters(self.kibble, 6, 2)
+
+        batch.quantity = 8
+        batch.save()
+        self.assertCounters(self.kibble, 9, 2)
+        # Columns other than product and quantity leave the counters alone
+        batch.expiration_date = None
+        batch.save(update_fields=['expiration_date'])
+        self.assertCounters(self.kibble, 9, 2)
+
+        batch.product = self.treats
+        batch.quantity = 2
+        batch.save()
+        self.assertCounters(self.kibble, 1, 1)
+        self.assertCounters(self.treats, 2, 1)
+
+        batch.delete()
+        self.assertCounters(self.treats, 0, 0)
+        StockItem.objects.filter(product=self.kibble).delete()
+        self.assertCounters(self.kibble, 0, 0)
+        call_command('rebuild_product_stock', verify=True, stdout=StringIO())
+
+    def test_rebuild_repairs_drifted_counters(self):
+        StockItem.objects.create_stock(self.kibble, 5)
+        StockItem.objects.create_stock(self.treats, 2)
+        Product.objects.filter(pk=self.kibble.pk).update(stock_on_hand=99, stock_batch_count=0)
+        Product.objects.filter(pk=self.treats.pk).update(stock_batch_count=3)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_product_stock', verify=True, stdout=StringIO())
+        self.assertEqual(Product.objects.get(pk=self.kibble.pk).stock_on_hand, 99)
+
+        out = StringIO()
+        call_command('rebuild_product_stock', stdout=out)
+        self.assertIn("Repaired the stock counters of 2 products.", out.getvalue())
+        self.assertCounters(self.kibble, 5, 1)
+        self.assertCounters(self.treats, 2, 1)
+        call_command('rebuild_product_stock', verify=True, stdout=StringIO())
@@ -23,6 +23,7 @@ urlpatterns = [
     path('suppliers/partial/', views.SupplierListPartialView.as_view(), name='supplier_list_partial'),
     path('suppliers/create/', views.SupplierCreateView.as_view(), name='supplier_create'),
     path('suppliers/<int:pk>/', views.SupplierDetailView.as_view(), name='supplier_detail'),
+    path('suppliers/<int:pk>/products/', views.SupplierProductsPartialView.as_view(), name='supplier_products'),
     path('suppliers/<int:pk>/update/', views.SupplierUpdateView.as_view(), name='supplier_update'),
     path('suppliers/<int:pk>/delete/', views.SupplierDeleteView.as_view(), name='supplier_delete'),
     path('labels/generate/', views.GenerateLabelView.as_view(), name='generate_label'),
@@ -1,13 +1,21 @@
 from django.shortcuts import redirect, get_object_or_404
 from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView, TemplateView
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.db.models import Q
+from django.db.models import Count
 from django.http import JsonResponse
 
 from .models import Product, Category, Supplier
+from .autocomplete import product_autocomplete
+from .category_tree import category_tree
+from .suppliers import get_supplied_products_page
 from core.mixins import RoleRequiredMixin
+from core.pagination import CachedCountPaginator
+from core.responses import FastJsonResponse
+from search.models import SearchEntry
+from search.query import ranked
 
 
 class ProductListPartialView(LoginRequiredMixin, ListView):
@@ -16,16 +24,14 @@ class ProductListPartialView(LoginRequiredMixin, ListView):
     template_name = 'products/partials/product_list_partial.html'
     context_object_name = 'products'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('category')
+        queryset = super().get_queryset().select_related('category').with_total_stock()
         search = self.request.GET.get('search')
 
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(barcode__icontains=search)
-            )
+            queryset = ranked(queryset, SearchEntry.Kind.PRODUCT, search)
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -38,17 +44,20 @@ class ProductListView(LoginRequiredMixin, ListView):
     template_name = 'products/product_list.html'
     context_object_name = 'products'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('category')
+        queryset = super().get_queryset().select_related('category').with_total_stock()
         category_id = self.request.GET.get('category_id')
         if category_id:
-            queryset = queryset.filter(category_id=category_id)
+            # Products of the category and of all its subcategories
+            category = category_tree.get().get(int(category_id)) if category_id.isdigit() else None
+            queryset = queryset.in_category(category) if category else queryset.none()
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = category_tree.get().options()
         if self.request.headers.get('HX-Request'):
             context['template_to_extend'] = 'partials/base_empty.html'
         else:
@@ -64,7 +73,7 @@ class ProductCreateView(LoginRequiredMixin, RoleRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = category_tree.get().options()
         return context
 
     def form_valid(self, form):
@@ -91,7 +100,7 @@ class ProductUpdateView(LoginRequiredMixin, RoleRequiredMixin, UpdateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = category_tree.get().options()
         return context
     
     def form_valid(self, form):
@@ -143,6 +152,7 @@ class CategoryListView(LoginRequiredMixin, ListView):
     template_name = 'products/category_list.html'
     context_object_name = 'categories'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -163,7 +173,7 @@ class CategoryCreateView(LoginRequiredMixin, RoleRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['parent_categories'] = Category.objects.all()
+        context['parent_categories'] = category_tree.get().options()
         return context
         
     def form_valid(self, form):
@@ -194,13 +204,8 @@ class CategoryUpdateView(LoginRequiredMixin, RoleRequiredMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-         # Get descendant IDs efficiently using the model method
-        excluded_ids = [self.object.pk] + self.object.get_all_descendants_ids()
-        
-        # Only select necessary fields for performance
-        context['categories'] = Category.objects.exclude(
-            pk__in=excluded_ids
-        ).only('pk', 'name', 'parent_category').order_by('name')
+        # The category and its subtree can't become its parent
+        context['categories'] = category_tree.get().options(exclude_subtree_of=self.object.pk)
         
         return context
         
@@ -219,6 +224,16 @@ class CategoryDeleteView(LoginRequiredMixin, RoleRequiredMixin, DeleteView):
     success_url = reverse_lazy('products:category_list')
     allowed_roles = ['admin', 'inventory_manager']
 
+    def get_queryset(self):
+        return super().get_queryset().annotate(product_count=Count('products'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        tree = category_tree.get()
+        context['parent_category'] = tree.parent(self.object.pk)
+        context['subcategory_count'] = len(tree.children_of(self.object.pk))
+        return context
+
     def form_valid(self, form):
         messages.success(self.request, "Category deleted successfully.")
         return super().form_valid(form)
@@ -234,16 +249,14 @@ class SupplierListPartialView(LoginRequiredMixin, ListView):
     template_name = 'products/partials/supplier_list_partial.html'
     context_object_name = 'suppliers'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().with_stock_totals()
         search = self.request.GET.get('search')
 
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(email__icontains=search)
-            )
+            queryset = ranked(queryset, SearchEntry.Kind.SUPPLIER, search)
         return queryset
     
     def get_context_data(self, **kwargs):
@@ -256,6 +269,10 @@ class SupplierListView(LoginRequiredMixin, ListView):
     template_name = 'products/supplier_list.html'
     context_object_name = 'suppliers'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
+
+    def get_queryset(self):
+        return super().get_queryset().with_stock_totals()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -287,7 +304,23 @@ class SupplierDetailView(LoginRequiredMixin, DetailView):
     model = Supplier
     template_name = 'products/modals/supplier_detail_modal.html'
     context_object_name = 'supplier'
-    
+    products_per_page = 10
+
+    def get_queryset(self):
+        return super().get_queryset().with_stock_totals()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['supplied'] = get_supplied_products_page(
+            self.object, self.request.GET.get('page', 1), self.products_per_page
+        )
+        return context
+
+
+class SupplierProductsPartialView(SupplierDetailView):
+    """One page of the supplied products in the supplier detail modal"""
+    template_name = 'products/partials/supplier_products_partial.html'
+
 
 class SupplierUpdateView(LoginRequiredMixin, RoleRequiredMixin, UpdateView):
     model = Supplier
@@ -321,21 +354,23 @@ class SupplierDeleteView(LoginRequiredMixin, RoleRequiredMixin, DeleteView):
     
 
 
+@login_required
 def product_search_api(request):
-    query = request.GET.get('q', '')
-    products = Product.objects.filter(name__icontains=query).order_by('-created_at')[:25]
+    """Typeahead results from the in-memory product autocomplete, no database query when warm."""
+    products = product_autocomplete.search(request.GET.get('q', ''), limit=25, in_stock=bool(request.GET.get('in_stock')))
 
     results = []
     for product in products:
         results.append({
-            "value": product.id,
-            "text": f"{product.name} — ৳{product.sale_price or 0}",
-            "name": product.name,
-            "price": float(product.sale_price or 0),
-            "barcode": product.barcode
+            "value": product['id'],
+            "text": f"{product['name']} — ৳{product['sale_price'] or 0}",
+            "name": product['name'],
+            "price": float(product['sale_price'] or 0),
+            "barcode": product['barcode'],
+            "stock": product['stock_on_hand']
         })
 
-    return JsonResponse(results, safe=False)
+    return FastJsonResponse(results, safe=False)
 
 
 class GenerateLabelView(LoginRequiredMixin, TemplateView):
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from sales.models import Sale, SaleItem
+from sales.models import DailySalesSummary, PrintJob, Sale, SaleItem
 
 admin.site.register(Sale)
 admin.site.register(SaleItem)
+admin.site.register(PrintJob)
+admin.site.register(DailySalesSummary)
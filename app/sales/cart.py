@@ -0,0 +1,332 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from core.cache import bump_version, get_version
+from stock.models import StockItem
+from sales.models import PosCartLine
+
+
+def resolve_cart_items(lines):
+    """
+    Resolve cart lines into the item dicts expected by SaleManager.create_sale().
+    Every StockItem and its Product are loaded with a single query and all lines are
+    validated in one pass, so the cost does not grow with the basket size.
+
+    Args:
+        lines: Iterable of dicts with {stock_item_id, quantity, sale_price}.
+
+    Returns:
+        List of dicts with {stock_item, product, quantity, sale_price}.
+
+    Raises:
+        ValidationError: Listing every line that is missing or has insufficient stock.
+    """
+    lines = list(lines)
+    stock_items = StockItem.objects.select_related('product').in_bulk(
+        {int(line['stock_item_id']) for line in lines}
+    )
+
+    items = []
+    errors = []
+    requested = {}
+    for line in lines:
+        stock_item = stock_items.get(int(line['stock_item_id']))
+        if stock_item is None:
+            errors.append(f"Stock item #{line['stock_item_id']} no longer exists.")
+            continue
+
+        quantity = line['quantity']
+        requested[stock_item.pk] = requested.get(stock_item.pk, 0) + quantity
+        items.append({
+            'stock_item': stock_item,
+            'product': stock_item.product,
+            'quantity': quantity,
+            'sale_price': line['sale_price']
+        })
+
+    for pk, quantity in requested.items():
+        stock_item = stock_items[pk]
+        if stock_item.quantity < quantity:
+            errors.append(f"Insufficient stock for {stock_item.product.name}. Available: {stock_item.quantity}, Requested: {quantity}")
+
+    if errors:
+        raise ValidationError(errors)
+    return items
+
+
+def changes_cart(method):
+    """Bump the cart revision once per outermost mutating call."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._mutating:
+            return method(self, *args, **kwargs)
+        self._mutating = True
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            self._mutating = False
+        self.revision = bump_version(self.revision_namespace)
+        return result
+    return wrapper
+
+
+class BaseCartStore:
+    """
+    Storage for an open POS cart, keyed by user and till.
+
+    Every operation touches a single line, so a barcode scan only writes what changed.
+    Lines are dicts with {stock_item_id, product_name, barcode, quantity, sale_price,
+    needs_manual_price, available_quantity}. Pick the implementation with
+    settings.POS_CART_STORE (dotted path).
+
+    Each mutation increments the cart revision by one (a core.cache version stamp), so a
+    client that sent revision N and gets N + 1 back can apply just the changed lines.
+    Any other value means it missed a change (or the stamp was evicted) and must resync.
+    """
+
+    def __init__(self, user, till='default'):
+        self.user = user
+        self.till = till
+        self.revision = None
+        self._mutating = False
+
+    @property
+    def revision_namespace(self):
+        return f"pos_cart:{self.user.pk}:{self.till}"
+
+    def get_revision(self):
+        self.revision = get_version(self.revision_namespace)
+        return self.revision
+
+    def lines(self, stock_item_ids=None):
+        """Return every line (or only the given stock items) in insertion order."""
+        raise NotImplementedError
+
+    def get(self, stock_item_id):
+        """Return the line for the stock item or None."""
+        raise NotImplementedError
+
+    def add(self, line):
+        """Insert the line, or increment the quantity of the existing line for the same stock item."""
+        raise NotImplementedError
+
+    @changes_cart
+    def add_many(self, lines):
+        """Add several lines as one unit, one line per stock item."""
+        for line in lines:
+            self.add(line)
+
+    def set_quantity(self, stock_item_id, quantity, available_quantity=None):
+        raise NotImplementedError
+
+    def set_price(self, stock_item_id, sale_price):
+        """Set a manual unit price, this clears needs_manual_price."""
+        raise NotImplementedError
+
+    def remove(self, stock_item_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class DatabaseCartStore(BaseCartStore):
+    """Cart lines stored as PosCartLine rows, one row per stock item."""
+
+    def _queryset(self):
+        return PosCartLine.objects.filter(user=self.user, till=self.till)
+
+    def _to_dict(self, line):
+        return {
+            'stock_item_id': line.stock_item_id,
+            'product_name': line.product_name,
+            'barcode': line.barcode,
+            'quantity': line.quantity,
+            'sale_price': float(line.sale_price) if line.sale_price is not None else None,
+            'needs_manual_price': line.needs_manual_price,
+            'available_quantity': line.available_quantity,
+        }
+
+    def lines(self, stock_item_ids=None):
+        queryset = self._queryset()
+        if stock_item_ids is not None:
+            queryset = queryset.filter(stock_item_id__in=stock_item_ids)
+        return [self._to_dict(line) for line in queryset]
+
+    def get(self, stock_item_id):
+        line = self._queryset().filter(stock_item_id=stock_item_id).first()
+        return self._to_dict(line) if line else None
+
+    def _increment(self, line):
+        return self._queryset().filter(stock_item_id=line['stock_item_id']).update(
+            quantity=F('quantity') + line['quantity'],
+            available_quantity=line['available_quantity'],
+            updated_at=timezone.now()
+        )
+
+    @changes_cart
+    def add(self, line):
+        if self._increment(line):
+            return
+        try:
+            # Savepoint, a concurrent scan of the same item may insert the row first
+            with transaction.atomic():
+                PosCartLine.objects.create(user=self.user, till=self.till, **line)
+        except IntegrityError:
+            self._increment(line)
+
+    @changes_cart
+    @transaction.atomic
+    def add_many(self, lines):
+        """Insert new lines with one bulk INSERT and increment existing ones with one UPDATE."""
+        lines = {line['stock_item_id']: line for line in lines}
+        if not lines:
+            return
+        queryset = self._queryset().filter(stock_item_id__in=lines)
+        existing = set(queryset.values_list('stock_item_id', flat=True))
+        if existing:
+            queryset.filter(stock_item_id__in=existing).update(
+                quantity=Case(
+                    *[When(stock_item_id=pk, then=F('quantity') + lines[pk]['quantity']) for pk in existing],
+                    output_field=models.PositiveIntegerField()
+                ),
+                available_quantity=Case(
+                    *[When(stock_item_id=pk, then=Value(lines[pk]['available_quantity'])) for pk in existing],
+                    output_field=models.PositiveIntegerField()
+                ),
+                updated_at=timezone.now()
+            )
+        new_lines = [line for pk, line in lines.items() if pk not in existing]
+        try:
+            with transaction.atomic():
+                PosCartLine.objects.bulk_create([
+                    PosCartLine(user=self.user, till=self.till, **line) for line in new_lines
+                ])
+        except IntegrityError:
+            # Another request added one of these items meanwhile, fall back to line by line
+            for line in new_lines:
+                self.add(line)
+
+    @changes_cart
+    def set_quantity(self, stock_item_id, quantity, available_quantity=None):
+        values = {'quantity': quantity, 'updated_at': timezone.now()}
+        if available_quantity is not None:
+            values['available_quantity'] = available_quantity
+        return self._queryset().filter(stock_item_id=stock_item_id).update(**values)
+
+    @changes_cart
+    def set_price(self, stock_item_id, sale_price):
+        return self._queryset().filter(stock_item_id=stock_item_id).update(
+            sale_price=sale_price, needs_manual_price=False, updated_at=timezone.now()
+        )
+
+    @changes_cart
+    def remove(self, stock_item_id):
+        return self._queryset().filter(stock_item_id=stock_item_id).delete()[0]
+
+    @changes_cart
+    def clear(self):
+        self._queryset().delete()
+
+
+class CacheCartStore(BaseCartStore):
+    """
+    Cart lines stored in the Django cache, one key per line plus an index of stock item ids.
+    Needs a cache shared by every worker (e.g. Redis or Memcached) and carts are lost on eviction.
+
+    Mutations read, change and write back the line and the index, so each one holds a
+    per-cart lock (an atomic cache.add() key) and two tills of the same cashier scanning at
+    once cannot drop each other's lines or increments.
+    """
+    timeout = 60 * 60 * 12
+    # A crashed worker's lock expires after lock_timeout seconds, far longer than any mutation
+    lock_timeout = 5
+
+    def _key(self, suffix):
+        return f"pos_cart:{self.user.pk}:{self.till}:{suffix}"
+
+    @contextmanager
+    def _lock(self):
+        key = self._key('lock')
+        while not cache.add(key, 1, self.lock_timeout):
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            cache.delete(key)
+
+    def _index(self):
+        return cache.get(self._key('index'), [])
+
+    def lines(self, stock_item_ids=None):
+        index = self._index()
+        if stock_item_ids is not None:
+            wanted = set(stock_item_ids)
+            index = [pk for pk in index if pk in wanted]
+        stored = cache.get_many([self._key(pk) for pk in index])
+        return [stored[self._key(pk)] for pk in index if self._key(pk) in stored]
+
+    def get(self, stock_item_id):
+        return cache.get(self._key(stock_item_id))
+
+    @changes_cart
+    def add(self, line):
+        with self._lock():
+            existing = self.get(line['stock_item_id'])
+            if existing:
+                existing['quantity'] += line['quantity']
+                existing['available_quantity'] = line['available_quantity']
+                cache.set(self._key(line['stock_item_id']), existing, self.timeout)
+                return
+            cache.set(self._key(line['stock_item_id']), dict(line), self.timeout)
+            cache.set(self._key('index'), self._index() + [line['stock_item_id']], self.timeout)
+
+    def _update(self, stock_item_id, **values):
+        with self._lock():
+            line = self.get(stock_item_id)
+            if not line:
+                return 0
+            line.update(values)
+            cache.set(self._key(stock_item_id), line, self.timeout)
+            return 1
+
+    @changes_cart
+    def set_quantity(self, stock_item_id, quantity, available_quantity=None):
+        values = {'quantity': quantity}
+        if available_quantity is not None:
+            values['available_quantity'] = available_quantity
+        return self._update(stock_item_id, **values)
+
+    @changes_cart
+    def set_price(self, stock_item_id, sale_price):
+        return self._update(stock_item_id, sale_price=sale_price, needs_manual_price=False)
+
+    @changes_cart
+    def remove(self, stock_item_id):
+        with self._lock():
+            index = self._index()
+            if stock_item_id not in index:
+                return 0
+            cache.delete(self._key(stock_item_id))
+            cache.set(self._key('index'), [pk for pk in index if pk != stock_item_id], self.timeout)
+            return 1
+
+    @changes_cart
+    def clear(self):
+        with self._lock():
+            index = self._index()
+            cache.delete_many([self._key(pk) for pk in index] + [self._key('index')])
+
+
+def get_cart_store(request):
+    """Return the configured cart store for the requesting cashier and till."""
+    till = request.POST.get('till') or request.GET.get('till') or request.COOKIES.get('pos_till') or 'default'
+    store_class = import_string(settings.POS_CART_STORE)
+    return store_class(request.user, till[:50])
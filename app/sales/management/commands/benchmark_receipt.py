@@ -0,0 +1,76 @@
+import io
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from products.models import Product
+from sales.models import Sale, SaleItem
+from sales.receipts import get_receipt_lines, render_receipt, write_receipt
+
+User = get_user_model()
+
+
+class RollbackBenchmark(Exception):
+    """Raised to discard every row written by the benchmark."""
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark the ESC/POS receipt renderer for 1-200 line receipts. All data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1, 10, 25, 50, 100, 200],
+            help='Receipt sizes (number of lines) to benchmark'
+        )
+        parser.add_argument('--repeat', type=int, default=200, help='Renders per receipt size')
+
+    def handle(self, *args, **kwargs):
+        sizes = kwargs['sizes']
+        repeat = kwargs['repeat']
+
+        self.stdout.write(
+            f"{'lines':>6} {'queries':>8} {'bytes':>8} {'render µs':>10} {'+fetch µs':>10} {'stream µs':>10}"
+        )
+        try:
+            with transaction.atomic():
+                cashier = User.objects.create(username='__benchmark_cashier__')
+                products = [
+                    Product.objects.create(name=f"Benchmark product {i}", sale_price=Decimal('123.45'))
+                    for i in range(max(sizes))
+                ]
+
+                for size in sizes:
+                    sale = Sale.objects.create(
+                        created_by=cashier,
+                        total_amount=Decimal('123.45') * size,
+                        discount_amount=Decimal('0.00')
+                    )
+                    SaleItem.objects.bulk_create([
+                        SaleItem(sale=sale, product=product, quantity=1, sale_price=product.sale_price)
+                        for product in products[:size]
+                    ])
+                    sale = Sale.objects.select_related('created_by').get(pk=sale.pk)
+
+                    with CaptureQueriesContext(connection) as captured:
+                        data = render_receipt(sale)
+                    lines = list(get_receipt_lines(sale))
+
+                    render = self._time(lambda: render_receipt(sale, lines), repeat)
+                    fetch = self._time(lambda: render_receipt(sale), repeat)
+                    stream = self._time(lambda: write_receipt(sale, io.BytesIO()), repeat)
+                    self.stdout.write(
+                        f"{size:>6} {len(captured):>8} {len(data):>8} {render:>10.1f} {fetch:>10.1f} {stream:>10.1f}"
+                    )
+                raise RollbackBenchmark
+        except RollbackBenchmark:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished, all benchmark data rolled back."))
+
+    def _time(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1_000_000
@@ -0,0 +1,81 @@
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from products.models import Product
+from stock.models import StockItem
+from sales.models import Sale
+
+User = get_user_model()
+
+
+class RollbackBenchmark(Exception):
+    """Raised to discard every row written by the benchmark."""
+
+
+class Command(BaseCommand):
+    help = "Measure SaleManager.create_sale commit latency against basket size. All data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1, 5, 10, 20, 30, 50, 100],
+            help='Basket sizes (number of lines) to benchmark'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Sales committed per basket size')
+
+    def handle(self, *args, **kwargs):
+        sizes = kwargs['sizes']
+        repeat = kwargs['repeat']
+
+        self.stdout.write(f"{'lines':>6} {'queries':>8} {'avg ms':>10} {'min ms':>10} {'max ms':>10}")
+        try:
+            with transaction.atomic():
+                cashier = User.objects.create(username='__benchmark_cashier__')
+                stock_items = self._create_stock(max(sizes), cashier)
+
+                for size in sizes:
+                    timings = []
+                    queries = 0
+                    for _ in range(repeat):
+                        items = [
+                            {
+                                'stock_item': stock_item,
+                                'product': stock_item.product,
+                                'quantity': 1,
+                                'sale_price': stock_item.sale_price,
+                            }
+                            for stock_item in stock_items[:size]
+                        ]
+                        with CaptureQueriesContext(connection) as captured:
+                            start = time.perf_counter()
+                            Sale.objects.create_sale(created_by=cashier, items=items, discount_amount=Decimal('0.00'))
+                            timings.append((time.perf_counter() - start) * 1000)
+                        queries = len(captured)
+
+                    self.stdout.write(
+                        f"{size:>6} {queries:>8} {sum(timings) / len(timings):>10.2f} "
+                        f"{min(timings):>10.2f} {max(timings):>10.2f}"
+                    )
+                raise RollbackBenchmark
+        except RollbackBenchmark:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished, all benchmark data rolled back."))
+
+    def _create_stock(self, total, created_by):
+        stock_items = []
+        for i in range(total):
+            product = Product.objects.create(
+                name=f"Benchmark product {i}",
+                cost_price=Decimal('50.00'),
+                sale_price=Decimal('100.00')
+            )
+            stock_items.append(StockItem.objects.create_stock(
+                product=product,
+                quantity=1_000_000,
+                sale_price=product.sale_price,
+                created_by=created_by
+            ))
+        return stock_items
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from sales.models import DailySalesSummary, Sale
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the DailySalesSummary rollup from the Sale table, a chunk of days per transaction. "
+        "Run it once after deploying the rollup and whenever sales were changed outside SaleManager."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First date to rebuild (YYYY-MM-DD), defaults to the first sale')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date to rebuild (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days rebuilt per transaction')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+
+        start = kwargs['start']
+        if start is None:
+            first_sale = Sale.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            if first_sale is None:
+                self.stdout.write("No sales to summarise.")
+                return
+            start = timezone.localdate(first_sale)
+        end = kwargs['end'] or timezone.localdate()
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+
+        total = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=kwargs['chunk_days'] - 1), end)
+            rows = DailySalesSummary.objects.rebuild(chunk_start, chunk_end)
+            total += rows
+            self.stdout.write(f"{chunk_start} to {chunk_end}: {rows} rows")
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} daily sales summary rows from {start} to {end}."))
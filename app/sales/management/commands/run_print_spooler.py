@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sales.models import PrintJob
+from sales.printing import get_printer_backend
+from sales.receipts import render_receipt
+
+
+class Command(BaseCommand):
+    help = "Run the receipt print spooler: render queued PrintJobs and send them to the configured printer backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **kwargs):
+        backend = get_printer_backend()
+        max_attempts = settings.RECEIPT_PRINT_MAX_ATTEMPTS
+
+        # Jobs left in "printing" by a worker that died mid-job go back to the queue
+        stale = PrintJob.objects.filter(
+            status=PrintJob.STATUS.PRINTING,
+            updated_at__lt=timezone.now() - timedelta(seconds=settings.RECEIPT_PRINT_STALE_AFTER)
+        ).update(status=PrintJob.STATUS.PENDING, updated_at=timezone.now())
+        if stale:
+            self.stdout.write(self.style.WARNING(f"Re-queued {stale} stale print jobs."))
+
+        self.stdout.write(f"Print spooler started with {backend.__class__.__name__}.")
+        while True:
+            job = PrintJob.objects.claim_next()
+            if job is None:
+                if kwargs['once']:
+                    break
+                time.sleep(kwargs['poll_interval'])
+                continue
+            self.process(job, backend, max_attempts)
+
+    def process(self, job, backend, max_attempts):
+        try:
+            sale = PrintJob.objects.select_related('sale__created_by').get(pk=job.pk).sale
+            backend.send(render_receipt(sale), f"Receipt_{sale.id}")
+        except Exception as e:
+            job.last_error = str(e)
+            if job.attempts >= max_attempts:
+                job.status = PrintJob.STATUS.FAILED
+                self.stdout.write(self.style.ERROR(f"{job} failed after {job.attempts} attempts: {e}"))
+            else:
+                job.status = PrintJob.STATUS.PENDING
+                job.available_at = timezone.now() + timedelta(seconds=min(2 ** job.attempts, 60))
+                self.stdout.write(self.style.WARNING(f"{job} attempt {job.attempts} failed, retrying: {e}"))
+            job.save(update_fields=['status', 'available_at', 'last_error', 'updated_at'])
+        else:
+            job.status = PrintJob.STATUS.PRINTED
+            job.printed_at = timezone.now()
+            job.last_error = ""
+            job.save(update_fields=['status', 'printed_at', 'last_error', 'updated_at'])
+            self.stdout.write(self.style.SUCCESS(f"✅ Printed receipt for Sale #{job.sale_id}."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:28
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_printjob'),
+        ('stock', '0003_alter_stockitem_sale_price_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosCartLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('till', models.CharField(default='default', help_text='Till (register) the cart belongs to.', max_length=50)),
+                ('product_name', models.CharField(max_length=255)),
+                ('barcode', models.CharField(blank=True, max_length=100, null=True)),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('sale_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('needs_manual_price', models.BooleanField(default=False)),
+                ('available_quantity', models.PositiveIntegerField(default=0)),
+                ('stock_item', models.ForeignKey(help_text='StockItem batch in the cart.', on_delete=django.db.models.deletion.CASCADE, related_name='pos_cart_lines', to='stock.stockitem')),
+                ('user', models.ForeignKey(help_text='Cashier who owns the cart.', on_delete=django.db.models.deletion.CASCADE, related_name='pos_cart_lines', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'till', 'stock_item'), name='unique_pos_cart_line')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_poscartline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='client_reference',
+            field=models.CharField(blank=True, help_text='Idempotency key of a sale recorded offline on a till.', max_length=64, null=True, unique=True),
+        ),
+    ]
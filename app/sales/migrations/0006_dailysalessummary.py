@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_sale_client_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('date', models.DateField(help_text='Local date of the sales.')),
+                ('sale_count', models.PositiveIntegerField(default=0)),
+                ('gross_amount', models.DecimalField(decimal_places=2, default=0, help_text='Total before discounts.', max_digits=12)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, help_text='Total after discounts.', max_digits=12)),
+                ('cashier', models.ForeignKey(blank=True, help_text='User who performed the sales.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_sales_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales summaries',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='sales_daily_date_84fae3_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('cashier__isnull', False)), fields=('date', 'cashier'), name='unique_daily_sales_summary')],
+            },
+        ),
+    ]
@@ -1,11 +1,16 @@
-from django.db import models, transaction
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 
 from core.models import AbstractBaseModel
-from stock.models import StockItem, StockItemTracking
+from stock.models import InsufficientStock, StockItem, StockItemTracking
 from products.models import Product
 
 User = get_user_model()
@@ -17,15 +22,22 @@ Returns, Refunds, Discount
 
 class SaleManager(models.Manager):
     @transaction.atomic
-    def create_sale(self, created_by, items, discount_amount=0.00, notes=""):
+    def create_sale(self, created_by, items, discount_amount=Decimal('0.00'), notes="", client_reference=None, sold_at=None):
         """
         Create a sale with multiple items, deduct stock, and log tracking.
+
+        The whole basket is committed with a fixed number of queries: stock is deducted
+        through StockItemManager.apply_quantity_changes() (rows locked in primary key
+        order, one guarded UPDATE), SaleItems and tracking rows are bulk inserted and the
+        day's DailySalesSummary row is updated in the same transaction.
         
         Args:
             created_by: User instance who performed the sale.
             items: List of dicts with {stock_item, product, quantity, sale_price}.
             discount_amount: Optional discount amount (default 0.00).
             notes: Optional notes for the sale.
+            client_reference: Optional idempotency key of a sale recorded offline on a till.
+            sold_at: Optional time the sale happened, for sales recorded offline (never in the future).
         
         Returns:
             Sale instance.
@@ -33,20 +45,23 @@ class SaleManager(models.Manager):
         Raises:
             ValidationError: If stock is insufficient or invalid data provided.
         """
+        from dashboard.metrics import invalidate_metrics
+
         if not items:
             raise ValidationError("At least one item is required for a sale.")
-        
-        # Calculate total amount and validate stock
+
+        # Calculate total amount and validate lines
         total_amount = 0
+        requested = {}
         for item in items:
             stock_item = item['stock_item']
+            product = item['product']
             quantity = item['quantity']
             sale_price = item['sale_price']
             
             if not isinstance(quantity, int) or quantity < 1:
-                raise ValidationError(f"Invalid quantity for {stock_item.product.name}: {quantity}")
-            if stock_item.quantity < quantity:
-                raise ValidationError(f"Insufficient stock for {stock_item.product.name}. Available: {stock_item.quantity}, Requested: {quantity}")
+                raise ValidationError(f"Invalid quantity for {product.name}: {quantity}")
+            requested[stock_item.pk] = requested.get(stock_item.pk, 0) + quantity
             total_amount += quantity * sale_price
         
         # Apply discount
@@ -56,47 +71,175 @@ class SaleManager(models.Manager):
         if total_amount < 0:
             raise ValidationError("Total amount cannot be negative after discount.")
         
+        # Deduct stock in the database, never from possibly stale instances
+        try:
+            quantities = StockItem.objects.apply_quantity_changes(
+                {pk: -quantity for pk, quantity in requested.items()}
+            )
+        except InsufficientStock as e:
+            names = {item['stock_item'].pk: item['product'].name for item in items}
+            raise ValidationError([
+                f"Insufficient stock for {names[pk]}. Available: {available or 0}, Requested: {quantity}"
+                for pk, (available, quantity) in e.failed.items()
+            ])
+
         # Create Sale
         sale = self.create(
             created_by=created_by,
             total_amount=total_amount,
             discount_applied=bool(discount_amount > 0),
             discount_amount=discount_amount,
-            status='completed'
+            status='completed',
+            client_reference=client_reference
         )
+        if sold_at and sold_at < sale.created_at:
+            self.filter(pk=sale.pk).update(created_at=sold_at)
+            sale.created_at = sold_at
         
-        # Create SaleItems and update StockItems
-        for item in items:
-            stock_item = item['stock_item']
-            product = item['product']
-            quantity = item['quantity']
-            sale_price = item['sale_price']
-            
-            # Create SaleItem
-            SaleItem.objects.create(
+        # Create SaleItems
+        SaleItem.objects.bulk_create([
+            SaleItem(
                 sale=sale,
-                stock_item=stock_item,
-                product=product,
-                quantity=quantity,
-                sale_price=sale_price
+                stock_item=item['stock_item'],
+                product=item['product'],
+                quantity=item['quantity'],
+                sale_price=item['sale_price']
             )
-            
-            # Deduct stock
-            stock_item.quantity -= quantity
-            stock_item.save()
-            
-            # Log in the StockItemTracking
-            StockItemTracking.objects.create(
-                stock_item=stock_item,
-                quantity=quantity,
+            for item in items
+        ])
+
+        # Log in the StockItemTracking
+        now = timezone.now()
+        StockItemTracking.objects.bulk_create([
+            StockItemTracking(
+                stock_item=item['stock_item'],
+                quantity=item['quantity'],
                 movement_type=StockItemTracking.MOVEMENT_TYPES.SALE,
-                notes=notes or f"Sold {quantity} of {stock_item.product.name} in Sale #{sale.id}",
+                notes=notes or f"Sold {item['quantity']} of {item['product'].name} in Sale #{sale.id}",
                 created_by=created_by,
-                created_at=timezone.now()
+                created_at=now
             )
+            for item in items
+        ])
+
+        DailySalesSummary.objects.record_sale(sale)
+        invalidate_metrics('sales', 'movements')
+
+        # Keep the caller's instances in step with the database
+        for item in items:
+            stock_item = item['stock_item']
+            stock_item.quantity = quantities[stock_item.pk]
         
         return sale
 
+    @transaction.atomic
+    def ingest_sales(self, created_by, sales):
+        """
+        Record a batch of sales queued by an offline till in one transaction.
+
+        Each sale carries a client_reference idempotency key, keys that are already recorded
+        are reported as duplicates so a till can resend a batch after a dropped connection.
+        Every sale runs in its own savepoint: a conflict (stock already gone, a deleted batch,
+        an invalid price, quantity or sale time) rolls back that sale only and is reported
+        with its reason.
+        The stock items of the whole batch are loaded with one query.
+
+        Args:
+            created_by: User instance who performed the sales.
+            sales: List of dicts with {client_reference, items, discount_amount, notes, sold_at},
+                items being dicts with {stock_item_id, quantity, sale_price}.
+
+        Returns:
+            List of dicts with {client_reference, status, sale_id, message} in input order,
+            status being 'created', 'duplicate' or 'conflict'.
+        """
+        def is_positive_int(value):
+            return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+        references = [sale.get('client_reference') for sale in sales if isinstance(sale.get('client_reference'), str)]
+        recorded = dict(self.filter(client_reference__in=references).values_list('client_reference', 'id'))
+        stock_items = StockItem.objects.select_related('product').in_bulk(
+            {item.get('stock_item_id') for sale in sales for item in sale.get('items') or [] if is_positive_int(item.get('stock_item_id'))}
+        )
+
+        results = []
+        for data in sales:
+            reference = data.get('client_reference')
+            result = {'client_reference': reference, 'status': 'conflict', 'sale_id': None, 'message': ''}
+            results.append(result)
+            if not isinstance(reference, str) or not reference or len(reference) > 64:
+                result['message'] = "Missing or invalid client reference."
+                continue
+            if reference in recorded:
+                result.update(status='duplicate', sale_id=recorded[reference], message="Sale already recorded.")
+                continue
+
+            try:
+                items = []
+                for line in data.get('items') or []:
+                    if not is_positive_int(line.get('stock_item_id')):
+                        raise ValidationError(f"Invalid stock item id: {line.get('stock_item_id')!r}.")
+                    stock_item = stock_items.get(line['stock_item_id'])
+                    if stock_item is None:
+                        raise ValidationError(f"Stock item {line['stock_item_id']} no longer exists.")
+                    if not is_positive_int(line.get('quantity')):
+                        raise ValidationError(f"Invalid quantity for {stock_item.product.name}: {line.get('quantity')!r}.")
+                    try:
+                        sale_price = Decimal(str(line.get('sale_price')))
+                    except InvalidOperation:
+                        raise ValidationError(f"Invalid price for {stock_item.product.name}.")
+                    if not sale_price.is_finite() or sale_price <= 0:
+                        raise ValidationError(f"Invalid price for {stock_item.product.name}.")
+                    items.append({
+                        'stock_item': stock_item,
+                        'product': stock_item.product,
+                        'quantity': line['quantity'],
+                        'sale_price': sale_price
+                    })
+                try:
+                    discount_amount = Decimal(str(data.get('discount_amount') or 0))
+                except InvalidOperation:
+                    raise ValidationError("Invalid discount amount.")
+                if not discount_amount.is_finite() or discount_amount < 0:
+                    raise ValidationError("Invalid discount amount.")
+                # parse_datetime() raises TypeError on anything but a string and returns None for garbage
+                sold_at = data.get('sold_at')
+                if sold_at not in (None, ''):
+                    try:
+                        sold_at = parse_datetime(sold_at) if isinstance(sold_at, str) else None
+                    except ValueError:
+                        sold_at = None
+                    if sold_at is None:
+                        raise ValidationError("Invalid sale time.")
+                    if timezone.is_naive(sold_at):
+                        sold_at = timezone.make_aware(sold_at)
+                else:
+                    sold_at = None
+                notes = data.get('notes') or ""
+                if not isinstance(notes, str):
+                    raise ValidationError("Invalid notes.")
+
+                with transaction.atomic():
+                    sale = self.create_sale(
+                        created_by=created_by,
+                        items=items,
+                        discount_amount=discount_amount,
+                        notes=notes,
+                        client_reference=reference,
+                        sold_at=sold_at
+                    )
+            except ValidationError as e:
+                result['message'] = " ".join(e.messages)
+                continue
+            except IntegrityError:
+                # Recorded meanwhile by a concurrent sync of the same till
+                result.update(status='duplicate', sale_id=self.filter(client_reference=reference).values_list('id', flat=True).first(), message="Sale already recorded.")
+                continue
+
+            recorded[reference] = sale.id
+            result.update(status='created', sale_id=sale.id, message=f"Sale #{sale.id} recorded.")
+        return results
+
 class Sale(AbstractBaseModel):
 
     class STATUS(models.TextChoices):
@@ -135,6 +278,13 @@ class Sale(AbstractBaseModel):
         related_name="sales", 
         help_text="User who performed the sale (e.g., cashier)."
     )
+    client_reference = models.CharField(
+        max_length=64,
+        unique=True,
+        blank=True,
+        null=True,
+        help_text="Idempotency key of a sale recorded offline on a till."
+    )
 
     objects = SaleManager()
 
@@ -143,7 +293,8 @@ class Sale(AbstractBaseModel):
 
     class Meta:
         indexes = [
-            models.Index(fields=['created_at']),
+            # Keyset pagination (core.pagination) and created_at ranges
+            models.Index(fields=['created_at', 'id']),
             models.Index(fields=['created_by']),
         ]
         ordering = ['-created_at']
@@ -204,4 +355,224 @@ class SaleItem(AbstractBaseModel):
 
     @property
     def line_total(self):
-        return self.quantity * self.sale_price
\ No newline at end of file
+        return self.quantity * self.sale_price
+
+class PrintJobManager(models.Manager):
+    def enqueue(self, sale):
+        """Queue a receipt for the print spooler. Call inside the sale's transaction."""
+        return self.create(sale=sale, available_at=timezone.now())
+
+    def claim_next(self):
+        """
+        Claim the oldest due job for this worker, or return None.
+        The claim is a guarded UPDATE so several spooler processes never print the same job.
+        """
+        while True:
+            job = (
+                self.filter(status=PrintJob.STATUS.PENDING, available_at__lte=timezone.now())
+                .order_by('available_at', 'id')
+                .first()
+            )
+            if job is None:
+                return None
+            claimed = self.filter(pk=job.pk, status=PrintJob.STATUS.PENDING).update(
+                status=PrintJob.STATUS.PRINTING,
+                attempts=F('attempts') + 1,
+                updated_at=timezone.now()
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+
+class PrintJob(AbstractBaseModel):
+    """
+    Durable receipt print queue. Checkout only inserts a row, the print spooler
+    (manage.py run_print_spooler) renders and sends it, retrying with backoff.
+    """
+
+    class STATUS(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PRINTING = "printing", "Printing"
+        PRINTED = "printed", "Printed"
+        FAILED = "failed", "Failed"
+
+    sale = models.ForeignKey(
+        Sale,
+        on_delete=models.CASCADE,
+        related_name='print_jobs',
+        help_text="Sale whose receipt is printed."
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS.choices,
+        default=STATUS.PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="The job is not picked up before this time (retry backoff)."
+    )
+    printed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+
+    objects = PrintJobManager()
+
+    def __str__(self):
+        return f"Print job #{self.id} for Sale #{self.sale_id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+        ordering = ['-created_at']
+
+
+class PosCartLine(AbstractBaseModel):
+    """
+    One line of an open POS cart, keyed by cashier and till.
+    Used by sales.cart.DatabaseCartStore so each scan writes a single row instead of the whole session.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='pos_cart_lines',
+        help_text="Cashier who owns the cart."
+    )
+    till = models.CharField(max_length=50, default='default', help_text="Till (register) the cart belongs to.")
+    stock_item = models.ForeignKey(
+        StockItem,
+        on_delete=models.CASCADE,
+        related_name='pos_cart_lines',
+        help_text="StockItem batch in the cart."
+    )
+    product_name = models.CharField(max_length=255)
+    barcode = models.CharField(max_length=100, blank=True, null=True)
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    sale_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    needs_manual_price = models.BooleanField(default=False)
+    available_quantity = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} ({self.user} @ {self.till})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'till', 'stock_item'], name='unique_pos_cart_line'),
+        ]
+        ordering = ['id']
+
+
+class DailySalesSummaryManager(models.Manager):
+    def record_sale(self, sale):
+        """
+        Add a sale to its (local) day's row for the cashier, inside the caller's transaction.
+        The row is updated with F() expressions so concurrent sales never lose an update.
+        """
+        date = timezone.localdate(sale.created_at)
+        discount = Decimal(str(sale.discount_amount or 0))
+        net = Decimal(str(sale.total_amount))
+        rows = self.filter(date=date, cashier_id=sale.created_by_id)
+        values = {
+            'sale_count': F('sale_count') + 1,
+            'gross_amount': F('gross_amount') + net + discount,
+            'discount_amount': F('discount_amount') + discount,
+            'net_amount': F('net_amount') + net,
+            'updated_at': timezone.now(),
+        }
+        pk = rows.order_by('pk').values_list('pk', flat=True).first()
+        if pk is not None:
+            self.filter(pk=pk).update(**values)
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    date=date,
+                    cashier_id=sale.created_by_id,
+                    sale_count=1,
+                    gross_amount=net + discount,
+                    discount_amount=discount,
+                    net_amount=net
+                )
+        except IntegrityError:
+            # Created meanwhile by a concurrent sale of the same cashier
+            rows.update(**values)
+
+    @transaction.atomic
+    def rebuild(self, start, end):
+        """
+        Recompute the rows of the local dates start..end (inclusive) from the Sale table.
+        Sales are selected by a created_at range so the created_at index is used.
+
+        Returns:
+            Number of rows written.
+        """
+        tz = timezone.get_current_timezone()
+        since = timezone.make_aware(datetime.combine(start, datetime.min.time()), tz)
+        until = timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz)
+        rows = (
+            Sale.objects
+            .filter(created_at__gte=since, created_at__lt=until)
+            .annotate(day=TruncDate('created_at', tzinfo=tz))
+            .values('day', 'created_by')
+            .annotate(
+                sale_count=Count('id'),
+                net=Sum('total_amount'),
+                discount=Coalesce(Sum('discount_amount'), Value(Decimal('0.00')), output_field=models.DecimalField())
+            )
+            .order_by()
+        )
+        self.filter(date__range=(start, end)).delete()
+        summaries = self.bulk_create([
+            DailySalesSummary(
+                date=row['day'],
+                cashier_id=row['created_by'],
+                sale_count=row['sale_count'],
+                gross_amount=row['net'] + row['discount'],
+                discount_amount=row['discount'],
+                net_amount=row['net']
+            )
+            for row in rows
+        ])
+        return len(summaries)
+
+
+class DailySalesSummary(AbstractBaseModel):
+    """
+    Sales rollup per local day and cashier, kept up to date by SaleManager.create_sale().
+    Dashboards read it instead of aggregating the Sale table. Rebuild it from history with
+    `manage.py rebuild_daily_sales_summary`.
+    """
+    date = models.DateField(help_text="Local date of the sales.")
+    cashier = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='daily_sales_summaries',
+        help_text="User who performed the sales."
+    )
+    sale_count = models.PositiveIntegerField(default=0)
+    gross_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Total before discounts.")
+    discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Total after discounts.")
+
+    objects = DailySalesSummaryManager()
+
+    def __str__(self):
+        return f"{self.date} {self.cashier or 'Unknown cashier'}: {self.sale_count} sales"
+
+    class Meta:
+        constraints = [
+            # Rows of deleted cashiers fall back to NULL, they are summed like any other row
+            models.UniqueConstraint(
+                fields=['date', 'cashier'],
+                condition=models.Q(cashier__isnull=False),
+                name='unique_daily_sales_summary'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+        ordering = ['-date']
+        verbose_name_plural = "Daily sales summaries"
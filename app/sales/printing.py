@@ -0,0 +1,72 @@
+import platform
+import socket
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+if platform.system() == "Windows":
+    import win32print
+
+
+class BasePrinterBackend:
+    """
+    Output backend for receipts. Subclasses send raw ESC/POS bytes somewhere.
+    Backends are configured with settings.RECEIPT_PRINTER_BACKEND (dotted path)
+    and settings.RECEIPT_PRINTER_OPTIONS (keyword arguments for the backend).
+    """
+
+    def send(self, data, job_name):
+        raise NotImplementedError("Printer backends must implement send()")
+
+
+class Win32PrinterBackend(BasePrinterBackend):
+    """Send raw bytes to a Windows printer queue (e.g. POS-80C)."""
+
+    def __init__(self, printer_name=None):
+        if platform.system() != "Windows":
+            raise ImproperlyConfigured("Win32PrinterBackend is only supported on Windows")
+        self.printer_name = printer_name or settings.PRINTER_NAME
+
+    def send(self, data, job_name):
+        hprinter = win32print.OpenPrinter(self.printer_name)
+        try:
+            win32print.StartDocPrinter(hprinter, 1, (job_name, None, "RAW"))
+            try:
+                win32print.StartPagePrinter(hprinter)
+                win32print.WritePrinter(hprinter, data)
+                win32print.EndPagePrinter(hprinter)
+            finally:
+                win32print.EndDocPrinter(hprinter)
+        finally:
+            win32print.ClosePrinter(hprinter)
+
+
+class FilePrinterBackend(BasePrinterBackend):
+    """Write every receipt to `<directory>/<job_name>.bin`, useful on Linux and in development."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def send(self, data, job_name):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{job_name}.bin").write_bytes(data)
+
+
+class SocketPrinterBackend(BasePrinterBackend):
+    """Send raw bytes to a network printer (JetDirect / port 9100) or a socket stand-in."""
+
+    def __init__(self, host, port=9100, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, data, job_name):
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as conn:
+            conn.sendall(data)
+
+
+def get_printer_backend():
+    """Instantiate the configured receipt printer backend."""
+    backend_class = import_string(settings.RECEIPT_PRINTER_BACKEND)
+    return backend_class(**getattr(settings, 'RECEIPT_PRINTER_OPTIONS', {}))
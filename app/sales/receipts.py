@@ -0,0 +1,89 @@
+"""
+ESC/POS receipt rendering for the 80mm POS printer.
+
+Everything that does not depend on the sale (printer init, shop header, column
+header, footer, paper cut) is encoded once at import time, a receipt is those
+segments plus one encoded block for the sale specific text.
+"""
+from pathlib import Path
+from django.utils import timezone
+from sales.models import SaleItem
+
+ENCODING = 'utf-8'
+WIDTH = 32
+
+# ESC/POS commands
+INIT = b"\x1B\x40"
+ALIGN_LEFT = b"\x1B\x61\x00"
+ALIGN_CENTER = b"\x1B\x61\x01"
+ALIGN_RIGHT = b"\x1B\x61\x02"
+CUT = b"\x1D\x56\x00"
+
+RULE = b"-" * WIDTH + b"\n"
+
+# Precompiled static segments
+HEADER = INIT + ALIGN_CENTER + "Feni Pet Clinic & Pet Shop\n".encode(ENCODING)
+COLUMN_HEADER = RULE + ALIGN_LEFT + "Item           Qty  Price  Total\n".encode(ENCODING) + RULE
+TOTALS_HEADER = RULE + ALIGN_RIGHT
+# A few line feeds so the paper clears the printer before cutting
+FOOTER = "\nThank you for shopping with us!\n".encode(ENCODING) + b"\n" * 8 + CUT
+
+LINE_FORMAT = "{:<12.12} {:>3} {:>6.2f} {:>6.2f}\n"
+
+
+def get_receipt_lines(sale):
+    """Return (product name, quantity, unit price) for every item of the sale with one joined query."""
+    return SaleItem.objects.filter(sale_id=sale.pk).order_by('pk').values_list(
+        'product__name', 'quantity', 'sale_price'
+    )
+
+
+def render_receipt(sale, lines=None):
+    """
+    Render the ESC/POS receipt for the given sale.
+    Args:
+        sale: Sale object, created_by should be select_related by the caller.
+        lines: Optional pre-fetched (name, quantity, unit price) tuples.
+    Returns:
+        bytes ready to be sent to the printer.
+    """
+    if lines is None:
+        lines = get_receipt_lines(sale)
+
+    cashier = sale.created_by.username if sale.created_by else ""
+    header = (
+        f"Receipt #{sale.id}\n"
+        f"Date: {timezone.localtime(sale.created_at):%Y-%m-%d %H:%M}\n"
+        f"Cashier: {cashier}\n"
+    )
+    items = "".join([
+        LINE_FORMAT.format(name, quantity, price, quantity * price)
+        for name, quantity, price in lines
+    ])
+    totals = f"Subtotal: BDT {sale.sub_total:.2f}\n"
+    if sale.discount_amount and sale.discount_amount > 0:
+        totals += f"Discount: -BDT {sale.discount_amount:.2f}\n"
+    totals += f"Total:    BDT {sale.total_amount:.2f}\n"
+
+    return b"".join((
+        HEADER,
+        header.encode(ENCODING),
+        COLUMN_HEADER,
+        items.encode(ENCODING),
+        TOTALS_HEADER,
+        totals.encode(ENCODING),
+        FOOTER,
+    ))
+
+
+def write_receipt(sale, target):
+    """
+    Render the receipt and write it to `target`, a file path or a binary stream.
+    Returns the number of bytes written.
+    """
+    data = render_receipt(sale)
+    if hasattr(target, 'write'):
+        target.write(data)
+    else:
+        Path(target).write_bytes(data)
+    return len(data)
@@ -1,3 +1,355 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from products.models import Product
+from sales.cart import CacheCartStore, DatabaseCartStore, resolve_cart_items
+from sales.models import DailySalesSummary, PosCartLine, Sale, SaleItem
+from stock.models import StockItem, StockItemTracking
+
+
+class CreateSaleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='cashier', password='password', role='cashier')
+        cls.stock_items = [
+            StockItem.objects.create_stock(Product.objects.create(name=f'Product {index}'), 5)
+            for index in range(6)
+        ]
+
+    def items(self, count, quantity=1):
+        return [
+            {'stock_item': stock_item, 'product': stock_item.product, 'quantity': quantity, 'sale_price': Decimal('2.50')}
+            for stock_item in self.stock_items[:count]
+        ]
+
+    def test_queries_do_not_grow_with_the_basket(self):
+        # The first sale of the day inserts the DailySalesSummary row, the others update it
+        Sale.objects.create_sale(self.user, self.items(1))
+        with CaptureQueriesContext(connection) as one_line:
+            Sale.objects.create_sale(self.user, self.items(1))
+        with CaptureQueriesContext(connection) as six_lines:
+            Sale.objects.create_sale(self.user, self.items(6))
+        self.assertEqual(len(one_line), len(six_lines))
+        with self.assertNumQueries(len(six_lines)):
+            sale = Sale.objects.create_sale(self.user, self.items(6, quantity=2))
+        self.assertEqual((sale.total_amount, sale.sale_items.count()), (Decimal('30.00'), 6))
+        self.assertEqual(
+            list(StockItem.objects.order_by('pk').values_list('quantity', flat=True)),
+            [item.quantity for item in self.stock_items]
+        )
+        self.assertEqual([item.quantity for item in self.stock_items], [0, 2, 2, 2, 2, 2])
+
+    def test_one_short_line_rolls_back_the_sale(self):
+        items = self.items(3)
+        items[1]['quantity'] = 6
+        with self.assertRaisesMessage(ValidationError, "Insufficient stock for Product 1. Available: 5, Requested: 6"):
+            Sale.objects.create_sale(self.user, items)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleItem.objects.exists())
+        self.assertFalse(StockItemTracking.objects.filter(movement_type=StockItemTracking.MOVEMENT_TYPES.SALE).exists())
+        self.assertEqual(list(StockItem.objects.order_by('pk').values_list('quantity', flat=True)), [5] * 6)
+
+
+class DailySalesSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = get_user_model().objects.create_user(username='alice', password='password', role='cashier')
+        cls.bob = get_user_model().objects.create_user(username='bob', password='password', role='cashier')
+        cls.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 100)
+
+    def sell(self, cashier, sold_at, quantity=1, discount='0.00'):
+        items = [{'stock_item': self.kibble, 'product': self.kibble.product, 'quantity': quantity, 'sale_price': Decimal('10.00')}]
+        return Sale.objects.create_sale(cashier, items, discount_amount=Decimal(discount), sold_at=sold_at)
+
+    def summary(self):
+        return sorted(DailySalesSummary.objects.values_list(
+            'date', 'cashier__username', 'sale_count', 'gross_amount', 'discount_amount', 'net_amount'
+        ))
+
+    def test_sales_are_rolled_up_by_local_day(self):
+        # 23:30 and 00:30 in Asia/Dhaka (UTC+6) are 17:30 and 18:30 UTC on the same UTC day
+        late = timezone.make_aware(datetime(2026, 3, 1, 23, 30))
+        self.sell(self.alice, late, quantity=2, discount='5.00')
+        self.sell(self.alice, late + timedelta(hours=1))
+        self.sell(self.bob, late + timedelta(hours=1), quantity=3)
+        self.sell(self.alice, late + timedelta(minutes=10))
+        self.assertEqual(self.summary(), [
+            (date(2026, 3, 1), 'alice', 2, Decimal('30.00'), Decimal('5.00'), Decimal('25.00')),
+            (date(2026, 3, 2), 'alice', 1, Decimal('10.00'), Decimal('0.00'), Decimal('10.00')),
+            (date(2026, 3, 2), 'bob', 1, Decimal('30.00'), Decimal('0.00'), Decimal('30.00')),
+        ])
+
+        recorded = self.summary()
+        DailySalesSummary.objects.update(sale_count=0, net_amount=0)
+        call_command('rebuild_daily_sales_summary', stdout=StringIO())
+        self.assertEqual(self.summary(), recorded)
+
+
+class ResolveCartItemsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.stock_items = [
+            StockItem.objects.create_stock(Product.objects.create(name=f'Product {index}'), 5)
+            for index in range(10)
+        ]
+
+    def test_one_query_for_the_whole_cart(self):
+        lines = [{'stock_item_id': item.pk, 'quantity': 2, 'sale_price': 3.0} for item in self.stock_items]
+        with self.assertNumQueries(1):
+            items = resolve_cart_items(lines)
+        self.assertEqual([item['stock_item'] for item in items], self.stock_items)
+        with self.assertNumQueries(0):
+            self.assertEqual([item['product'].name for item in items], [f'Product {index}' for index in range(10)])
+
+    def test_every_problem_is_reported(self):
+        deleted = StockItem.objects.create_stock(Product.objects.create(name='Gone'), 5)
+        deleted_pk = deleted.pk
+        deleted.delete()
+        lines = [
+            {'stock_item_id': self.stock_items[0].pk, 'quantity': 3, 'sale_price': 3.0},
+            {'stock_item_id': deleted_pk, 'quantity': 1, 'sale_price': 3.0},
+            # Lines of the same batch are checked against its stock together
+            {'stock_item_id': self.stock_items[0].pk, 'quantity': 3, 'sale_price': 3.0},
+            {'stock_item_id': self.stock_items[1].pk, 'quantity': 5, 'sale_price': 3.0},
+        ]
+        with self.assertNumQueries(1), self.assertRaises(ValidationError) as raised:
+            resolve_cart_items(lines)
+        self.assertEqual(raised.exception.messages, [
+            f"Stock item #{deleted_pk} no longer exists.",
+            "Insufficient stock for Product 0. Available: 5, Requested: 6",
+        ])
+
+
+class CartStoreTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='cashier', password='password')
+        cls.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 10)
+        cls.treats = StockItem.objects.create_stock(Product.objects.create(name='Treats'), 10)
+
+    def line(self, stock_item, quantity=1):
+        return {
+            'stock_item_id': stock_item.pk,
+            'product_name': stock_item.product.name,
+            'barcode': stock_item.product.barcode,
+            'quantity': quantity,
+            'sale_price': None,
+            'needs_manual_price': True,
+            'available_quantity': stock_item.quantity,
+        }
+
+    def test_database_add_survives_a_concurrent_insert(self):
+        store = DatabaseCartStore(self.user)
+        increment = store._increment
+
+        def insert_first(line):
+            # Another request inserts the line between our UPDATE and INSERT
+            if not PosCartLine.objects.exists():
+                PosCartLine.objects.create(user=self.user, till=store.till, **self.line(self.kibble, 2))
+                return 0
+            return increment(line)
+
+        with mock.patch.object(store, '_increment', side_effect=insert_first):
+            store.add(self.line(self.kibble, 3))
+        self.assertEqual([line['quantity'] for line in store.lines()], [5])
+
+    def test_database_add_many_survives_a_concurrent_insert(self):
+        store = DatabaseCartStore(self.user)
+        queryset = store._queryset
+        PosCartLine.objects.create(user=self.user, till=store.till, **self.line(self.kibble, 2))
+
+        # The existing line is inserted after add_many looked for it
+        with mock.patch.object(store, '_queryset', side_effect=[PosCartLine.objects.none(), queryset(), queryset()]):
+            store.add_many([self.line(self.kibble, 3), self.line(self.treats, 1)])
+        quantities = {line['stock_item_id']: line['quantity'] for line in store.lines()}
+        self.assertEqual(quantities, {self.kibble.pk: 5, self.treats.pk: 1})
+
+    def test_cache_adds_from_two_tills_keep_both_lines(self):
+        cache.clear()
+        store = CacheCartStore(self.user)
+        other = threading.Thread(target=CacheCartStore(self.user).add, args=[self.line(self.treats)])
+
+        # The other request reads the index while this one is between its read and its write
+        with store._lock():
+            other.start()
+            other.join(timeout=0.1)
+            self.assertTrue(other.is_alive())
+            index = store._index()
+            cache.set(store._key(self.kibble.pk), self.line(self.kibble), store.timeout)
+            cache.set(store._key('index'), index + [self.kibble.pk], store.timeout)
+        other.join()
+        self.assertEqual([line['stock_item_id'] for line in store.lines()], [self.kibble.pk, self.treats.pk])
+
+
+class CartRevisionTests(TestCase):
+    """Both cart stores give the POS the same deltas, and a stale revision gets the full cart."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='cashier', password='password', role='cashier')
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble', sale_price=5), 10)
+            self.treats = StockItem.objects.create_stock(Product.objects.create(name='Treats', sale_price=2), 10)
+
+    def post(self, action, **data):
+        response = self.client.post(reverse('sales:sale_pos_create'), {'action': action, 'revision': self.revision, **data})
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        if 'cart' in data:
+            self.cart = {line['stock_item_id']: line for line in data['cart']}
+        else:
+            self.cart.update((line['stock_item_id'], line) for line in data['changed'])
+            for pk in data['removed']:
+                self.cart.pop(pk)
+        self.revision = data['revision']
+        return data
+
+    def run_session(self):
+        self.revision, self.cart = '', {}
+        self.post('sync_cart')
+        kibble, treats = self.kibble.product.barcode, self.treats.product.barcode
+
+        self.assertIn('changed', self.post('add_item', barcode=kibble))
+        self.assertIn('changed', self.post('add_items', items=json.dumps([[kibble, 2], [treats, 1]])))
+        self.assertIn('changed', self.post('update_quantity', stock_item_id=self.treats.pk, quantity=4))
+        data = self.post('remove_item', stock_item_id=self.kibble.pk)
+        self.assertEqual((data['changed'], data['removed']), ([], [self.kibble.pk]))
+
+        # Another tab changes the cart, this one's next action resyncs
+        stale = self.revision
+        self.post('add_item', barcode=kibble)
+        self.revision = stale
+        self.assertIn('cart', self.post('add_item', barcode=treats))
+
+        cart = self.cart
+        self.revision = ''
+        self.post('sync_cart')
+        self.assertEqual(cart, self.cart)
+        return sorted((line['product_name'], line['quantity'], line['sale_price']) for line in cart.values())
+
+    def test_stores_apply_the_same_deltas(self):
+        sessions = []
+        for store in ('sales.cart.DatabaseCartStore', 'sales.cart.CacheCartStore'):
+            with self.subTest(store=store), override_settings(POS_CART_STORE=store):
+                sessions.append(self.run_session())
+        self.assertEqual(sessions, [[('Kibble', 1, 5.0), ('Treats', 5, 2.0)]] * 2)
+
+
+class PosAddItemsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='cashier', password='password', role='cashier')
+        self.client.force_login(self.user)
+        # The barcode index follows version stamps bumped on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble', sale_price=5), 10)
+
+    def add_items(self, items):
+        response = self.client.post(reverse('sales:sale_pos_create'), {'action': 'add_items', 'items': json.dumps(items)})
+        return response.status_code, response.json()
+
+    def test_malformed_lines_are_reported_not_coerced(self):
+        barcode = self.kibble.product.barcode
+        status, data = self.add_items([
+            [barcode, 2], [barcode, 1], [None, 1], [123, 1], ['', 1],
+            [barcode, 1.5], [barcode, '2'], [barcode, True], [barcode, 0], 'oops', [barcode],
+        ])
+        self.assertEqual(status, 200)
+        self.assertEqual([line['quantity'] for line in data['cart']], [3])
+        self.assertEqual(len(data['errors']), 9)
+        self.assertNotIn('None', [error['barcode'] for error in data['errors']])
+
+    def test_per_code_errors_are_merged(self):
+        barcode = self.kibble.product.barcode
+        status, data = self.add_items([[barcode, 6], ['BAR-MISSING', 1], [barcode, 6], ['BAR-MISSING', 2]])
+        self.assertEqual(status, 400)
+        # One error per code, with the quantities of the repeated scans summed
+        self.assertEqual(
+            {error['barcode']: error['quantity'] for error in data['errors']},
+            {'BAR-MISSING': 3, barcode: 12}
+        )
+        self.assertEqual(len(data['errors']), 2)
+
+    def test_payload_must_be_a_list(self):
+        for items in ('{"a": 1}', 'not json', '[]'):
+            response = self.client.post(reverse('sales:sale_pos_create'), {'action': 'add_items', 'items': items})
+            self.assertEqual(response.status_code, 400)
+
+
+class SaleSyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='cashier', password='password', role='cashier')
+        cls.kibble = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 10)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def sale(self, reference, quantity=1, **values):
+        return {
+            'client_reference': reference,
+            'sold_at': '2026-03-01T09:30:00+06:00',
+            'items': [{'stock_item_id': self.kibble.pk, 'quantity': quantity, 'sale_price': '5.00'}],
+            **values
+        }
+
+    def sync(self, sales):
+        response = self.client.post(reverse('sales:sale_sync'), {'sales': sales}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return [(result['client_reference'], result['status']) for result in response.json()['results']]
+
+    def test_malformed_sales_conflict_without_failing_the_batch(self):
+        results = self.sync([
+            self.sale('till-1'),
+            self.sale('till-1'),
+            self.sale('till-2', sold_at=1709263800),
+            self.sale('till-3', sold_at='yesterday'),
+            self.sale('till-4', quantity=1.5),
+            self.sale('till-5', quantity=True),
+            self.sale('till-6', items=[{'stock_item_id': str(self.kibble.pk), 'quantity': 1, 'sale_price': '5.00'}]),
+            self.sale('till-7', notes=['gift']),
+        ])
+        self.assertEqual(results, [
+            ('till-1', 'created'), ('till-1', 'duplicate'), ('till-2', 'conflict'), ('till-3', 'conflict'),
+            ('till-4', 'conflict'), ('till-5', 'conflict'), ('till-6', 'conflict'), ('till-7', 'conflict'),
+        ])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.kibble.refresh_from_db()
+        self.assertEqual(self.kibble.quantity, 9)
+
+    def test_invalid_discounts_conflict(self):
+        results = self.sync([
+            self.sale('till-1', discount_amount='NaN'),
+            self.sale('till-2', discount_amount='Infinity'),
+            self.sale('till-3', discount_amount='-1.00'),
+            self.sale('till-4', discount_amount={'off': 1}),
+            self.sale('till-5', discount_amount='1.00'),
+        ])
+        self.assertEqual(results, [
+            ('till-1', 'conflict'), ('till-2', 'conflict'), ('till-3', 'conflict'), ('till-4', 'conflict'), ('till-5', 'created'),
+        ])
+        self.assertEqual(Sale.objects.get().discount_amount, Decimal('1.00'))
+
+    def test_resent_batch_is_reported_as_duplicates(self):
+        self.sync([self.sale('till-1')])
+        self.assertEqual(self.sync([self.sale('till-1')]), [('till-1', 'duplicate')])
+        self.assertEqual(Sale.objects.count(), 1)
@@ -6,7 +6,10 @@ from sales.views import (
     SaleReceiptView, 
     SaleRefundView, 
     SaleDetailView, 
-    SalePoSCreateView
+    SalePoSCreateView,
+    PrintJobStatusView,
+    PosCatalogView,
+    SaleSyncView
 )
 
 app_name = 'sales'
@@ -16,8 +19,11 @@ urlpatterns = [
     path('success/', SaleSuccessView.as_view(), name="sale_success"),
     path('create/', SaleCreateView.as_view(), name='sale_create'),
     path('pos/', SalePoSCreateView.as_view(), name='sale_pos_create'),
+    path('pos/catalog/', PosCatalogView.as_view(), name='pos_catalog'),
+    path('pos/sync/', SaleSyncView.as_view(), name='sale_sync'),
     path('<int:pk>/', SaleDetailView.as_view(), name='sale_detail'),
     path('complete/', SaleCreateView.as_view(), name="sale_complete"),
     path('<int:pk>/receipt/', SaleReceiptView.as_view(), name="sale_receipt"),
     path('<int:pk>/refund/', SaleRefundView.as_view(), name="sale_refund"),
+    path('print-jobs/<int:pk>/', PrintJobStatusView.as_view(), name="print_job_status"),
 ]
\ No newline at end of file
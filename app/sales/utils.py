@@ -1,10 +1,6 @@
-import platform
-from django.conf import settings
 from django.core.exceptions import ValidationError
-
-if platform.system() == "Windows":
-    import win32print
-    import win32con
+from sales.printing import get_printer_backend
+from sales.receipts import render_receipt
 
 # else:
 #     raise ValidationError("Printing is only supported on Windows")
@@ -68,68 +64,14 @@ if platform.system() == "Windows":
 
 def print_invoice(sale):
     """
-    Print a receipt for the given sale using a USB POS printer with ESC/POS on Windows.
+    Print a receipt for the given sale synchronously using the configured printer backend.
+    Checkout should enqueue a PrintJob instead, this is what the print spooler calls.
     Args:
         sale: Sale object containing sale details and items.
     Raises:
-        ValidationError: If printer connection or printing fails, or if not on Windows.
+        ValidationError: If printer connection or printing fails.
     """
-
-    if platform.system() != "Windows":
-        raise ValidationError("Printing is only supported on Windows")
-    
     try:
-        printer_name = "POS-80C"
-        hprinter = win32print.OpenPrinter(printer_name)
-        hjob = win32print.StartDocPrinter(hprinter, 1, (f"Receipt_{sale.id}", None, "RAW"))
-        win32print.StartPagePrinter(hprinter)
-
-        lines = []
-
-        # Header
-        lines.append(b"\x1B\x40")  # Initialize
-        lines.append(b"\x1B\x61\x01")  # Center
-        lines.append("Feni Pet Clinic & Pet Shop\n".encode('utf-8'))
-        lines.append(f"Receipt #{sale.id}\n".encode('utf-8'))
-        lines.append(f"Date: {sale.created_at.strftime('%Y-%m-%d %H:%M')}\n".encode('utf-8'))
-        lines.append(f"Cashier: {sale.created_by.username}\n".encode('utf-8'))
-        lines.append(b"-" * 32 + b"\n")
-
-        # Items
-        lines.append(b"\x1B\x61\x00")  # Left
-        lines.append("Item           Qty  Price  Total\n".encode('utf-8'))
-        lines.append(b"-" * 32 + b"\n")
-
-        for item in sale.sale_items.all():
-            name = item.product.name[:12].ljust(12)
-            qty = str(item.quantity).rjust(3)
-            price = f"{item.sale_price:.2f}".rjust(6)
-            total = f"{item.quantity * item.sale_price:.2f}".rjust(6)
-            line = f"{name} {qty} {price} {total}\n"
-            lines.append(line.encode('utf-8'))
-
-        # Totals
-        lines.append(b"-" * 32 + b"\n")
-        lines.append(b"\x1B\x61\x02")  # Right
-        lines.append(f"Subtotal: BDT {sale.total_amount:.2f}\n".encode('utf-8'))
-        if sale.discount_amount > 0:
-            lines.append(f"Discount: -BDT {sale.discount_amount:.2f}\n".encode('utf-8'))
-        lines.append(f"Total:    BDT {sale.total_amount:.2f}\n".encode('utf-8'))
-
-        # Footer
-        lines.append("\nThank you for shopping with us!\n".encode('utf-8'))
-
-        # Add a few line feeds to ensure paper clears the printer before cutting
-        lines.append(b"\n\n\n\n\n\n\n\n")
-
-        lines.append(b"\x1D\x56\x00")  # Cut
-
-        receipt = b''.join(lines)
-        win32print.WritePrinter(hprinter, receipt)
-
-        win32print.EndPagePrinter(hprinter)
-        win32print.EndDocPrinter(hprinter)
-        win32print.ClosePrinter(hprinter)
-
+        get_printer_backend().send(render_receipt(sale), f"Receipt_{sale.id}")
     except Exception as e:
-        raise ValidationError(f"Failed to print receipt: {str(e)}")
\ No newline at end of file
+        raise ValidationError(f"Failed to print receipt: {str(e)}")
@@ -1,14 +1,21 @@
+import hashlib
+import json
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.shortcuts import render
-from django.urls import reverse_lazy
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse, reverse_lazy
+from django.utils.http import quote_etag
+from django.utils import timezone
+from django.db import IntegrityError, transaction
 from django.views.generic import CreateView, ListView, TemplateView, DetailView, View
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import HttpResponseNotModified, HttpResponseRedirect
 from django.core.exceptions import ValidationError
 from stock.models import StockItem, Product
-from sales.models import Sale
-from sales.utils import print_invoice
-from core.mixins import RoleRequiredMixin
+from sales.models import PrintJob, Sale
+from sales.cart import get_cart_store, resolve_cart_items
+from stock.lookups import barcode_index
+from core.mixins import KeysetPaginationMixin, RoleRequiredMixin
+from core.responses import FastJsonResponse
 
 
 # Views:
@@ -17,8 +24,9 @@ from core.mixins import RoleRequiredMixin
 
 
 
-class SaleListView(LoginRequiredMixin, ListView):
+class SaleListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = 'sales/sale_list.html'
+    rows_template_name = 'sales/partials/sale_rows.html'
     model = Sale
     context_object_name = 'sales'
     paginate_by = 20
@@ -32,7 +40,7 @@ class SaleListView(LoginRequiredMixin, ListView):
         return context
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('created_by')
         status = self.request.GET.get('status')
         if status:
             queryset = queryset.filter(status=status)
@@ -72,7 +80,7 @@ class SaleCreateView(LoginRequiredMixin, RoleRequiredMixin, CreateView):
     def post(self, request, *args, **kwargs):
         try:
             item_count = int(request.POST.get('item_count', 0))
-            items = []
+            lines = []
             for i in range(item_count):
                 stock_item_id = request.POST.get(f'stock_item_{i}')
                 quantity = request.POST.get(f'quantity_{i}')
@@ -81,17 +89,15 @@ class SaleCreateView(LoginRequiredMixin, RoleRequiredMixin, CreateView):
                 if not all([stock_item_id, quantity, sale_price]):
                     raise ValidationError("All item fields are required.")
                 
-                stock_item = StockItem.objects.get(id=stock_item_id)
-                quantity = int(quantity)
-                sale_price = float(sale_price)
-                
-                items.append({
-                    'stock_item': stock_item,
-                    'product': stock_item.product,
-                    'quantity': quantity,
-                    'sale_price': sale_price
+                lines.append({
+                    'stock_item_id': stock_item_id,
+                    'quantity': int(quantity),
+                    'sale_price': float(sale_price)
                 })
             
+            # Load every StockItem with its Product in one query
+            items = resolve_cart_items(lines)
+            
             discount_amount = float(request.POST.get('discount_amount', 0.00))
             notes = request.POST.get('notes', '')
             
@@ -130,11 +136,10 @@ class SalePoSCreateView(LoginRequiredMixin, RoleRequiredMixin, View):
     permission_required = 'sales.add_sale'
 
     def get(self, request, *args, **kwargs):
-        # Initialize cart in session if not present
-        if 'pos_cart' not in request.session:
-            request.session['pos_cart'] = []
+        store = get_cart_store(request)
         context = {
-            'cart': request.session['pos_cart'],
+            'cart_revision': str(store.get_revision()),
+            'cart': store.lines(),
             'products': Product.objects.all(),
             'stock_items': StockItem.objects.select_related('product').all(),
             'template_to_extend': 'partials/base_empty.html' if request.headers.get('HX-Request') else 'new_dash_base.html'
@@ -146,6 +151,8 @@ class SalePoSCreateView(LoginRequiredMixin, RoleRequiredMixin, View):
         
         if action == 'add_item':
             return self.add_item(request)
+        elif action == 'add_items':
+            return self.add_items(request)
         elif action == 'update_quantity':
             return self.update_quantity(request)
         elif action == 'update_manual_price':
@@ -154,9 +161,37 @@ class SalePoSCreateView(LoginRequiredMixin, RoleRequiredMixin, View):
             return self.remove_item(request)
         elif action == 'clear_cart':
             return self.clear_cart(request)
+        elif action == 'sync_cart':
+            return self.sync_cart(request)
         elif action == 'finalize_sale':
             return self.finalize_sale(request)
-        return JsonResponse({'status': 'error', 'message': 'Invalid action'}, status=400)
+        return FastJsonResponse({'status': 'error', 'message': 'Invalid action'}, status=400)
+
+    def cart_response(self, request, store, stock_item_ids, **payload):
+        """
+        Success response for a cart action. A client that sent the revision just before this
+        action only gets the touched lines ('changed', and 'removed' for ids no longer in the
+        cart); anything else (no revision, a concurrent edit from another tab) gets the full cart.
+        Revisions are sent as strings, nanosecond stamps do not fit in a JavaScript number.
+        """
+        client_revision = request.POST.get('revision', '')
+        payload.update({'status': 'success', 'revision': str(store.revision)})
+        if client_revision.isdigit() and store.revision == int(client_revision) + 1:
+            changed = store.lines(stock_item_ids)
+            present = {line['stock_item_id'] for line in changed}
+            payload['changed'] = changed
+            payload['removed'] = [pk for pk in stock_item_ids if pk not in present]
+        else:
+            payload['cart'] = store.lines()
+        return FastJsonResponse(payload)
+
+    def sync_cart(self, request):
+        store = get_cart_store(request)
+        return FastJsonResponse({
+            'status': 'success',
+            'revision': str(store.get_revision()),
+            'cart': store.lines()
+        })
 
     def add_item(self, request):
         try:
@@ -166,63 +201,129 @@ class SalePoSCreateView(LoginRequiredMixin, RoleRequiredMixin, View):
             if quantity < 1:
                 raise ValidationError("Quantity must be at least 1.")
             
-            # Find StockItem by barcode, preferring oldest batch
-            stock_item = StockItem.objects.filter(
-                product__barcode=barcode, quantity__gte=quantity
-            ).order_by('created_at').first()
+            # Find the oldest batch with enough stock, from the in-process barcode index
+            entry, batch = barcode_index.resolve(barcode, quantity)
             
-            if not stock_item:
+            if not batch:
                 raise ValidationError(f"No stock available for barcode {barcode}.")
-            
-            # Initialize cart if needed
-            if 'pos_cart' not in request.session:
-                request.session['pos_cart'] = []
+            stock_item_id, available_quantity, batch_sale_price = batch
             
             # Determine sale price and if manual entry is needed
             sale_price = None
             needs_manual_price = False
             
-            if hasattr(stock_item, 'sale_price') and stock_item.sale_price is not None:
-                sale_price = float(stock_item.sale_price)
-                needs_manual_price = False
-            elif hasattr(stock_item.product, 'sale_price') and stock_item.product.sale_price is not None:
-                sale_price = float(stock_item.product.sale_price)
-                needs_manual_price = False
+            if batch_sale_price is not None:
+                sale_price = float(batch_sale_price)
+            elif entry['product_sale_price'] is not None:
+                sale_price = float(entry['product_sale_price'])
             else:
-                sale_price = None
                 needs_manual_price = True
             
-            # Check if item already in cart
-            cart = request.session['pos_cart']
-            for item in cart:
-                if item['stock_item_id'] == stock_item.id:
-                    item['quantity'] += quantity
-                    if stock_item.quantity < item['quantity']:
-                        raise ValidationError(f"Insufficient stock for {stock_item.product.name}. Available: {stock_item.quantity}")
-                    break
-            else:
-                cart.append({
-                    'stock_item_id': stock_item.id,
-                    'product_name': stock_item.product.name,
-                    'barcode': stock_item.product.barcode,
+            # Check the quantity already in the cart for this batch
+            store = get_cart_store(request)
+            existing = store.get(stock_item_id)
+            if existing and available_quantity < existing['quantity'] + quantity:
+                raise ValidationError(f"Insufficient stock for {entry['product_name']}. Available: {available_quantity}")
+            
+            store.add({
+                'stock_item_id': stock_item_id,
+                'product_name': entry['product_name'],
+                'barcode': barcode,
+                'quantity': quantity,
+                'sale_price': sale_price,
+                'needs_manual_price': needs_manual_price,
+                'available_quantity': available_quantity
+            })
+            
+            return self.cart_response(
+                request, store, [stock_item_id],
+                message=f"Added {quantity} x {entry['product_name']} to cart." + 
+                          (" Please set unit price." if needs_manual_price else "")
+            )
+        
+        except ValidationError as e:
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    def add_items(self, request):
+        """
+        Bulk add for scanner bursts and pasted lists.
+        POST `items` is a JSON list of [barcode, quantity] pairs. Every barcode is resolved in
+        one go, valid lines are added as one unit and invalid ones are reported per line.
+        """
+        try:
+            try:
+                pairs = json.loads(request.POST.get('items', '[]'))
+            except ValueError:
+                pairs = None
+            if not isinstance(pairs, list):
+                raise ValidationError("Items must be a JSON list of [barcode, quantity] pairs.")
+            if not pairs:
+                raise ValidationError("No items to add.")
+            
+            # Merge repeated barcodes so each one is resolved once
+            requested = {}
+            errors = []
+            for pair in pairs:
+                barcode, quantity = pair if isinstance(pair, list) and len(pair) == 2 else (pair, None)
+                if not isinstance(barcode, str) or not barcode.strip():
+                    errors.append({'barcode': barcode, 'quantity': quantity, 'message': "Barcode must be a non-empty string."})
+                    continue
+                barcode = barcode.strip()
+                if not isinstance(quantity, int) or isinstance(quantity, bool):
+                    errors.append({'barcode': barcode, 'quantity': quantity, 'message': "Quantity must be a whole number."})
+                    continue
+                if quantity < 1:
+                    errors.append({'barcode': barcode, 'quantity': quantity, 'message': "Quantity must be at least 1."})
+                    continue
+                requested[barcode] = requested.get(barcode, 0) + quantity
+            
+            store = get_cart_store(request)
+            in_cart = {line['stock_item_id']: line['quantity'] for line in store.lines()}
+            entries = barcode_index.get_many(requested)
+            
+            lines = []
+            for barcode, quantity in requested.items():
+                entry, batch = barcode_index.pick_batch(entries.get(barcode), quantity)
+                if not batch:
+                    errors.append({'barcode': barcode, 'quantity': quantity, 'message': f"No stock available for barcode {barcode}."})
+                    continue
+                stock_item_id, available_quantity, batch_sale_price = batch
+                if available_quantity < in_cart.get(stock_item_id, 0) + quantity:
+                    errors.append({'barcode': barcode, 'quantity': quantity, 'message': f"Insufficient stock for {entry['product_name']}. Available: {available_quantity}"})
+                    continue
+                
+                sale_price = batch_sale_price if batch_sale_price is not None else entry['product_sale_price']
+                lines.append({
+                    'stock_item_id': stock_item_id,
+                    'product_name': entry['product_name'],
+                    'barcode': barcode,
                     'quantity': quantity,
-                    'sale_price': sale_price,
-                    'needs_manual_price': needs_manual_price,
-                    'available_quantity': stock_item.quantity
+                    'sale_price': float(sale_price) if sale_price is not None else None,
+                    'needs_manual_price': sale_price is None,
+                    'available_quantity': available_quantity
                 })
             
-            request.session['pos_cart'] = cart
-            request.session.modified = True
+            if not lines:
+                return FastJsonResponse({
+                    'status': 'error',
+                    'errors': errors,
+                    'message': "No items were added."
+                }, status=400)
             
-            return JsonResponse({
-                'status': 'success',
-                'cart': cart,
-                'message': f"Added {quantity} x {stock_item.product.name} to cart." + 
-                          (" Please set unit price." if needs_manual_price else "")
-            })
+            store.add_many(lines)
+            added = sum(line['quantity'] for line in lines)
+            needs_price = sum(1 for line in lines if line['needs_manual_price'])
+            
+            return self.cart_response(
+                request, store, [line['stock_item_id'] for line in lines],
+                errors=errors,
+                message=f"Added {added} items to cart." +
+                          (f" {len(errors)} lines failed." if errors else "") +
+                          (" Please set unit price." if needs_price else "")
+            )
         
         except ValidationError as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
     def update_quantity(self, request):
         try:
@@ -232,29 +333,21 @@ class SalePoSCreateView(LoginRequiredMixin, RoleRequiredMixin, View):
             if new_quantity < 1:
                 raise ValidationError("Quantity must be at least 1.")
             
-            stock_item = StockItem.objects.get(id=stock_item_id)
+            stock_item = StockItem.objects.select_related('product').get(id=stock_item_id)
             if stock_item.quantity < new_quantity:
                 raise ValidationError(f"Insufficient stock for {stock_item.product.name}. Available: {stock_item.quantity}")
             
-            cart = request.session.get('pos_cart', [])
-            for item in cart:
-                if item['stock_item_id'] == stock_item_id:
-                    item['quantity'] = new_quantity
-                    break
-            else:
+            store = get_cart_store(request)
+            if not store.set_quantity(stock_item_id, new_quantity, available_quantity=stock_item.quantity):
                 raise ValidationError("Item not found in cart.")
             
-            request.session['pos_cart'] = cart
-            request.session.modified = True
-            
-            return JsonResponse({
-                'status': 'success',
-                'cart': cart,
-                'message': f"Updated quantity for {stock_item.product.name}."
-            })
+            return self.cart_response(
+                request, store, [stock_item_id],
+                message=f"Updated quantity for {stock_item.product.name}."
+            )
         
         except ValidationError as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
     def update_manual_price(self, request):
         try:
@@ -264,66 +357,49 @@ class SalePoSCreateView(LoginRequiredMixin, RoleRequiredMixin, View):
             if manual_price <= 0:
                 raise ValidationError("Price must be greater than 0.")
             
-            cart = request.session.get('pos_cart', [])
-            for item in cart:
-                if item['stock_item_id'] == stock_item_id:
-                    if item.get('needs_manual_price', False):
-                        item['sale_price'] = manual_price
-                        item['needs_manual_price'] = False
-                    else:
-                        raise ValidationError("This item doesn't need manual price entry.")
-                    break
-            else:
+            store = get_cart_store(request)
+            item = store.get(stock_item_id)
+            if not item:
                 raise ValidationError("Item not found in cart.")
+            if not item.get('needs_manual_price', False):
+                raise ValidationError("This item doesn't need manual price entry.")
+            store.set_price(stock_item_id, manual_price)
             
-            request.session['pos_cart'] = cart
-            request.session.modified = True
-            
-            return JsonResponse({
-                'status': 'success',
-                'cart': cart,
-                'message': f"Price updated successfully."
-            })
+            return self.cart_response(request, store, [stock_item_id], message="Price updated successfully.")
         
         except (ValueError, ValidationError) as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
     def remove_item(self, request):
         try:
             stock_item_id = int(request.POST.get('stock_item_id'))
-            cart = request.session.get('pos_cart', [])
-            cart = [item for item in cart if item['stock_item_id'] != stock_item_id]
-            
-            request.session['pos_cart'] = cart
-            request.session.modified = True
+            store = get_cart_store(request)
+            store.remove(stock_item_id)
             
-            return JsonResponse({
-                'status': 'success',
-                'cart': cart,
-                'message': "Item removed from cart."
-            })
+            return self.cart_response(request, store, [stock_item_id], message="Item removed from cart.")
         
         except ValidationError as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
         
     def clear_cart(self, request):
         try:
-            # Clear the cart from session
-            request.session['pos_cart'] = []
-            request.session.modified = True
+            store = get_cart_store(request)
+            store.clear()
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'status': 'success',
+                'revision': str(store.revision),
                 'cart': [],
                 'message': "Cart cleared successfully."
             })
         
         except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
     def finalize_sale(self, request):
         try:
-            cart = request.session.get('pos_cart', [])
+            store = get_cart_store(request)
+            cart = store.lines()
             if not cart:
                 raise ValidationError("Cart is empty.")
             
@@ -335,52 +411,124 @@ class SalePoSCreateView(LoginRequiredMixin, RoleRequiredMixin, View):
             
             discount_amount = float(request.POST.get('discount_amount', 0.00))
             notes = request.POST.get('notes', '')
+            # Sent by the POS page so a sale whose response was lost can be queued offline without recording it twice
+            client_reference = request.POST.get('client_reference') or None
+            if client_reference and len(client_reference) > 64:
+                raise ValidationError("Invalid client reference.")
             
-            # Prepare items for SaleManager
-            items = []
-            for cart_item in cart:
-                stock_item = StockItem.objects.get(id=cart_item['stock_item_id'])
-                items.append({
-                    'stock_item': stock_item,
-                    'product': stock_item.product,
-                    'quantity': cart_item['quantity'],
-                    'sale_price': cart_item['sale_price']
-                })
+            # Prepare items for SaleManager, one query for the whole cart
+            items = resolve_cart_items(cart)
             
-            # Create sale
-            sale = Sale.objects.create_sale(
-                created_by=self.request.user,
-                items=items,
-                discount_amount=discount_amount,
-                notes=notes
-            )
-
-            try:
-                print_invoice(sale)
-            except Exception as e:
-                # logger.error(f"Error printing invoice: {str(e)}")
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Sale #{sale.id} completed, but failed to print invoice: {str(e)}',
-                    'redirect_url': str(self.success_url)
-                })
+            # Create sale and queue its receipt, the print spooler prints it out of band
+            with transaction.atomic():
+                sale = Sale.objects.create_sale(
+                    created_by=self.request.user,
+                    items=items,
+                    discount_amount=discount_amount,
+                    notes=notes,
+                    client_reference=client_reference
+                )
+                print_job = PrintJob.objects.enqueue(sale)
             
             # Clear cart
-            request.session['pos_cart'] = []
-            request.session.modified = True
+            store.clear()
             
             messages.success(self.request, f"Sale #{sale.id} created successfully.")
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({
+                return FastJsonResponse({
                     'status': 'success',
                     'message': f"Sale #{sale.id} created with {len(items)} items.",
+                    'print_job_id': print_job.id,
+                    'print_status_url': reverse('sales:print_job_status', args=[print_job.id]),
                     'redirect_url': str(self.success_url)
                 })
             return HttpResponseRedirect(self.success_url)
         
         except ValidationError as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            return FastJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        except IntegrityError:
+            return FastJsonResponse({'status': 'error', 'message': "This sale was already recorded."}, status=409)
+
+
+
+class PrintJobStatusView(LoginRequiredMixin, RoleRequiredMixin, View):
+    """Receipt print status for the POS page to poll, POST re-queues a failed job."""
+    allowed_roles = ['cashier', 'inventory_manager', 'admin']
+
+    def get(self, request, pk, *args, **kwargs):
+        print_job = get_object_or_404(PrintJob, pk=pk)
+        return FastJsonResponse({
+            'status': 'success',
+            'print_job': {
+                'id': print_job.id,
+                'sale_id': print_job.sale_id,
+                'status': print_job.status,
+                'attempts': print_job.attempts,
+                'last_error': print_job.last_error,
+                'printed_at': print_job.printed_at,
+            }
+        })
+
+    def post(self, request, pk, *args, **kwargs):
+        updated = PrintJob.objects.filter(pk=pk, status=PrintJob.STATUS.FAILED).update(
+            status=PrintJob.STATUS.PENDING,
+            attempts=0,
+            available_at=timezone.now(),
+            updated_at=timezone.now()
+        )
+        if not updated:
+            return FastJsonResponse({'status': 'error', 'message': 'Only failed print jobs can be retried.'}, status=400)
+        return self.get(request, pk)
+
+
+class PosCatalogView(LoginRequiredMixin, RoleRequiredMixin, View):
+    """
+    Barcode catalog snapshot the POS page keeps for offline mode. The ETag is a hash of the
+    content, a till whose copy is current gets a 304 instead of the whole catalog.
+    """
+    allowed_roles = ['cashier', 'inventory_manager', 'admin']
+
+    def get(self, request, *args, **kwargs):
+        response = FastJsonResponse({'status': 'success', 'catalog': barcode_index.snapshot()})
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class SaleSyncView(LoginRequiredMixin, RoleRequiredMixin, View):
+    """
+    Ingest the sales an offline till queued, see SaleManager.ingest_sales().
+    The body is JSON: {"sales": [{client_reference, sold_at, discount_amount, notes,
+    items: [{stock_item_id, quantity, sale_price}]}]}.
+    """
+    allowed_roles = ['cashier', 'inventory_manager', 'admin']
+    max_batch_size = 500
+
+    def post(self, request, *args, **kwargs):
+        try:
+            sales = json.loads(request.body).get('sales')
+        except (ValueError, AttributeError):
+            sales = None
+        if not isinstance(sales, list) or not all(
+            isinstance(sale, dict) and isinstance(sale.get('items'), list)
+            and all(isinstance(line, dict) for line in sale['items'])
+            for sale in sales
+        ):
+            return FastJsonResponse({'status': 'error', 'message': 'Expected a JSON body with a list of sales.'}, status=400)
+        if len(sales) > self.max_batch_size:
+            return FastJsonResponse({'status': 'error', 'message': f'Send at most {self.max_batch_size} sales per request.'}, status=400)
 
+        results = Sale.objects.ingest_sales(request.user, sales)
+        counts = {status: sum(1 for result in results if result['status'] == status) for status in ('created', 'duplicate', 'conflict')}
+        return FastJsonResponse({
+            'status': 'success',
+            'results': results,
+            'message': f"{counts['created']} sales recorded, {counts['duplicate']} already synced, {counts['conflict']} conflicts.",
+            **counts
+        })
 
 
 class SaleReceiptView(View):
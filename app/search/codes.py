@@ -0,0 +1,73 @@
+"""
+Scanned and typed codes: barcodes (BAR-<10 hex>, Product.generate_barcode), SKUs
+(SKU-<8 hex>, Product.generate_sku) and batch numbers (<sku>-<8 hex>,
+StockItem.generate_batch_number).
+
+A query shaped like one of these skips the full-text index. A complete code is an
+equality lookup on the unique column, a partial one a range over the same index:
+codes have a fixed length and alphabet, so every code starting with "BAR-1A" lies
+between "BAR-1A" and "BAR-1AFFFFFFFF". Unlike LIKE 'BAR-1A%' the range uses the
+index on SQLite (case-insensitive LIKE) and on PostgreSQL (non-C collations).
+"""
+import re
+from typing import NamedTuple
+from django.db.models import Q
+
+
+BARCODE_RE = re.compile(r'BAR-[0-9A-F]{2,10}', re.IGNORECASE)
+SKU_RE = re.compile(r'SKU-[0-9A-F]{2,8}', re.IGNORECASE)
+BATCH_RE = re.compile(r'(SKU-[0-9A-F]{8})-([0-9A-F]{0,8})', re.IGNORECASE)
+
+CODE_LENGTHS = {'barcode': 14, 'sku': 12, 'batch': 21}
+
+# Lookup paths of each kind of code, per kind of search entry
+CODE_FIELDS = {
+    'product': {'barcode': 'barcode', 'sku': 'sku'},
+    'stock_item': {'barcode': 'product__barcode', 'sku': 'product__sku', 'batch': 'batch_number'},
+}
+
+
+class Code(NamedTuple):
+    kind: str
+    value: str
+    complete: bool
+
+
+def parse_code(query):
+    """Return the Code the query is shaped like, or None for free text."""
+    text = (query or '').strip()
+    match = BATCH_RE.fullmatch(text)
+    if match:
+        # Generated SKUs are upper case, the batch suffix lower case
+        value = f"{match[1].upper()}-{match[2].lower()}"
+        return Code('batch', value, len(value) == CODE_LENGTHS['batch'])
+    for kind, pattern in (('barcode', BARCODE_RE), ('sku', SKU_RE)):
+        if pattern.fullmatch(text):
+            return Code(kind, text.upper(), len(text) == CODE_LENGTHS[kind])
+    return None
+
+
+def code_filter(field, code):
+    """Q matching `field` equal to a complete code, or within the index range of a partial one."""
+    if code.complete:
+        return Q(**{field: code.value})
+    padding = ('f' if code.kind == 'batch' else 'F') * (CODE_LENGTHS[code.kind] - len(code.value))
+    # startswith only re-checks the rows of the range, for collations that ignore the hyphen
+    return Q(**{f'{field}__range': (code.value, code.value + padding), f'{field}__startswith': code.value})
+
+
+def filter_by_code(queryset, kind, query):
+    """
+    Filter the queryset (of `kind` search entries) to the objects carrying the code in the query.
+
+    Returns:
+        The filtered queryset, or None when the query is not a code or `kind` has no codes.
+    """
+    code = parse_code(query)
+    fields = CODE_FIELDS.get(kind, {})
+    if code is None or not fields:
+        return None
+    if code.kind == 'batch' and 'batch' not in fields:
+        # A batch number starts with its product's SKU
+        code = Code('sku', code.value[:CODE_LENGTHS['sku']], True)
+    return queryset.filter(code_filter(fields[code.kind], code))
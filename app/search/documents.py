@@ -0,0 +1,43 @@
+"""
+Searchable text of each kind of entry.
+
+The builders take an app registry so the migrations can index with historical
+models. Each yields (object_id, text) pairs, for every object or only `ids`.
+"""
+from django.apps import apps as global_apps
+
+
+def _join(*values):
+    return ' '.join(str(value) for value in values if value)
+
+
+def _rows(queryset, ids, *fields):
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset.order_by().values_list('pk', *fields).iterator(chunk_size=2000)
+
+
+def product_documents(ids=None, apps=global_apps):
+    Product = apps.get_model('products', 'Product')
+    for pk, *values in _rows(Product.objects.all(), ids, 'name', 'sku', 'barcode'):
+        yield pk, _join(*values)
+
+
+def stock_item_documents(ids=None, apps=global_apps):
+    StockItem = apps.get_model('stock', 'StockItem')
+    fields = ('product__name', 'product__sku', 'product__barcode', 'batch_number', 'stock_location__name', 'supplier__name')
+    for pk, *values in _rows(StockItem.objects.all(), ids, *fields):
+        yield pk, _join(*values)
+
+
+def supplier_documents(ids=None, apps=global_apps):
+    Supplier = apps.get_model('products', 'Supplier')
+    for pk, *values in _rows(Supplier.objects.all(), ids, 'name', 'email', 'phone'):
+        yield pk, _join(*values)
+
+
+DOCUMENTS = {
+    'product': product_documents,
+    'stock_item': stock_item_documents,
+    'supplier': supplier_documents,
+}
@@ -0,0 +1,50 @@
+"""
+Writes to the search index.
+
+Entries are replaced (deleted and re-inserted) rather than updated, the database
+keeps the full-text index in step: triggers on SQLite, a generated column on PostgreSQL.
+"""
+from django.db import transaction
+from search.documents import DOCUMENTS
+from search.models import SearchEntry
+
+
+@transaction.atomic
+def update_entries(kind, ids):
+    """Re-index the given objects of `kind`, dropping the entries of ids that no longer exist."""
+    ids = set(ids)
+    if not ids:
+        return
+    documents = DOCUMENTS[kind](ids)
+    entries = [SearchEntry(kind=kind, object_id=pk, text=text) for pk, text in documents]
+    SearchEntry.objects.filter(kind=kind, object_id__in=ids).delete()
+    SearchEntry.objects.bulk_create(entries)
+
+
+def remove_entries(kind, ids):
+    SearchEntry.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+@transaction.atomic
+def rebuild(kinds=None, batch_size=1000, apps=None):
+    """
+    Re-index every object of the given kinds (all kinds by default).
+
+    Returns:
+        Dict of kind to the number of entries written.
+    """
+    model = SearchEntry if apps is None else apps.get_model('search', 'SearchEntry')
+    counts = {}
+    for kind in kinds or DOCUMENTS:
+        model.objects.filter(kind=kind).delete()
+        documents = DOCUMENTS[kind]() if apps is None else DOCUMENTS[kind](apps=apps)
+        batch, counts[kind] = [], 0
+        for pk, text in documents:
+            batch.append(model(kind=kind, object_id=pk, text=text))
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                counts[kind] += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        counts[kind] += len(batch)
+    return counts
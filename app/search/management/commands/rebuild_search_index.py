@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from search.documents import DOCUMENTS
+from search.index import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index from the products, stock items and suppliers. "
+        "Needed after writes that bypass the model signals (bulk updates, raw SQL, loaddata)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', action='append', choices=list(DOCUMENTS), help='Only rebuild this kind of entries (repeatable)'
+        )
+
+    def handle(self, *args, **kwargs):
+        counts = rebuild(kwargs['kind'])
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count} entries")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
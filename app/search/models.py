@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class SearchEntry(models.Model):
+    """
+    Searchable text of one product, stock item or supplier, kept in sync by search.signals.
+
+    The full-text index over `text` is not a Django field, migration 0002 creates it per
+    database: an FTS5 table on SQLite, a generated tsvector column with a GIN index on PostgreSQL.
+    """
+
+    class Kind(models.TextChoices):
+        PRODUCT = 'product', 'Product'
+        STOCK_ITEM = 'stock_item', 'Stock Item'
+        SUPPLIER = 'supplier', 'Supplier'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
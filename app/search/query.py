@@ -0,0 +1,74 @@
+"""
+Ranked full-text queries against the search index.
+
+Every word of the query must match the start of a word of the entry, so "dog foo"
+finds "Dog Food" and "bar-1a2b" finds the barcode BAR-1A2B3C4D5E. SQLite ranks
+with FTS5's bm25(), PostgreSQL with ts_rank() on the GIN-indexed tsvector. Other
+databases fall back to unranked substring matching on the entry text.
+"""
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from search.codes import filter_by_code
+from search.models import SearchEntry
+
+
+TERM_RE = re.compile(r'\w+')
+
+SQLITE_SQL = """
+    SELECT entry.object_id FROM search_searchentry_fts
+    JOIN search_searchentry entry ON entry.id = search_searchentry_fts.rowid
+    WHERE search_searchentry_fts MATCH %s AND entry.kind = %s
+    ORDER BY search_searchentry_fts.rank
+    LIMIT %s
+"""
+
+POSTGRES_SQL = """
+    SELECT object_id FROM search_searchentry, to_tsquery('simple', %s) query
+    WHERE kind = %s AND search_vector @@ query
+    ORDER BY ts_rank(search_vector, query) DESC, object_id DESC
+    LIMIT %s
+"""
+
+
+def search_terms(query):
+    return TERM_RE.findall((query or '').lower())
+
+
+def search_ids(kind, query, limit=None):
+    """Return the ids of the best `limit` (SEARCH_MAX_RESULTS) objects of `kind` matching the query, best first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    limit = limit or settings.SEARCH_MAX_RESULTS
+
+    if connection.vendor == 'sqlite':
+        # Quoted terms keep FTS5 operators (AND, NEAR, ...) literal
+        sql, match = SQLITE_SQL, ' '.join(f'"{term}"*' for term in terms)
+    elif connection.vendor == 'postgresql':
+        sql, match = POSTGRES_SQL, ' & '.join(f'{term}:*' for term in terms)
+    else:
+        entries = SearchEntry.objects.filter(kind=kind)
+        for term in terms:
+            entries = entries.filter(text__icontains=term)
+        return list(entries.order_by('-object_id').values_list('object_id', flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, kind, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranked(queryset, kind, query, limit=None):
+    """
+    Filter the queryset to the objects matching the query, ordered by rank.
+    Barcodes, SKUs and batch numbers are looked up on their own indexes instead (see search.codes).
+    """
+    by_code = filter_by_code(queryset, kind, query)
+    if by_code is not None:
+        return by_code
+    ids = search_ids(kind, query, limit)
+    if not ids:
+        return queryset.none()
+    rank = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).order_by(rank)
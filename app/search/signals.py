@@ -0,0 +1,67 @@
+"""
+Keep the search index in step with product, supplier and stock writes.
+
+Stock item entries include the product, location and supplier names, so writes
+to those re-index the dependent stock items too. Entries are written in the same
+transaction as the change they reflect.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from products.models import Product, Supplier
+from search.index import remove_entries, update_entries
+from search.models import SearchEntry
+from stock.models import StockItem, StockLocation
+
+
+def _stock_item_ids(**filters):
+    return list(StockItem.objects.filter(**filters).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    update_entries(SearchEntry.Kind.PRODUCT, [instance.pk])
+    update_entries(SearchEntry.Kind.STOCK_ITEM, _stock_item_ids(product=instance))
+
+
+@receiver(post_save, sender=Supplier)
+def index_supplier(sender, instance, **kwargs):
+    update_entries(SearchEntry.Kind.SUPPLIER, [instance.pk])
+    update_entries(SearchEntry.Kind.STOCK_ITEM, _stock_item_ids(supplier=instance))
+
+
+@receiver(post_save, sender=StockLocation)
+def index_stock_location(sender, instance, created, **kwargs):
+    if not created:
+        update_entries(SearchEntry.Kind.STOCK_ITEM, _stock_item_ids(stock_location=instance))
+
+
+@receiver(post_save, sender=StockItem)
+def index_stock_item(sender, instance, **kwargs):
+    update_entries(SearchEntry.Kind.STOCK_ITEM, [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    # Its stock items are deleted with it and remove their own entries
+    remove_entries(SearchEntry.Kind.PRODUCT, [instance.pk])
+
+
+@receiver(post_delete, sender=StockItem)
+def unindex_stock_item(sender, instance, **kwargs):
+    remove_entries(SearchEntry.Kind.STOCK_ITEM, [instance.pk])
+
+
+@receiver(pre_delete, sender=Supplier)
+@receiver(pre_delete, sender=StockLocation)
+def remember_stock_items(sender, instance, **kwargs):
+    """The stock items keep existing (SET_NULL) without sending signals, note them for re-indexing."""
+    field = 'supplier' if sender is Supplier else 'stock_location'
+    instance._search_stock_item_ids = _stock_item_ids(**{field: instance})
+
+
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=StockLocation)
+def reindex_orphaned_stock_items(sender, instance, **kwargs):
+    if sender is Supplier:
+        remove_entries(SearchEntry.Kind.SUPPLIER, [instance.pk])
+    update_entries(SearchEntry.Kind.STOCK_ITEM, getattr(instance, '_search_stock_item_ids', []))
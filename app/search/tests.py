@@ -0,0 +1,121 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.tests import ViewTestCase
+from products.models import Product, Supplier
+from search.codes import Code, parse_code
+from search.models import SearchEntry
+from search.query import search_ids
+from stock.models import StockItem, StockLocation
+
+
+class SearchIndexTests(ViewTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+        cls.supplier = Supplier.objects.create(name='Acme Pets', email='orders@acme.example')
+        cls.location = StockLocation.objects.create(name='Back shelf')
+        cls.kibble = Product.objects.create(name='Dog Food Kibble')
+        cls.treats = Product.objects.create(name='Dog Treats')
+        cls.litter = Product.objects.create(name='Cat Litter')
+        cls.batch = StockItem.objects.create_stock(cls.kibble, 5, stock_location=cls.location, supplier=cls.supplier)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_words_match_as_prefixes(self):
+        product = SearchEntry.Kind.PRODUCT
+        self.assertCountEqual(search_ids(product, 'dog'), [self.kibble.pk, self.treats.pk])
+        self.assertEqual(search_ids(product, 'foo do'), [self.kibble.pk])
+        self.assertEqual(search_ids(product, self.litter.barcode[:8]), [self.litter.pk])
+        self.assertEqual(search_ids(product, 'bird'), [])
+        # FTS operators and punctuation are plain text
+        self.assertEqual(search_ids(product, 'dog AND "NEAR(*'), [])
+
+    def test_stock_items_are_indexed_with_related_names(self):
+        stock_item = SearchEntry.Kind.STOCK_ITEM
+        for query in ('kibble', 'acme', 'back shelf', self.batch.batch_number):
+            self.assertEqual(search_ids(stock_item, query), [self.batch.pk], query)
+
+    def test_index_follows_writes(self):
+        self.kibble.name = 'Puppy Chow'
+        self.kibble.save()
+        self.assertEqual(search_ids(SearchEntry.Kind.STOCK_ITEM, 'puppy'), [self.batch.pk])
+        self.location.name = 'Freezer'
+        self.location.save()
+        self.assertEqual(search_ids(SearchEntry.Kind.STOCK_ITEM, 'freezer'), [self.batch.pk])
+
+        self.supplier.delete()
+        self.assertEqual(search_ids(SearchEntry.Kind.STOCK_ITEM, 'acme'), [])
+        self.assertEqual(search_ids(SearchEntry.Kind.SUPPLIER, 'acme'), [])
+        self.kibble.delete()
+        self.assertEqual(search_ids(SearchEntry.Kind.PRODUCT, 'puppy'), [])
+        self.assertFalse(SearchEntry.objects.filter(kind=SearchEntry.Kind.STOCK_ITEM, object_id=self.batch.pk).exists())
+
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_ids(SearchEntry.Kind.SUPPLIER, 'orders'), [self.supplier.pk])
+        self.assertEqual(SearchEntry.objects.filter(kind=SearchEntry.Kind.PRODUCT).count(), 3)
+
+    def test_views_use_the_index(self):
+        response = self.client.get(reverse('products:product_list_partial'), {'search': 'dog'})
+        self.assertCountEqual(response.context['products'], [self.kibble, self.treats])
+
+        response = self.client.get(reverse('products:supplier_list_partial'), {'search': 'acme'})
+        self.assertEqual(list(response.context['suppliers']), [self.supplier])
+
+        response = self.client.get(reverse('stock:stockitem_list_partial'), {'search': 'back'})
+        self.assertEqual(list(response.context['stock_items']), [self.batch])
+
+        StockItem.objects.adjust_stock(self.batch, 0)
+        response = self.client.get(reverse('stock:stockitem_search'), {'search': 'kibble'})
+        self.assertEqual(list(response.context['stock_items']), [])
+
+
+class CodeLookupTests(ViewTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='cashier', password='password')
+        cls.kibble = Product.objects.create(name='Kibble')
+        cls.treats = Product.objects.create(name='Treats')
+        cls.batch = StockItem.objects.create_stock(cls.kibble, 5)
+        cls.empty_batch = StockItem.objects.create_stock(cls.kibble, 0)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_parse_code(self):
+        self.assertEqual(parse_code(' bar-1a2b3c4d5e '), Code('barcode', 'BAR-1A2B3C4D5E', True))
+        self.assertEqual(parse_code('SKU-1A2B'), Code('sku', 'SKU-1A2B', False))
+        self.assertEqual(parse_code('sku-1a2b3c4d-9F'), Code('batch', 'SKU-1A2B3C4D-9f', False))
+        self.assertIsNone(parse_code('BAR-'))
+        self.assertIsNone(parse_code('dog food'))
+
+    def get(self, url, search):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'search': search})
+        # Codes never touch the full-text index
+        self.assertFalse([query for query in context if 'search_searchentry' in query['sql']])
+        return response
+
+    def test_product_search_by_code(self):
+        url = reverse('products:product_list_partial')
+        for search in (self.treats.barcode, self.treats.barcode[:8].lower(), self.treats.sku):
+            self.assertEqual(list(self.get(url, search).context['products']), [self.treats], search)
+        self.assertEqual(list(self.get(url, self.batch.batch_number).context['products']), [self.kibble])
+        self.assertEqual(list(self.get(url, 'BAR-FFFFFFFFFF').context['products']), [])
+
+    def test_stock_search_by_code(self):
+        url = reverse('stock:stockitem_search')
+        self.assertEqual(list(self.get(url, self.batch.batch_number).context['stock_items']), [self.batch])
+        self.assertEqual(list(self.get(url, self.kibble.barcode).context['stock_items']), [self.batch])
+        self.assertEqual(list(self.get(url, self.batch.batch_number[:15]).context['stock_items']), [self.batch])
+        self.assertEqual(list(self.get(url, self.treats.sku).context['stock_items']), [])
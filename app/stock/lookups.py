@@ -0,0 +1,149 @@
+import threading
+from django.db.models import FilteredRelation, Q
+from core.cache import bump_version_on_commit, get_versions
+from products.models import Product
+from stock.models import StockItem
+
+
+# Bumped to rebuild every entry, product and batch writes bump only the barcodes they touch
+CATALOG_NAMESPACE = 'stock_batches'
+
+
+def barcode_namespace(barcode):
+    return f"stock_batches:{barcode}"
+
+
+def invalidate_barcodes(*barcodes):
+    """Invalidate the batches of the given barcodes in every worker once the transaction commits."""
+    barcodes = {barcode for barcode in barcodes if barcode}
+    if barcodes:
+        bump_version_on_commit(*[barcode_namespace(barcode) for barcode in barcodes])
+
+
+def invalidate_catalog():
+    """Rebuild the whole index in every worker, for writes that bypass the Product signals (queryset updates)."""
+    bump_version_on_commit(CATALOG_NAMESPACE)
+
+
+class BarcodeBatchIndex:
+    """
+    In-process map of barcode -> sellable batches, oldest first (FIFO).
+
+    Each entry holds the product's id, name and sale price plus a list of
+    (stock_item_id, quantity, sale_price) tuples. The index is built with one query
+    the first time it is used and entries are reloaded individually when their
+    version stamp changes, which StockItemManager, SaleManager and the stock
+    signals bump after every commit that touches a product's batches.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._catalog_version = None
+        self._lock = threading.Lock()
+
+    def _build(self, catalog_version):
+        barcodes = list(Product.objects.exclude(barcode=None).values_list('barcode', flat=True))
+        # Versions are read before the data, a concurrent bump can only make an entry look stale
+        versions = get_versions([barcode_namespace(barcode) for barcode in barcodes])
+        entries = {}
+        for entry in self._load(None):
+            entry['version'] = versions.get(barcode_namespace(entry['barcode']))
+            entries[entry['barcode']] = entry
+        with self._lock:
+            self._entries = entries
+            self._catalog_version = catalog_version
+
+    def _load(self, barcodes):
+        """
+        Load the entries for the given barcodes (all barcodes if None) with one LEFT JOIN query.
+        Products without sellable stock get an empty batch list.
+        """
+        products = Product.objects.exclude(barcode=None)
+        if barcodes is not None:
+            products = products.filter(barcode__in=barcodes)
+        rows = (
+            products
+            .annotate(sellable=FilteredRelation('stock_items', condition=Q(stock_items__quantity__gt=0)))
+            .order_by('pk', 'sellable__created_at', 'sellable__pk')
+            .values_list('pk', 'barcode', 'name', 'sale_price', 'sellable__pk', 'sellable__quantity', 'sellable__sale_price')
+        )
+        entries = {}
+        for pk, barcode, name, price, stock_item_id, quantity, sale_price in rows:
+            entry = entries.setdefault(barcode, {
+                'barcode': barcode, 'product_id': pk, 'product_name': name, 'product_sale_price': price, 'batches': []
+            })
+            if stock_item_id is not None:
+                entry['batches'].append((stock_item_id, quantity, sale_price))
+        return entries.values()
+
+    def snapshot(self):
+        """Return every entry read straight from the database, for the offline POS catalog."""
+        return list(self._load(None))
+
+    def get(self, barcode):
+        """Return the entry for the barcode or None if no product has it."""
+        return self.get_many([barcode]).get(barcode)
+
+    def get_many(self, barcodes):
+        """
+        Return {barcode: entry} for the known barcodes. Version stamps are checked with one
+        cache round trip and every stale entry is reloaded with one query.
+
+        Only barcodes a product has are kept: any other (a mistyped or foreign code) is
+        looked up again on every scan instead of growing the index and the cache.
+        """
+        barcodes = set(barcodes)
+        held = [barcode for barcode in barcodes if barcode in self._entries]
+        versions = get_versions([CATALOG_NAMESPACE] + [barcode_namespace(barcode) for barcode in held])
+        if self._catalog_version != versions[CATALOG_NAMESPACE]:
+            # Every entry is read afresh
+            self._build(versions[CATALOG_NAMESPACE])
+            held = []
+
+        stale = [
+            barcode for barcode in held
+            if self._entries.get(barcode, {}).get('version') != versions[barcode_namespace(barcode)]
+        ]
+        if stale:
+            self._reload(stale, versions)
+
+        missing = [barcode for barcode in barcodes if barcode not in self._entries]
+        if missing:
+            # Products created since the index was built, their stamps are read before their batches
+            known = list(Product.objects.filter(barcode__in=missing).values_list('barcode', flat=True))
+            if known:
+                self._reload(known, get_versions([barcode_namespace(barcode) for barcode in known]))
+
+        entries = self._entries
+        return {barcode: entries[barcode] for barcode in barcodes if barcode in entries}
+
+    def _reload(self, barcodes, versions):
+        """Reload the entries of the barcodes with one query, dropping those no product has anymore."""
+        loaded = {entry['barcode']: entry for entry in self._load(barcodes)}
+        with self._lock:
+            for barcode in barcodes:
+                entry = loaded.get(barcode)
+                if entry is None:
+                    self._entries.pop(barcode, None)
+                    continue
+                entry['version'] = versions[barcode_namespace(barcode)]
+                self._entries[barcode] = entry
+
+    def resolve(self, barcode, quantity):
+        """
+        Return (entry, batch) for the oldest batch of the barcode holding at least `quantity`,
+        or (entry, None) if no batch has enough. entry is None for an unknown barcode.
+        """
+        return self.pick_batch(self.get(barcode), quantity)
+
+    @staticmethod
+    def pick_batch(entry, quantity):
+        if entry is None:
+            return None, None
+        for batch in entry['batches']:
+            if batch[1] >= quantity:
+                return entry, batch
+        return entry, None
+
+
+barcode_index = BarcodeBatchIndex()
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_category_path'),
+        ('stock', '0003_alter_stockitem_sale_price_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['created_at', 'id'], name='stock_stock_created_452fb5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockitemtracking',
+            index=models.Index(fields=['created_at', 'id'], name='stock_stock_created_13ff59_idx'),
+        ),
+    ]
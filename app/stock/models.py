@@ -1,6 +1,7 @@
 import uuid
 from django.db import models, transaction
-from django.db.models import Sum
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
@@ -23,11 +24,102 @@ User= get_user_model()
 #     pass
     
 
+class InsufficientStock(ValidationError):
+    """
+    Raised by StockItemManager.apply_quantity_changes() when one or more lines cannot be applied.
+    `failed` maps stock_item_id to (available, requested); available is None if the row no longer exists.
+    """
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__([
+            f"Insufficient stock for stock item #{pk}. Available: {available or 0}, Requested: {requested}"
+            for pk, (available, requested) in failed.items()
+        ])
+
+
 class StockItemManager(models.Manager):
     """
     Custom manager for StockItem to handle creation, updates, and reductions.
-    methods: create_stock(), reduce_stock(), update_stock(), transfer_stock()
+    methods: create_stock(), apply_quantity_changes(), adjust_stock(), update_stock(), transfer_stock(), delete_stock()
+
+    Every method keeps Product.stock_on_hand / stock_batch_count in step in the same transaction,
+    quantity UPDATEs directly and row saves/deletes through the stock.signals receivers.
     """
+
+    @transaction.atomic
+    def apply_quantity_changes(self, changes):
+        """
+        Apply signed quantity deltas as guarded in-database updates.
+
+        Rows are locked in primary key order and every line is written with one
+        `quantity = quantity + delta WHERE quantity >= -delta` UPDATE, so concurrent
+        tills never overwrite each other with stale Python-side values.
+        Either every line is applied or none is.
+
+        Args:
+            changes: Dict of {stock_item_id: delta}, negative deltas decrement stock.
+
+        Returns:
+            Dict of {stock_item_id: new quantity}.
+
+        Raises:
+            InsufficientStock: With the lines that would go negative or no longer exist.
+        """
+        changes = {pk: delta for pk, delta in changes.items() if delta}
+        if not changes:
+            return {}
+
+        from dashboard.metrics import invalidate_metrics
+        from products.suppliers import invalidate_supplier_products
+        from stock.lookups import invalidate_barcodes
+
+        locked = (
+            self.select_for_update(of=('self',))
+            .filter(pk__in=changes)
+            .order_by('pk')
+            .values_list('pk', 'quantity', 'product_id', 'supplier_id', 'product__barcode')
+        )
+        available = {pk: quantity for pk, quantity, _, _, _ in locked}
+        failed = {
+            pk: (available.get(pk), -delta)
+            for pk, delta in changes.items()
+            if pk not in available or available[pk] + delta < 0
+        }
+        if failed:
+            raise InsufficientStock(failed)
+
+        guard = Q()
+        for pk, delta in changes.items():
+            guard |= Q(pk=pk, quantity__gte=-delta) if delta < 0 else Q(pk=pk)
+        try:
+            with transaction.atomic():
+                updated = self.filter(guard).update(
+                    quantity=Case(
+                        *[When(pk=pk, then=F('quantity') + delta) for pk, delta in changes.items()],
+                        output_field=models.PositiveIntegerField()
+                    )
+                )
+                if updated != len(changes):
+                    raise InsufficientStock({})
+        except InsufficientStock:
+            # Another writer got in between the lock and the update (only possible on
+            # databases without SELECT ... FOR UPDATE), report against fresh values.
+            current = dict(self.filter(pk__in=changes).values_list('pk', 'quantity'))
+            raise InsufficientStock({
+                pk: (current.get(pk), -delta)
+                for pk, delta in changes.items()
+                if pk not in current or current[pk] + delta < 0
+            })
+
+        on_hand = {}
+        for pk, _, product_id, _, _ in locked:
+            on_hand[product_id] = on_hand.get(product_id, 0) + changes[pk]
+        Product.objects.apply_stock_changes(on_hand)
+
+        invalidate_barcodes(*[barcode for _, _, _, _, barcode in locked])
+        invalidate_supplier_products(*[supplier_id for _, _, _, supplier_id, _ in locked])
+        invalidate_metrics('inventory', 'suppliers')
+        return {pk: available[pk] + delta for pk, delta in changes.items()}
     
     @transaction.atomic
     def create_stock(self, product, quantity, stock_location=None, purchase_price=None, 
@@ -62,16 +154,15 @@ class StockItemManager(models.Manager):
         if not isinstance(quantity, int) or quantity < 0:
             raise ValidationError("Quantity must be a non-negative integer.")
         
-        # Fetch the original StockItem for comparison
-        old_item = StockItem.objects.get(pk=stock_item.pk)
-        old_quantity = old_item.quantity
+        # Read the current quantity under lock, the instance may be stale
+        old_quantity = self.select_for_update().values_list('quantity', flat=True).get(pk=stock_item.pk)
         
         if quantity == old_quantity:
+            stock_item.quantity = old_quantity
             return stock_item  # No change, no tracking needed
         
         # Update quantity
-        stock_item.quantity = quantity
-        stock_item.save()
+        stock_item.quantity = self.apply_quantity_changes({stock_item.pk: quantity - old_quantity})[stock_item.pk]
         
         # Determine movement type and quantity change
         movement_type = 'stock_increase' if quantity > old_quantity else 'stock_decrease'
@@ -99,30 +190,40 @@ class StockItemManager(models.Manager):
         old_item = StockItem.objects.get(pk=stock_item.pk)
 
         changes = []
+        update_fields = []
 
         if stock_location is not None and stock_location != old_item.stock_location:
             changes.append(f"stock_location to {stock_location}")
             stock_item.stock_location = stock_location
+            update_fields.append('stock_location')
         
         if supplier is not None and supplier != old_item.supplier:
+            from products.suppliers import invalidate_supplier_products
+            # The stock signal covers the new supplier
+            invalidate_supplier_products(old_item.supplier_id)
             changes.append(f"supplier to {supplier or 'None'}")
             stock_item.supplier = supplier
+            update_fields.append('supplier')
         
         if purchase_price is not None and purchase_price != old_item.purchase_price:
             changes.append(f"purchase_price to {purchase_price or 'None'}")
             stock_item.purchase_price = purchase_price
+            update_fields.append('purchase_price')
         
         if sale_price is not None and sale_price != old_item.sale_price:
             changes.append(f"sale_price to {sale_price or 'None'}")
             stock_item.sale_price = sale_price
+            update_fields.append('sale_price')
         
         if expiration_date is not None and expiration_date != old_item.expiration_date:
             changes.append(f"expiration_date to {expiration_date or 'None'}")
             stock_item.expiration_date = expiration_date
+            update_fields.append('expiration_date')
 
         # Save and log only if changes occurred
         if changes:
-            stock_item.save()
+            # Only write the changed columns so concurrent quantity updates are never overwritten
+            stock_item.save(update_fields=update_fields + ['updated_at'])
             # Create notes with list of changed fields
             notes_content = notes or f"Updated {stock_item.product.name} (Batch: {stock_item.batch_number})"
             notes_content += f"\n Changed: {', '.join(changes)}"
@@ -141,22 +242,22 @@ class StockItemManager(models.Manager):
     @transaction.atomic
     def transfer_stock(self, stock_item, quantity, location_to, notes="", created_by=None):
         """Transfer stock to a new location and log in StockItemTracking."""
-        if quantity < 0:
-            raise ValidationError("Transfer quantity cannot be negative.")
-        if quantity > stock_item.quantity:
-            raise ValidationError(f"Cannot transfer {quantity} units; only {stock_item.quantity} available.")
+        if not isinstance(quantity, int) or quantity < 1:
+            raise ValidationError("Transfer quantity must be a positive integer.")
         
         # Reduce quantity in original StockItem
-        stock_item.quantity -= quantity
-        stock_item.save()
+        try:
+            stock_item.quantity = self.apply_quantity_changes({stock_item.pk: -quantity})[stock_item.pk]
+        except InsufficientStock as e:
+            available = e.failed[stock_item.pk][0] or 0
+            raise ValidationError(f"Cannot transfer {quantity} units; only {available} available.")
         
-        # Create or update StockItem at new location
+        # Create or update StockItem at new location, batch numbers are unique so a new row gets its own
         new_stock_item, created = self.get_or_create(
             product=stock_item.product,
             stock_location=location_to,
             defaults={
                 'quantity': quantity,
-                'batch_number': stock_item.batch_number,
                 'purchase_price': stock_item.purchase_price,
                 'sale_price': stock_item.sale_price,
                 'supplier': stock_item.supplier,
@@ -165,8 +266,7 @@ class StockItemManager(models.Manager):
             }
         )
         if not created:
-            new_stock_item.quantity += quantity
-            new_stock_item.save()
+            new_stock_item.quantity = self.apply_quantity_changes({new_stock_item.pk: quantity})[new_stock_item.pk]
 
         # Log transfer
         StockItemTracking.objects.create(
@@ -180,17 +280,61 @@ class StockItemManager(models.Manager):
         )
         return new_stock_item
 
+    @transaction.atomic
+    def delete_stock(self, stock_item, notes="", created_by=None):
+        """Delete a StockItem and log the removal in StockItemTracking."""
+        # The instance may be stale, the delete signal takes the locked values off the product's counters
+        stock_item.quantity, stock_item.product_id = (
+            self.select_for_update().values_list('quantity', 'product_id').get(pk=stock_item.pk)
+        )
+        quantity = stock_item.quantity
+        StockItemTracking.objects.create(
+            stock_item=stock_item,
+            quantity=quantity,
+            movement_type=StockItemTracking.MOVEMENT_TYPES.REMOVE,
+            notes=notes or f"Stock deleted for {stock_item.product.name} (Batch: {stock_item.batch_number})",
+            created_by=created_by
+        )
+        stock_item.delete()
+
+
+class StockLocationQuerySet(models.QuerySet):
+    def with_stock_totals(self):
+        """Annotate stock_item_count and stock_quantity over the location's StockItems with one grouped join."""
+        return self.annotate(
+            stock_item_count=Count('stock_items'),
+            stock_quantity=Coalesce(Sum('stock_items__quantity'), Value(0)),
+        )
+
 
 class StockLocation(AbstractNameDescriptionModel):
     """Location of the stock item in the store. e.g., Shelf A, Shelf B etc"""
 
+    objects = StockLocationQuerySet.as_manager()
+
+    # Sort keys accepted by the location's stock list -> order_by() fields
+    STOCK_ITEM_ORDERINGS = {
+        'name': ('product__name', 'pk'),
+        '-name': ('-product__name', '-pk'),
+        'quantity': ('quantity', 'pk'),
+        '-quantity': ('-quantity', '-pk'),
+        'expiry': (F('expiration_date').asc(nulls_last=True), 'pk'),
+        'newest': ('-created_at', '-pk'),
+    }
+
     def get_stock_items(self):
+        """Uses the StockLocation.objects.with_stock_totals() annotation when present."""
+        if hasattr(self, 'stock_item_count'):
+            return self.stock_item_count
         return self.stock_items.count()
     
     def get_stock_quantities(self):
         """
         Get the total quantity of stocks available at this location.
+        Uses the StockLocation.objects.with_stock_totals() annotation when present.
         """
+        if hasattr(self, 'stock_quantity'):
+            return self.stock_quantity
         result = self.stock_items.aggregate(total_quantity=Sum('quantity'))
         return result['total_quantity'] or 0
 
@@ -244,6 +388,9 @@ class StockItem(AbstractBaseModel):
         verbose_name = "Stock Item"
         verbose_name_plural = "Stock Items"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # keyset pagination (core.pagination)
+        ]
         
 
 
@@ -290,4 +437,7 @@ class StockItemTracking(AbstractBaseModel):
     class Meta:
         verbose_name = "Stock Item Tracking"
         verbose_name_plural = "Stock Items Tracking"
-        ordering = ["-created_at"]
\ No newline at end of file
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # keyset pagination (core.pagination)
+        ]
\ No newline at end of file
@@ -0,0 +1,82 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from core.pagination import invalidate_counts
+from products.models import Product
+from products.suppliers import invalidate_supplier_products
+from stock.lookups import invalidate_barcodes
+from stock.models import StockItem, StockLocation
+
+
+@receiver(pre_save, sender=StockItem)
+def remember_stock_item_counts(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored product and quantity, the product counters move by the difference."""
+    instance._stored_stock = None
+    if instance._state.adding or (update_fields is not None and not {'product', 'quantity'} & set(update_fields)):
+        return
+    instance._stored_stock = StockItem.objects.filter(pk=instance.pk).values_list('product_id', 'quantity').first()
+
+
+@receiver(post_save, sender=StockItem)
+def count_saved_stock_item(sender, instance, created, update_fields=None, **kwargs):
+    """Plain save()/create() calls keep Product.stock_on_hand / stock_batch_count in step too."""
+    if created:
+        Product.objects.apply_stock_changes({instance.product_id: instance.quantity}, {instance.product_id: 1})
+        return
+    stored = getattr(instance, '_stored_stock', None)
+    if stored is None or stored == (instance.product_id, instance.quantity):
+        return
+    product_id, quantity = stored
+    quantities = {product_id: -quantity}
+    quantities[instance.product_id] = quantities.get(instance.product_id, 0) + instance.quantity
+    batches = {} if product_id == instance.product_id else {product_id: -1, instance.product_id: 1}
+    Product.objects.apply_stock_changes(quantities, batches)
+
+
+@receiver(post_delete, sender=StockItem)
+def count_deleted_stock_item(sender, instance, **kwargs):
+    """Deletes, cascades included, take the batch off its product's counters."""
+    Product.objects.apply_stock_changes({instance.product_id: -instance.quantity}, {instance.product_id: -1})
+
+
+@receiver([post_save, post_delete], sender=StockItem)
+def invalidate_stock_item_batches(sender, instance, **kwargs):
+    """Created, edited or deleted batches change what the barcode lookup returns."""
+    try:
+        invalidate_barcodes(instance.product.barcode)
+    except Product.DoesNotExist:
+        # Deleted together with its product, the product signal invalidates everything
+        pass
+
+
+@receiver([post_save, post_delete], sender=StockItem)
+def invalidate_stock_item_supplier(sender, instance, **kwargs):
+    """The supplier's cached supplied-products breakdown includes this batch."""
+    invalidate_supplier_products(instance.supplier_id)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_barcode(sender, instance, **kwargs):
+    """Keep the stored barcode, the entry under it must go when the barcode changes."""
+    instance._stored_barcode = None
+    if not instance._state.adding:
+        instance._stored_barcode = Product.objects.filter(pk=instance.pk).values_list('barcode', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_batches(sender, instance, **kwargs):
+    """Name, price or barcode changes affect the product's entry only, under its old and new barcode."""
+    invalidate_barcodes(instance.barcode, getattr(instance, '_stored_barcode', None))
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_suppliers(sender, instance, created, **kwargs):
+    """The supplied-products breakdown of the product's suppliers shows its name, barcode and prices."""
+    if not created:
+        invalidate_supplier_products(*StockItem.objects.filter(product=instance).values_list('supplier_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=StockItem)
+@receiver([post_save, post_delete], sender=StockLocation)
+def invalidate_list_counts(sender, **kwargs):
+    """Edits matter too, they can move rows in or out of a filtered list."""
+    invalidate_counts(sender)
@@ -1,3 +1,191 @@
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from core.tests import ViewTestCase
+from products.models import Product
+from stock.lookups import BarcodeBatchIndex, barcode_namespace
+from stock.models import StockItem, StockLocation
+
+
+class StockLocationViewTests(ViewTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_location(self, batches=2, quantity=5):
+        location = StockLocation.objects.create(name=f'Shelf {StockLocation.objects.count()}')
+        for index in range(batches):
+            product = Product.objects.create(name=f'{location.name} product {index:03}')
+            StockItem.objects.create_stock(product, quantity + index, stock_location=location)
+        return location
+
+    def test_location_list_queries_are_constant(self):
+        self.create_location()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('stock:stocklocation_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(10):
+                self.create_location()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('stock:stocklocation_list'))
+        self.assertEqual(len(few), len(many))
+        location = response.context['stock_locations'][0]
+        self.assertEqual((location.get_stock_items(), location.get_stock_quantities()), (2, 11))
+
+    def test_location_stock_items_are_paginated_and_sorted(self):
+        location = self.create_location(batches=25)
+        response = self.client.get(reverse('stock:stocklocation_detail', args=[location.pk]))
+        page = response.context['stock_items_page']
+        self.assertEqual((len(page), page.paginator.num_pages), (20, 2))
+        self.assertEqual(page[0].product.name, f'{location.name} product 000')
+
+        url = reverse('stock:stocklocation_stock_items', args=[location.pk])
+        response = self.client.get(url, {'sort': '-quantity', 'page': 2})
+        self.assertEqual([item.quantity for item in response.context['stock_items_page']], [9, 8, 7, 6, 5])
+
+        # Unknown sort keys fall back to the name
+        response = self.client.get(url, {'sort': 'product__barcode'})
+        self.assertEqual(response.context['sort'], 'name')
+
+
+class StockLedgerPaginationTests(ViewTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='manager', password='password', role='inventory_manager')
+        product = Product.objects.create(name='Kibble')
+        for _ in range(25):
+            StockItem.objects.create_stock(product, 1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_infinite_scroll(self):
+        url = reverse('stock:stockitemtracking_list')
+        response = self.client.get(url)
+        page = response.context['page_obj']
+        self.assertEqual((len(page), page.has_next()), (20, True))
+        self.assertContains(response, 'hx-trigger="revealed"')
+
+        # HTMX requests for the next page get the rows only
+        response = self.client.get(url, {'after': page.next_cursor}, headers={'HX-Request': 'true'})
+        self.assertTemplateUsed(response, 'stock/partials/stockitemtracking_rows.html')
+        self.assertTemplateNotUsed(response, 'stock/stockitemtracking_list.html')
+        self.assertEqual(len(response.context['tracking_entries']), 5)
+        self.assertNotContains(response, 'hx-trigger="revealed"')
+
+    def test_stock_item_list_has_no_count_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('stock:stockitem_list'))
+        self.assertFalse([query for query in context if 'COUNT(' in query['sql'] and 'stock_stockitem' in query['sql']])
+        response = self.client.get(
+            reverse('stock:stockitem_list'), {'after': response.context['page_obj'].next_cursor}, headers={'HX-Request': 'true'}
+        )
+        self.assertEqual(len(response.context['stock_items']), 5)
+
+
+class StockTransferTests(TestCase):
+
+    def test_transfer_needs_a_positive_quantity(self):
+        stock_item = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 5)
+        shelf = StockLocation.objects.create(name='Shelf')
+        for quantity in (0, -1, 1.5):
+            with self.assertRaises(ValidationError):
+                StockItem.objects.transfer_stock(stock_item, quantity, shelf)
+        stock_item.refresh_from_db()
+        self.assertEqual(stock_item.quantity, 5)
+        self.assertFalse(StockItem.objects.filter(stock_location=shelf).exists())
+
+    def test_transfer_to_a_new_location(self):
+        stock_item = StockItem.objects.create_stock(Product.objects.create(name='Kibble'), 5, sale_price=4)
+        shelf = StockLocation.objects.create(name='Shelf')
+        moved = StockItem.objects.transfer_stock(stock_item, 2, shelf)
+        self.assertEqual((moved.stock_location, moved.quantity, moved.sale_price), (shelf, 2, Decimal('4.00')))
+        self.assertNotEqual(moved.batch_number, stock_item.batch_number)
+
+        # The next transfer tops up the batch already there
+        self.assertEqual(StockItem.objects.transfer_stock(stock_item, 3, shelf).pk, moved.pk)
+        self.assertEqual(
+            list(StockItem.objects.order_by('pk').values_list('quantity', flat=True)), [0, 5]
+        )
+
+
+class BarcodeBatchIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.index = BarcodeBatchIndex()
+        # Entries follow version stamps bumped on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='Kibble', sale_price=5)
+            self.older = StockItem.objects.create_stock(self.product, 2)
+            self.newer = StockItem.objects.create_stock(self.product, 5, sale_price=4)
+
+    def resolve(self, quantity):
+        entry, batch = self.index.resolve(self.product.barcode, quantity)
+        return batch and batch[0]
+
+    def test_picks_the_oldest_batch_with_enough_stock(self):
+        self.assertEqual(self.resolve(1), self.older.pk)
+        self.assertEqual(self.resolve(3), self.newer.pk)
+        self.assertIsNone(self.resolve(6))
+        self.assertEqual(self.index.resolve('BAR-MISSING', 1), (None, None))
+
+    def test_scans_are_served_from_memory(self):
+        self.index.get(self.product.barcode)
+        with self.assertNumQueries(0):
+            entry = self.index.get(self.product.barcode)
+        self.assertEqual(entry['batches'], [(self.older.pk, 2, Decimal('5.00')), (self.newer.pk, 5, Decimal('4.00'))])
+
+    def test_entries_follow_stock_and_product_changes(self):
+        self.assertEqual(self.resolve(1), self.older.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            StockItem.objects.adjust_stock(self.older, 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resolve(1), self.newer.pk)
+
+    def test_product_edits_reload_only_their_entry(self):
+        other = Product.objects.create(name='Treats')
+        with self.captureOnCommitCallbacks(execute=True):
+            StockItem.objects.create_stock(other, 1)
+        self.index.get_many([self.product.barcode, other.barcode])
+        old_barcode = self.product.barcode
+
+        with mock.patch.object(self.index, '_build') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.name = 'Dry Kibble'
+                self.product.save()
+            with self.assertNumQueries(1):
+                self.assertEqual(self.index.get_many([old_barcode, other.barcode])[old_barcode]['product_name'], 'Dry Kibble')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.barcode = 'BAR-00000000AA'
+                self.product.save()
+            self.assertIsNone(self.index.get(old_barcode))
+            self.assertEqual(self.resolve(1), self.older.pk)
+        build.assert_not_called()
+
+    def test_new_products_are_found(self):
+        self.index.get(self.product.barcode)
+        with self.captureOnCommitCallbacks(execute=True):
+            treats = Product.objects.create(name='Treats')
+            batch = StockItem.objects.create_stock(treats, 3)
+        self.assertEqual(self.index.resolve(treats.barcode, 1)[1][0], batch.pk)
+
+    def test_unknown_barcodes_are_not_kept(self):
+        self.index.get(self.product.barcode)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.index.get_many(['BAR-0000000000', 'BAR-0000000001']), {})
+        self.assertNotIn('BAR-0000000000', self.index._entries)
+        self.assertIsNone(cache.get(f"version:{barcode_namespace('BAR-0000000000')}"))
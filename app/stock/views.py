@@ -4,18 +4,20 @@ from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.db.models import Prefetch, Q
-from core.mixins import RoleRequiredMixin
+from django.core.paginator import Paginator
+from core.mixins import KeysetPaginationMixin, RoleRequiredMixin
+from core.pagination import CachedCountPaginator
 from stock.models import StockItem, StockItemTracking, StockLocation
 from products.models import Product, Supplier
+from search.models import SearchEntry
+from search.query import ranked
 
 
 
 class StockItemSearchView(LoginRequiredMixin, ListView):
     """
     view for search feature in manual sale create view
-    we will solve it efficiently later
-    TODO: Optimize it
+    In-stock batches ranked by the search index (product name, SKU, barcode, batch number)
     """
     model = StockItem
     template_name = 'stock/partials/stockitem_sale_search.html'
@@ -26,13 +28,7 @@ class StockItemSearchView(LoginRequiredMixin, ListView):
         search = self.request.GET.get('search')
 
         if search:
-            queryset = queryset.filter(
-                Q(product__name__icontains = search) |
-                Q(product__barcode__icontains = search) |
-                Q(batch_number__icontains = search)
-            ).filter(
-                quantity__gt=0
-            )
+            queryset = ranked(queryset.filter(quantity__gt=0), SearchEntry.Kind.STOCK_ITEM, search)
         else:
             queryset = StockItem.objects.none()
         return queryset
@@ -45,6 +41,7 @@ class StockItemListPartialView(LoginRequiredMixin, ListView):
     template_name = 'stock/partials/stockitem_list_partial.html'
     context_object_name = 'stock_items'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
         """Optimize query"""
@@ -52,18 +49,15 @@ class StockItemListPartialView(LoginRequiredMixin, ListView):
         search = self.request.GET.get('search')
 
         if search:
-            queryset = queryset.filter(
-                Q(product__name__icontains=search) |
-                Q(stock_location__name__icontains=search) |
-                Q(supplier__name__icontains=search)
-            )
+            queryset = ranked(queryset, SearchEntry.Kind.STOCK_ITEM, search)
         return queryset
 
 
 
-class StockItemListView(LoginRequiredMixin, ListView):
+class StockItemListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = StockItem
     template_name = 'stock/stockitem_list.html'
+    rows_template_name = 'stock/partials/stockitem_rows.html'
     context_object_name = 'stock_items'
     paginate_by = 20
 
@@ -198,7 +192,8 @@ class StockItemQuantityAdjustView(LoginRequiredMixin, RoleRequiredMixin, UpdateV
                 created_by=self.request.user
             )
             messages.success(self.request, f"Adjusted quantity for {stock_item.product.name} (Batch: {stock_item.batch_number})")
-            return super().form_valid(form)
+            # adjust_stock() already wrote the quantity, saving the form would overwrite concurrent changes
+            return HttpResponseRedirect(self.get_success_url())
         except ValidationError as e:
             form.add_error(None, str(e))
             messages.error(self.request, str(e))
@@ -219,16 +214,10 @@ class StockItemDeleteView(LoginRequiredMixin, PermissionRequiredMixin, RoleRequi
         return super().get_queryset().select_related('product')
 
     def form_valid(self, form):
-        """Log deletion in StockItemTracking."""
-        StockItemTracking.objects.create(
-            stock_item=self.object,
-            quantity=self.object.quantity,
-            movement_type=StockItemTracking.MOVEMENT_TYPES.REMOVE,
-            notes=f"Stock deleted for {self.object.product.name} (Batch: {self.object.batch_number})",
-            created_by=self.request.user
-        )
+        """Delete through StockItemManager so the removal is logged and the product's stock counters follow."""
+        StockItem.objects.delete_stock(self.object, created_by=self.request.user)
         messages.success(self.request, f"Deleted {self.object.product.name} (Batch: {self.object.batch_number})")
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
 
 
@@ -238,9 +227,10 @@ class StockLocationListView(LoginRequiredMixin, ListView):
     template_name = "stock/stock_location_list.html"
     context_object_name = 'stock_locations'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().with_stock_totals()
         return queryset.order_by('-created_at')
 
     def get_context_data(self, **kwargs):
@@ -274,16 +264,31 @@ class StockLocationDetailView(LoginRequiredMixin, DetailView):
     template_name = 'stock/modals/stock_location_detail_modal.html'
     context_object_name = 'stock_location'
 
+    stock_items_per_page = 20
+
     def get_queryset(self):
-        return (
-            StockLocation.objects
-            .prefetch_related(
-                Prefetch(
-                    'stock_items',
-                    queryset=StockItem.objects.select_related('product')
-                )
-            )
+        return StockLocation.objects.with_stock_totals()
+
+    def get_context_data(self, **kwargs):
+        """Add one page of the location's stock items, sorted by the `sort` parameter."""
+        context = super().get_context_data(**kwargs)
+        sort = self.request.GET.get('sort')
+        if sort not in StockLocation.STOCK_ITEM_ORDERINGS:
+            sort = 'name'
+        stock_items = self.object.stock_items.select_related('product').order_by(
+            *StockLocation.STOCK_ITEM_ORDERINGS[sort]
         )
+        # The total is already annotated, no COUNT query for the paginator
+        paginator = Paginator(stock_items, self.stock_items_per_page)
+        paginator.count = self.object.stock_item_count
+        context['stock_items_page'] = paginator.get_page(self.request.GET.get('page'))
+        context['sort'] = sort
+        return context
+
+
+class StockLocationStockItemsView(StockLocationDetailView):
+    """One page of the stock list in the location detail modal"""
+    template_name = 'stock/partials/stock_location_stock_items.html'
 
 
 class StockLocationUpdateView(LoginRequiredMixin, RoleRequiredMixin, UpdateView):
@@ -327,9 +332,10 @@ class StockLocationDeleteView(LoginRequiredMixin, PermissionRequiredMixin, RoleR
 # TODO: add templates for these views and add RoleRequiredMixin
 
 
-class StockItemTrackingListView(LoginRequiredMixin, ListView):
+class StockItemTrackingListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = StockItemTracking
     template_name = 'stock/stockitemtracking_list.html'
+    rows_template_name = 'stock/partials/stockitemtracking_rows.html'
     context_object_name = 'tracking_entries'
     paginate_by = 20
 
@@ -349,6 +355,10 @@ class StockItemTrackingListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         context['products'] = Product.objects.all()
         context['movement_types'] = StockItemTracking.MOVEMENT_TYPES.choices
+        if self.request.headers.get('HX-Request'):
+            context['template_to_extend'] = 'partials/base_empty.html'
+        else:
+            context['template_to_extend'] = 'new_dash_base.html'
         return context
 
 class StockItemTrackingDetailView(LoginRequiredMixin, DetailView):